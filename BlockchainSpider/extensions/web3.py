@@ -0,0 +1,31 @@
+from scrapy import signals
+from scrapy.utils.defer import deferred_from_coro
+
+from BlockchainSpider.utils.web3 import session_pool, rpc_batcher
+
+
+class Web3SessionPoolExtension:
+    """
+    Close the pooled sessions of `web3_json_rpc` when the spider is closed,
+    and save the connection reuse of the pool and the batching of `rpc_batcher` into stats.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler.stats)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_closed(self, spider):
+        pool_stats = session_pool.stats
+        for key, value in pool_stats.items():
+            self.stats.set_value('web3/%s' % key, value, spider=spider)
+        created, reused = pool_stats['connections_created'], pool_stats['connections_reused']
+        if created + reused > 0:
+            self.stats.set_value('web3/connections_reused_ratio', reused / (created + reused), spider=spider)
+        for key, value in rpc_batcher.stats.items():
+            self.stats.set_value('web3/batch/%s' % key, value, spider=spider)
+        return deferred_from_coro(session_pool.close())
@@ -3,3 +3,4 @@ import scrapy
 
 class SyncSignalItem(scrapy.Item):
     signal = scrapy.Field()  # dict
+    failed = scrapy.Field()  # bool
@@ -2,3 +2,4 @@ from .cache import RequestCacheMiddleware
 from .selenium import SeleniumMiddleware
 from .tor import TorMiddleware
 from .sync import SyncMiddleware
+from .apikey import APIKeyMiddleware
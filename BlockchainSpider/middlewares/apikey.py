@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from urllib.parse import urlparse, parse_qs, urlencode
+
+import scrapy
+
+from BlockchainSpider.middlewares._meta import LogMiddleware
+
+
+class APIKeyMiddleware(LogMiddleware):
+    """
+    Throttle the requests with `apikey_param` in meta by the `apikey_bucket` of the spider.
+
+    Only the request waiting for an apikey is delayed in the event loop, instead of
+    blocking the reactor when the request is generated. The apikey is filled into
+    the query argument named by `apikey_param`, or not filled if it is empty,
+    e.g. the tronscan api which is throttled without apikeys.
+    This middleware should be placed after the `RequestCacheMiddleware`,
+    so that the cached requests consume no apikey.
+
+    The responses are fed back to the bucket for adapting the rate of each apikey,
+    and the current rates are exposed as `apikey/rate/<apikey prefix>` in stats.
+    """
+    RATE_LIMIT_MESSAGES = [b'max rate limit reached', b'rate limit exceeded', b'too many requests']
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    async def process_request(self, request: scrapy.Request, spider):
+        param = request.meta.get('apikey_param')
+        bucket = getattr(spider, 'apikey_bucket', None)
+        if param is None or bucket is None:
+            return None
+
+        # the copies for retrying are throttled again, and their apikeys are replaced
+        key, delay = bucket.reserve()
+        if delay > 0:
+            self.stats.inc_value('apikey/wait_count', spider=spider)
+            self.stats.inc_value('apikey/wait_time', delay, spider=spider)
+            self.stats.max_value('apikey/max_wait_time', delay, spider=spider)
+            await asyncio.sleep(delay)
+        request.meta['apikey'] = key
+        if param == '':
+            return None
+
+        # the apikey is filled into the request in place, so that the request is sent right after the delay,
+        # instead of being rescheduled and sent out of the reserved time
+        url = urlparse(request.url)
+        query_args = parse_qs(url.query, keep_blank_values=True)
+        query_args[param] = [key]
+        request._set_url(url._replace(query=urlencode(query_args, doseq=True)).geturl())
+        return None
+
+    def process_response(self, request: scrapy.Request, response, spider):
+        key = request.meta.get('apikey')
+        bucket = getattr(spider, 'apikey_bucket', None)
+        if key is None or bucket is None or 'cached' in response.flags:
+            return response
+
+        limited = self.is_rate_limited(response)
+        quarantine = bucket.feedback(key, limited)
+        name = key[:6]
+        if limited:
+            self.stats.inc_value('apikey/rate_limited', spider=spider)
+        if quarantine > 0:
+            self.stats.inc_value('apikey/quarantined', spider=spider)
+            self.log(
+                message='Quarantine apikey {}... for {}s after rate limit errors'.format(name, quarantine),
+                level=logging.WARNING,
+            )
+        self.stats.set_value('apikey/rate/%s' % name, round(bucket.rates[key], 3), spider=spider)
+        return response
+
+    def is_rate_limited(self, response) -> bool:
+        if response.status == 429:
+            return True
+
+        # the rate limit errors are short messages with the status of 200
+        if len(response.body) > 1024:
+            return False
+        body = response.body.lower()
+        for message in self.RATE_LIMIT_MESSAGES:
+            if message in body:
+                return True
+        return False
@@ -13,6 +13,7 @@ class SyncMiddleware(LogMiddleware):
     def __init__(self):
         self.request_parent = dict()
         self.sync_items = dict()
+        self.failed_items = set()
         self._lock = asyncio.Lock()
 
     async def process_spider_output(self, response, result, spider):
@@ -28,56 +29,61 @@ class SyncMiddleware(LogMiddleware):
             if not isinstance(item, scrapy.Request):
                 yield item
                 continue
+            yield await self._trace_request(item, parent_fingerprint, key)
 
-            # handle error
-            yield item.replace(
-                errback=self.make_errback(item.errback),
-            )
+        # release!
+        await self._lock.acquire()
+        yield await self._release_sync_item(response.request)
+        self._lock.release()
 
-            # start new task
-            value = item.cb_kwargs.get(key)
-            if value is not None:
-                assert isinstance(value, dict)
-                req_fingerprint = fingerprint(item)
-                await self._lock.acquire()
-                self.request_parent[req_fingerprint] = 1
-                self.sync_items[req_fingerprint] = value
-                self._lock.release()
-                continue
+    async def _trace_request(self, request: scrapy.Request, parent_fingerprint: bytes, key: str) -> scrapy.Request:
+        # start new task
+        value = request.cb_kwargs.get(key)
+        if value is not None:
+            assert isinstance(value, dict)
+            req_fingerprint = fingerprint(request)
+            await self._lock.acquire()
+            self.request_parent[req_fingerprint] = 1
+            self.sync_items[req_fingerprint] = value
+            self._lock.release()
 
-            # trace extra generated requests
+        # trace extra generated requests
+        else:
             await self._lock.acquire()
-            if not self.request_parent.get(parent_fingerprint):
-                self._lock.release()
-                continue
-            req_fingerprint = fingerprint(item)
-            grandpa_fingerprint = self.request_parent[parent_fingerprint]
-            if isinstance(grandpa_fingerprint, bytes):
-                self.request_parent[req_fingerprint] = grandpa_fingerprint
-                self.request_parent[grandpa_fingerprint] += 1
-            else:
-                self.request_parent[req_fingerprint] = parent_fingerprint
-                self.request_parent[parent_fingerprint] += 1
+            if self.request_parent.get(parent_fingerprint):
+                req_fingerprint = fingerprint(request)
+                grandpa_fingerprint = self.request_parent[parent_fingerprint]
+                if isinstance(grandpa_fingerprint, bytes):
+                    self.request_parent[req_fingerprint] = grandpa_fingerprint
+                    self.request_parent[grandpa_fingerprint] += 1
+                else:
+                    self.request_parent[req_fingerprint] = parent_fingerprint
+                    self.request_parent[parent_fingerprint] += 1
             self._lock.release()
 
-        # release!
-        await self._lock.acquire()
-        yield await self._release_sync_item(response.request)
-        self._lock.release()
+        # handle error
+        return request.replace(
+            errback=self.make_errback(request.errback, key),
+        )
 
-    def make_errback(self, old_errback) -> Callable:
+    def make_errback(self, old_errback, key: str) -> Callable:
         async def new_errback(failure):
-            # wrap the old error callback
+            # wrap the old error callback, whose outputs skip the spider middlewares,
+            # so the requests are traced here as the outputs of callbacks
+            request = failure.request
             old_results = old_errback(failure) if old_errback else None
             if isinstance(old_results, Generator):
                 for rlt in old_results:
+                    if isinstance(rlt, scrapy.Request):
+                        rlt = await self._trace_request(rlt, fingerprint(request), key)
                     yield rlt
             if isinstance(old_results, AsyncGenerator):
                 async for rlt in old_results:
+                    if isinstance(rlt, scrapy.Request):
+                        rlt = await self._trace_request(rlt, fingerprint(request), key)
                     yield rlt
 
             # reload context data and log out
-            request = failure.request
             self.log(
                 message='Get error when fetching {} with {}, callback args {}'.format(
                     request.url, request.body, str(request.cb_kwargs)
@@ -86,11 +92,13 @@ class SyncMiddleware(LogMiddleware):
             )
 
             # generate sync item (when the response fails)
-            yield await self._release_sync_item(request)
+            yield await self._release_sync_item(request, failed=True)
 
         return new_errback
 
-    async def _release_sync_item(self, finished_request: scrapy.Request) -> Union[SyncSignalItem, None]:
+    async def _release_sync_item(
+            self, finished_request: scrapy.Request, failed: bool = False
+    ) -> Union[SyncSignalItem, None]:
         parent_fingerprint = fingerprint(finished_request)
         grandpa_fingerprint = self.request_parent.get(parent_fingerprint)
         if grandpa_fingerprint is None:
@@ -98,16 +106,24 @@ class SyncMiddleware(LogMiddleware):
 
         # release signal when response
         if not isinstance(grandpa_fingerprint, bytes):
-            self.request_parent[parent_fingerprint] -= 1
+            root_fingerprint = parent_fingerprint
+        else:
+            root_fingerprint = grandpa_fingerprint
+            del self.request_parent[parent_fingerprint]
+        self.request_parent[root_fingerprint] -= 1
+        if failed:
+            self.failed_items.add(root_fingerprint)
+        if self.request_parent[root_fingerprint] > 0:
             return
 
-        self.request_parent[grandpa_fingerprint] -= 1
-        del self.request_parent[parent_fingerprint]
-        if self.request_parent[grandpa_fingerprint] == 0:
-            del self.request_parent[grandpa_fingerprint]
-            value = self.sync_items.pop(grandpa_fingerprint)
-            self.log(
-                message="Synchronized: {}".format(value),
-                level=logging.INFO,
-            )
-            return SyncSignalItem(signal=value)
+        # the task is finished when the root and all extra requests are released,
+        # and it is failed if any of them is failed
+        del self.request_parent[root_fingerprint]
+        value = self.sync_items.pop(root_fingerprint)
+        failed = root_fingerprint in self.failed_items
+        self.failed_items.discard(root_fingerprint)
+        self.log(
+            message="Synchronized{}: {}".format(' with errors' if failed else '', value),
+            level=logging.INFO if not failed else logging.WARNING,
+        )
+        return SyncSignalItem(signal=value, failed=failed)
@@ -7,6 +7,7 @@ from BlockchainSpider import settings
 from BlockchainSpider.items import TransactionItem, TraceItem
 from BlockchainSpider.items.trans import ContractItem
 from BlockchainSpider.middlewares._meta import LogMiddleware
+from BlockchainSpider.utils.contract import ContractStore, get_chain_id
 from BlockchainSpider.utils.decorator import log_debug_tracing
 
 
@@ -19,50 +20,59 @@ class ContractMiddleware(LogMiddleware):
             error_rate=1e-4,
             mode=ScalableBloomFilter.SMALL_SET_GROWTH,
         )
+        self.contract_store = None
+        self._contract_store_opened = False
 
     async def process_spider_output(self, response, result, spider):
         if self.provider_bucket is None:
             self.provider_bucket = spider.provider_bucket
+        if not self._contract_store_opened:
+            # the codes are not cached across runs if the chain is unknown
+            self._contract_store_opened = True
+            chain_id = await get_chain_id(self.provider_bucket, self.timeout)
+            if chain_id is not None:
+                self.contract_store = ContractStore.open(chain_id=chain_id)
 
         # filter and process the result flow
         async for item in result:
             yield item
 
+            addresses = list()
             if isinstance(item, TransactionItem):
-                if item['address_to'] in self.bloom4contract:
+                addresses.append(item['address_to'])
+            if isinstance(item, TraceItem) and item['trace_id'] != '0_0':
+                addresses.extend([item['address_from'], item['address_to']])
+
+            for address in addresses:
+                if address in self.bloom4contract:
+                    continue
+                self.bloom4contract.add(address)
+
+                # load the code cached in previous runs, and the empty codes cached by old runs are ignored
+                code = self.contract_store.get(address, 'code') if self.contract_store is not None else None
+                if code:
+                    yield ContractItem(address=address, code=code)
                     continue
-                self.bloom4contract.add(item['address_to'])
                 yield await self.get_request_contract(
-                    address=item['address_to'],
+                    address=address,
                     block_tag=hex(item['block_number']),
-                    cb_kwargs={'address': item['address_to']},
+                    cb_kwargs={'address': address},
                 )
 
-            if isinstance(item, TraceItem) and item['trace_id'] != '0_0':
-                if item['address_from'] not in self.bloom4contract:
-                    self.bloom4contract.add(item['address_from'])
-                    yield await self.get_request_contract(
-                        address=item['address_from'],
-                        block_tag=hex(item['block_number']),
-                        cb_kwargs={'address': item['address_from']},
-                    )
-                if item['address_to'] not in self.bloom4contract:
-                    self.bloom4contract.add(item['address_to'])
-                    yield await self.get_request_contract(
-                        address=item['address_to'],
-                        block_tag=hex(item['block_number']),
-                        cb_kwargs={'address': item['address_to']},
-                    )
-
     @log_debug_tracing
     def parse_contract_item(self, response: scrapy.http.Response, **kwargs):
         result = json.loads(response.text)
         result = result.get('result')
-        if result is None or result == '0x':
+        if result is None:
             return
 
         # recover cached address
+        # the empty code is not cached, for the address may be a contract deployed after the block
         address = kwargs['address']
+        if result == '0x':
+            return
+        if self.contract_store is not None:
+            self.contract_store.set(address, 'code', result)
 
         # generate contract item
         yield ContractItem(
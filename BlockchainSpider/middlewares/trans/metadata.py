@@ -15,7 +15,7 @@ from BlockchainSpider.middlewares._meta import LogMiddleware
 from BlockchainSpider.utils.decorator import log_debug_tracing
 from BlockchainSpider.utils.token import get_token_name, get_token_symbol, get_token_decimals, \
     get_token_total_supply
-from BlockchainSpider.utils.web3 import web3_json_rpc, parse_bytes_data
+from BlockchainSpider.utils.web3 import web3_json_rpc_batched, parse_bytes_data
 
 
 class MetadataMiddleware(LogMiddleware):
@@ -155,7 +155,7 @@ class MetadataMiddleware(LogMiddleware):
     ) -> Union[Request, None]:
         # fetch uri
         # see https://github.com/ethereum/EIPs/blob/master/EIPS/eip-721.md
-        data = await web3_json_rpc(
+        data = await web3_json_rpc_batched(
             tx_obj={
                 "id": 1,
                 "jsonrpc": "2.0",
@@ -196,7 +196,7 @@ class MetadataMiddleware(LogMiddleware):
     ) -> Union[Request, None]:
         # fetch uri
         # see https://github.com/ethereum/EIPs/blob/master/EIPS/eip-1155.md
-        data = await web3_json_rpc(
+        data = await web3_json_rpc_batched(
             tx_obj={
                 "id": 1,
                 "jsonrpc": "2.0",
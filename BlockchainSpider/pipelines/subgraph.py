@@ -1,12 +1,51 @@
 import csv
 import os
+import time
+from collections import OrderedDict
 
 from BlockchainSpider.items import ImportanceItem, SubgraphTxItem
 
 
 class SubgraphTxsPipeline:
-    def __init__(self):
-        self.file_map = dict()
+    """
+    Save the txs of each source into `<out_dir>/<source>.csv`, or into a single
+    `<out_dir>/subgraph.csv` with a leading `source` column in the `partitioned` mode.
+
+    The rows are buffered per file and written every `buffer_size` rows,
+    and all buffers are flushed and dropped once `buffer_size * max_open_files` rows are buffered,
+    or every `flush_interval` seconds.
+    At most `max_open_files` files are kept open in LRU order, and the evicted
+    files are reopened in append mode when more rows come.
+    """
+    PARTITIONED_FILENAME = 'subgraph.csv'
+
+    def __init__(
+            self,
+            out_mode: str = 'source',
+            max_open_files: int = 256,
+            buffer_size: int = 1024,
+            flush_interval: float = 5.0,
+    ):
+        assert out_mode in {'source', 'partitioned'}, 'unknown output mode: %s' % out_mode
+        assert max_open_files > 0 and buffer_size > 0 and flush_interval >= 0
+        self.out_mode = out_mode
+        self.max_open_files = max_open_files
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.last_flush_time = time.time()
+        self.file_map = OrderedDict()
+        self.buffers = dict()
+        self.buffered_rows = 0
+        self.created = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            out_mode=crawler.settings.get('SUBGRAPH_OUT_MODE', 'source'),
+            max_open_files=crawler.settings.getint('SUBGRAPH_MAX_OPEN_FILES', 256),
+            buffer_size=crawler.settings.getint('SUBGRAPH_BUFFER_SIZE', 1024),
+            flush_interval=crawler.settings.getfloat('SUBGRAPH_FLUSH_INTERVAL', 5.0),
+        )
 
     def process_item(self, item, spider):
         if spider.out_dir is None or not isinstance(item, SubgraphTxItem):
@@ -17,27 +56,73 @@ class SubgraphTxsPipeline:
         out_dir = info['out_dir']
         fields = info['out_fields']
 
-        # create output dir
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
-
-        # init file
-        key = '{}_{}'.format(item['source'], out_dir)
-        if self.file_map.get(key) is None:
-            fn = os.path.join(out_dir, '%s.csv' % item['source'])
-            self.file_map[key] = open(fn, 'w', newline='\n', encoding='utf-8')
-            csv.writer(self.file_map[key]).writerow(fields)
-
-        # write item
+        # buffer the row of the file
         row = [item['tx'].get(field, '') for field in fields]
-        csv.writer(self.file_map[key]).writerow(row)
+        if self.out_mode == 'partitioned':
+            fn = os.path.join(out_dir, self.PARTITIONED_FILENAME)
+            row.insert(0, item['source'])
+            fields = ['source', *fields]
+        else:
+            fn = os.path.join(out_dir, '%s.csv' % item['source'])
+        buffer = self.buffers.get(fn)
+        if buffer is None:
+            buffer = self.buffers[fn] = (fields, list())
+        buffer[1].append(row)
+        self.buffered_rows += 1
+        if len(buffer[1]) >= self.buffer_size:
+            self._flush(fn)
+        if self.buffered_rows >= self.buffer_size * self.max_open_files or \
+                time.time() - self.last_flush_time >= self.flush_interval:
+            self._flush_all()
 
         return item
 
+    def _get_writer(self, fn: str, fields: list):
+        if fn in self.file_map:
+            self.file_map.move_to_end(fn)
+            return self.file_map[fn][1]
+
+        # close the least recently used file
+        if len(self.file_map) >= self.max_open_files:
+            _, (f, _) = self.file_map.popitem(last=False)
+            f.close()
+
+        # the file is truncated when it is opened in this crawl for the first time
+        out_dir = os.path.dirname(fn)
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        is_created = fn in self.created
+        f = open(fn, 'a' if is_created else 'w', newline='\n', encoding='utf-8')
+        writer = csv.writer(f)
+        if not is_created:
+            writer.writerow(fields)
+            self.created.add(fn)
+        self.file_map[fn] = (f, writer)
+        return writer
+
+    def _flush(self, fn: str):
+        fields, rows = self.buffers[fn]
+        if len(rows) == 0:
+            return
+        self._get_writer(fn, fields).writerows(rows)
+        self.buffered_rows -= len(rows)
+        rows.clear()
+
+    def _flush_all(self):
+        # the buffers are dropped after flushed, so they do not grow with the sources
+        for fn in self.buffers.keys():
+            self._flush(fn)
+        self.buffers.clear()
+        for f, _ in self.file_map.values():
+            f.flush()
+        self.last_flush_time = time.time()
+
     def close_spider(self, spider):
-        # close all file
-        for f in self.file_map.values():
+        # flush the buffers and close all files
+        self._flush_all()
+        for f, _ in self.file_map.values():
             f.close()
+        self.file_map.clear()
 
 
 class ImportancePipeline:
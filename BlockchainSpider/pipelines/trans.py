@@ -1,20 +1,219 @@
 import csv
 import os
 
+from BlockchainSpider import signals
+from BlockchainSpider.items.sync import SyncSignalItem
 from BlockchainSpider.items.trans import TransactionItem, EventLogItem, TraceItem, ContractItem, \
     Token721TransferItem, Token20TransferItem, Token1155TransferItem, TokenApprovalItem, TokenApprovalAllItem, \
     TokenMetadataItem, NFTMetadataItem, TransactionReceiptItem
 
 
+class ColumnarWriter:
+    """
+    Write the items of a type into a parquet or arrow ipc file with typed columns.
+
+    The items are buffered column by column, and at most `row_group_size` rows
+    are kept in memory before they are written as a row group (a record batch of arrow).
+    The uint256 values are saved as decimal strings, and the hex data such as
+    inputs, codes and log data are saved as binary.
+    """
+    INT_FIELDS = {
+        'block_number', 'timestamp', 'transaction_index', 'transaction_type', 'log_index',
+        'gas', 'gas_used', 'gas_limit', 'gas_price', 'effective_gas_price', 'nonce', 'decimals', 'size',
+    }
+    UINT256_FIELDS = {'value', 'token_id', 'total_supply', 'difficulty', 'total_difficulty'}
+    BOOL_FIELDS = {'is_error', 'removed', 'approved'}
+    BINARY_FIELDS = {'input', 'output', 'code', 'data'}
+    LIST_FIELDS = {'topics', 'transaction_hashes'}
+    UINT256_LIST_FIELDS = {'token_ids', 'values'}
+
+    # the fields of the same name in other types, e.g. the PoW nonce of blocks exceeds int64
+    STRING_FIELDS = {('NFTMetadataItem', 'data')}
+    UINT64_FIELDS = {('BlockItem', 'nonce')}
+
+    # the files end with the magic bytes after the footer is written
+    FOOTER_MAGICS = {'parquet': b'PAR1', 'arrow': b'ARROW1'}
+
+    def __init__(self, fn: str, item_type: str, fields: list, out_format: str, row_group_size: int):
+        assert out_format in {'parquet', 'arrow'}
+        assert row_group_size > 0
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('pyarrow is required for the %s output of TransPipeline' % out_format)
+        self._pa = pyarrow
+
+        self.fn = fn
+        self.fields = fields
+        self.out_format = out_format
+        self.row_group_size = row_group_size
+        self.converters = [self._get_converter(item_type, field) for field in fields]
+        self.schema = pyarrow.schema([
+            (field, self._get_type(item_type, field)) for field in fields
+        ])
+        self.columns = [list() for _ in fields]
+        self.writer = None
+        self.rows = 0
+
+    def _get_kind(self, item_type: str, field: str) -> str:
+        if (item_type, field) in self.STRING_FIELDS:
+            return 'string'
+        if (item_type, field) in self.UINT64_FIELDS:
+            return 'uint64'
+        for kind, fields in [
+            ('int', self.INT_FIELDS),
+            ('uint256', self.UINT256_FIELDS),
+            ('bool', self.BOOL_FIELDS),
+            ('binary', self.BINARY_FIELDS),
+            ('list', self.LIST_FIELDS),
+            ('uint256_list', self.UINT256_LIST_FIELDS),
+        ]:
+            if field in fields:
+                return kind
+        return 'string'
+
+    def _get_type(self, item_type: str, field: str):
+        pa = self._pa
+        return {
+            'int': pa.int64(),
+            'uint64': pa.uint64(),
+            'uint256': pa.string(),
+            'bool': pa.bool_(),
+            'binary': pa.binary(),
+            'list': pa.list_(pa.string()),
+            'uint256_list': pa.list_(pa.string()),
+            'string': pa.string(),
+        }[self._get_kind(item_type, field)]
+
+    def _get_converter(self, item_type: str, field: str):
+        return {
+            'int': lambda v: int(v),
+            'uint64': lambda v: int(v),
+            'uint256': lambda v: str(int(v)),
+            'bool': lambda v: bool(v),
+            'binary': _hex_to_bytes,
+            'list': lambda v: [str(e) for e in v],
+            'uint256_list': lambda v: [str(int(e)) for e in v],
+            'string': lambda v: str(v),
+        }[self._get_kind(item_type, field)]
+
+    def write(self, item):
+        # convert the whole row before buffering, so that a bad value leaves the columns aligned
+        row = list()
+        for i, field in enumerate(self.fields):
+            value = item.get(field)
+            row.append(self.converters[i](value) if value is not None else None)
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        self.rows += 1
+        if len(self.columns[0]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.columns) == 0 or len(self.columns[0]) == 0:
+            return
+        # the buffered rows are dropped even if they can not be converted,
+        # otherwise every later write fails on the same rows
+        columns, self.columns = self.columns, [list() for _ in self.fields]
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(column, type=self.schema.field(i).type) for i, column in enumerate(columns)],
+            schema=self.schema,
+        )
+        if self.writer is None:
+            if self.out_format == 'parquet':
+                import pyarrow.parquet
+                self.writer = pyarrow.parquet.ParquetWriter(self.fn, self.schema)
+            else:
+                import pyarrow.ipc
+                self.writer = pyarrow.ipc.new_file(self.fn, self.schema)
+        if self.out_format == 'parquet':
+            self.writer.write_table(table, row_group_size=self.row_group_size)
+        else:
+            self.writer.write_table(table)
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            with open(self.fn, 'rb') as f:
+                os.fsync(f.fileno())
+
+    @classmethod
+    def is_complete(cls, fn: str, out_format: str) -> bool:
+        """
+        check whether the file is closed with the footer, which is unreadable otherwise
+        :param fn:
+        :param out_format:
+        :return:
+        """
+        magic = cls.FOOTER_MAGICS[out_format]
+        with open(fn, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < 2 * len(magic):
+                return False
+            f.seek(-len(magic), os.SEEK_END)
+            return f.read() == magic
+
+
+def _hex_to_bytes(value: str) -> bytes:
+    value = value[2:] if value.startswith('0x') else value
+    return bytes.fromhex(value if len(value) % 2 == 0 else '0' + value)
+
+
 class TransPipeline:
-    def __init__(self):
+    FILE_EXTENSIONS = {'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrow'}
+
+    def __init__(self, out_format: str = 'csv', row_group_size: int = 65536, part_row_groups: int = 16):
+        assert out_format in self.FILE_EXTENSIONS, 'unknown output format: %s' % out_format
+        assert part_row_groups > 0
+        self.out_format = out_format
+        self.row_group_size = row_group_size
+        self.part_rows = row_group_size * part_row_groups
         self.filename2file = dict()
         self.filename2writer = dict()
         self.filename2headers = dict()
+        self.filename2parts = dict()
+        self.filename2offset = dict()
+
+        # the items of the checkpointed blocks are held until the blocks are finished,
+        # so that the files before a checkpoint contain only the finished blocks
+        self.block2items = dict()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(
+            out_format=crawler.settings.get('TRANS_OUT_FORMAT', 'csv'),
+            row_group_size=crawler.settings.getint('TRANS_ROW_GROUP_SIZE', 65536),
+            part_row_groups=crawler.settings.getint('TRANS_PART_ROW_GROUPS', 16),
+        )
+        crawler.signals.connect(pipeline.checkpoint_saving, signal=signals.checkpoint_saving)
+        return pipeline
+
+    def checkpoint_saving(self, spider, force: bool = False):
+        # the items before the checkpoint must be on disk, or they are lost after a crash,
+        # and the csv files are truncated to the saved offsets on resume
+        for fn, file in self.filename2file.items():
+            file.flush()
+            os.fsync(file.fileno())
+            self.filename2offset[os.path.basename(fn)] = file.tell()
+        # the columnar parts are readable only after closed, so the checkpoint is postponed
+        # until the largest part is full, and then all parts are closed and the next items are written into new parts
+        if self.out_format != 'csv':
+            if not force and max([w.rows for w in self.filename2writer.values()], default=0) < self.part_rows:
+                return False if len(self.filename2writer) > 0 else dict(self.filename2offset)
+            for writer in self.filename2writer.values():
+                writer.close()
+            self.filename2writer.clear()
+        # the offsets are kept after the spider is closed, for the last checkpoint of the spider
+        return dict(self.filename2offset)
 
     def process_item(self, item, spider):
         if getattr(spider, 'out_dir') is None:
             return item
+        if isinstance(item, SyncSignalItem):
+            self._release_block(item, spider)
+            return item
         if not any([isinstance(item, t) for t in [
             TransactionItem, TransactionReceiptItem,
             EventLogItem, TraceItem, ContractItem,
@@ -24,14 +223,53 @@ class TransPipeline:
         ]]):
             return item
 
+        # the items of the failed blocks are dropped, and fetched again on resume
+        if self._is_checkpointed(spider) and item.get('block_number') is not None:
+            self.block2items.setdefault(int(item['block_number']), list()).append(item)
+            return item
+        self._write(item, spider)
+        return item
+
+    @staticmethod
+    def _is_checkpointed(spider) -> bool:
+        return getattr(spider, 'checkpoint', None) is not None and getattr(spider, 'sync_item_key', None) is not None
+
+    def _release_block(self, item: SyncSignalItem, spider):
+        block_number = item['signal'].get('block_number')
+        if block_number is None:
+            return
+        items = self.block2items.pop(int(block_number), list())
+        if item.get('failed'):
+            return
+        for _item in items:
+            self._write(_item, spider)
+
+    def _write(self, item, spider):
         # create output path
         if not os.path.exists(spider.out_dir):
             os.makedirs(spider.out_dir)
 
         # init output file
-        fn = os.path.join(spider.out_dir, '%s.csv' % item.__class__.__name__)
+        fn = os.path.join(
+            spider.out_dir,
+            '%s.%s' % (item.__class__.__name__, self.FILE_EXTENSIONS[self.out_format]),
+        )
+        if self.out_format != 'csv':
+            self._write_columnar(fn, item, spider)
+            return
         if not self.filename2file.get(fn):
-            file = open(fn, 'w', encoding='utf-8', newline='\n')
+            # append to the outputs of the resumed crawl,
+            # and the rows after the checkpoint are truncated since their blocks are fetched again
+            is_append = getattr(spider, 'resume', False) and os.path.exists(fn)
+            offsets = getattr(spider, 'checkpoint_offsets', None)
+            if is_append and offsets is not None:
+                offset = offsets.get(os.path.basename(fn))
+                if offset is None:
+                    is_append = False
+                else:
+                    with open(fn, 'r+b') as f:
+                        f.truncate(offset)
+            file = open(fn, 'a' if is_append else 'w', encoding='utf-8', newline='\n')
             self.filename2file[fn] = file
 
             # init headers
@@ -40,15 +278,58 @@ class TransPipeline:
 
             # init writer
             writer = csv.writer(file)
-            writer.writerow(headers)
+            if not is_append:
+                writer.writerow(headers)
             self.filename2writer[fn] = writer
 
         # save to file
         self.filename2writer[fn].writerow(
             [item[k] for k in self.filename2headers[fn]]
         )
-        return item
+
+    def _write_columnar(self, fn: str, item, spider):
+        writer = self.filename2writer.get(fn)
+        if writer is None:
+            # the columnar files can not be appended,
+            # so the resumed crawl and the items after a checkpoint are written into a new part
+            is_resume = getattr(spider, 'resume', False)
+            if is_resume and fn not in self.filename2parts:
+                self._drop_incomplete_parts(fn)
+            path = fn
+            if is_resume or fn in self.filename2parts:
+                name, ext = os.path.splitext(fn)
+                part = 0
+                while os.path.exists(path):
+                    part += 1
+                    path = '%s.%d%s' % (name, part, ext)
+            self.filename2parts[fn] = self.filename2parts.get(fn, 0) + 1
+
+            # the columns are the fields of the item type, instead of the keys of the first item
+            writer = ColumnarWriter(
+                fn=path,
+                item_type=item.__class__.__name__,
+                fields=sorted(item.fields.keys()),
+                out_format=self.out_format,
+                row_group_size=self.row_group_size,
+            )
+            self.filename2writer[fn] = writer
+        writer.write(item)
+
+    def _drop_incomplete_parts(self, fn: str):
+        # the parts without the footer are left by a crash, and their items are after the checkpoint
+        name, ext = os.path.splitext(fn)
+        dirname, basename = os.path.split(name)
+        for _fn in os.listdir(dirname or '.'):
+            if _fn != basename + ext and not (_fn.startswith(basename + '.') and _fn.endswith(ext)):
+                continue
+            path = os.path.join(dirname, _fn)
+            if not ColumnarWriter.is_complete(path, self.out_format):
+                os.replace(path, path + '.incomplete')
 
     def close_spider(self, spider):
+        self.checkpoint_saving(spider, force=True)
         for file in self.filename2file.values():
             file.close()
+        self.filename2file.clear()
+        self.filename2writer.clear()
+        self.block2items.clear()
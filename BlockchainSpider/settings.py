@@ -54,14 +54,15 @@ DEFAULT_REQUEST_HEADERS = {
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
     'BlockchainSpider.middlewares.RequestCacheMiddleware': 0,
+    'BlockchainSpider.middlewares.APIKeyMiddleware': 10,
     'scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware': None,
 }
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    'scrapy.extensions.telnet.TelnetConsole': None,
-# }
+EXTENSIONS = {
+    'BlockchainSpider.extensions.web3.Web3SessionPoolExtension': 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -117,3 +118,42 @@ APIKEYS = {
         "7SMM4F12EQRRGKYCN2VK6I48R7M8CFNE8R"
     ]
 }
+
+# Extra rolling windows of each apikey in the net, e.g. {"eth": [[100000, 86400]]} for daily quotas
+APIKEYS_WINDOWS = {}
+
+# The max number of requests per second of the given apikeys, overriding the default kps of spiders
+APIKEYS_QUOTAS = {}
+
+# Token price store, `token_price.db` in the utils package if None,
+# and the csv dump of the tick api (token_address, timestamp, price_usd, price_eth, amount_token)
+# imported into a store without ticks
+TOKEN_PRICE_DB_FILENAME = None
+TOKEN_PRICE_TICKS_FILENAME = None
+
+# The max seconds between a price query and the stored ticks answering it without the remote api
+TOKEN_PRICE_TOLERANCE_SECS = 3600
+
+# The max number of eth_calls in a JSON-RPC batch, and the seconds waiting for a batch to fill
+WEB3_RPC_BATCH_SIZE = 50
+WEB3_RPC_BATCH_WINDOW = 0.01
+
+# Contract cache of types, token metadata and codes, `contract.db` in the utils package if None,
+# which is saved as `contract.<chain id>.db` for each chain
+CONTRACT_DB_FILENAME = None
+CONTRACT_DB_MAX_SIZE = 1000000
+
+# Output format of TransPipeline, `csv`, `parquet` or `arrow`, the columnar formats requiring pyarrow,
+# the number of rows buffered for each item type before a row group is written,
+# and the number of row groups in a part file, which is closed at the next checkpoint after it is full
+TRANS_OUT_FORMAT = 'csv'
+TRANS_ROW_GROUP_SIZE = 65536
+TRANS_PART_ROW_GROUPS = 16
+
+# Output of SubgraphTxsPipeline, `source` for a csv file per source or `partitioned` for a single csv file
+# with the source column, the max number of open files, the number of rows buffered for each file,
+# and the seconds between the flushes of all buffers
+SUBGRAPH_OUT_MODE = 'source'
+SUBGRAPH_MAX_OPEN_FILES = 256
+SUBGRAPH_BUFFER_SIZE = 1024
+SUBGRAPH_FLUSH_INTERVAL = 5.0
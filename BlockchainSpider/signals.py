@@ -0,0 +1,8 @@
+"""
+The signals of BlockchainSpider, sent by `crawler.signals` as the signals of scrapy.
+"""
+
+# sent before a spider saves its checkpoint, and the pipelines should write their buffered items to disk,
+# returning a dict of the output file -> byte offset, which is saved in the checkpoint for truncating on resume,
+# or False for postponing the checkpoint to the next finished block
+checkpoint_saving = object()
@@ -1,12 +1,16 @@
 import asyncio
 import json
 import logging
+import os
 import time
 
 import scrapy
+from scrapy import signals
+from twisted.python.failure import Failure
 
 from BlockchainSpider import settings
-from BlockchainSpider.items import BlockItem, TransactionItem
+from BlockchainSpider.items import BlockItem, TransactionItem, SyncSignalItem
+from BlockchainSpider.signals import checkpoint_saving
 from BlockchainSpider.utils.bucket import AsyncItemBucket
 from BlockchainSpider.utils.decorator import log_debug_tracing
 from BlockchainSpider.utils.enum import ETHDataTypes
@@ -46,7 +50,30 @@ class Web3BlockTransactionSpider(scrapy.Spider):
         self.out_dir = kwargs.get('out')
         self.start_block = int(kwargs.get('start_blk', '0'))
         self.end_block = int(kwargs['end_blk']) if kwargs.get('end_blk') else None
+
+        # stream at most `window` block requests of the range at the same time,
+        # instead of scheduling the whole range up front
+        self.window = int(kwargs.get('window', 256))
+
+        # resume the blocks from the checkpoint file, which saves the first unfinished block
+        # and the finished blocks after it, reported by the sync signals of `SyncMiddleware`
+        self.checkpoint = kwargs.get('checkpoint')
+        self.checkpoint_interval = int(kwargs.get('checkpoint_interval', 100))
+        self.resume = False
+        self.range_start_block = self.start_block
+        self.checkpoint_offsets = None
+        self._finished_blocks = set()
+        if self.checkpoint is not None and os.path.exists(self.checkpoint):
+            with open(self.checkpoint, 'r') as f:
+                data = json.load(f)
+            next_block = max(self.start_block, data.get('next_blk', self.start_block))
+            self._finished_blocks = {blk for blk in data.get('finished_blks', list()) if blk >= next_block}
+            self.resume = next_block > self.start_block or len(self._finished_blocks) > 0
+            self.checkpoint_offsets = data.get('offsets')
+            self.start_block = next_block
         self._block_cursor = self.start_block
+        self._next_unfinished_block = self.start_block
+        self._unsaved_blocks = 0
 
         # extract data types
         self.data_types = kwargs.get('types', 'meta,transaction').split(',')
@@ -66,6 +93,12 @@ class Web3BlockTransactionSpider(scrapy.Spider):
             qps=getattr(settings, 'CONCURRENT_REQUESTS', 1),
         )
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.item_scraped, signal=signals.item_scraped)
+        return spider
+
     def start_requests(self):
         request = self.get_request_web3_client_version()
         time.sleep(1 / self.provider_bucket.qps)
@@ -87,13 +120,103 @@ class Web3BlockTransactionSpider(scrapy.Spider):
         if self.end_block is None:
             yield await self.get_request_eth_block_number()
             return
-        end_block = self.end_block + 1
-        for blk in range(self.start_block, end_block):
-            yield await self.get_request_eth_block_by_number(
-                block_number=blk,
-                priority=end_block - blk,
-                cb_kwargs={'sync_item': {'block_number': blk}},
+        for _ in range(self.window):
+            request = await self.get_request_next_block()
+            if request is None:
+                break
+            yield request
+
+    async def get_request_next_block(self):
+        """
+        get the request of the next unfinished block in the range, or None if all blocks are requested
+        """
+        while self._block_cursor in self._finished_blocks:
+            self._block_cursor += 1
+        if self._block_cursor > self.end_block:
+            return None
+        blk, self._block_cursor = self._block_cursor, self._block_cursor + 1
+        return await self.get_request_eth_block_by_number(
+            block_number=blk,
+            priority=self.end_block + 1 - blk,
+            cb_kwargs={'sync_item': {'block_number': blk}},
+        )
+
+    def item_scraped(self, item, response, spider):
+        # the sync signal is scraped after all items of the block are processed by the pipelines
+        if not isinstance(item, SyncSignalItem):
+            return
+        block_number = item['signal'].get('block_number')
+        if block_number is None:
+            return
+        if item.get('failed'):
+            self.log(
+                message='Block {} is unfinished for errors, and it will be fetched again on resume'.format(
+                    block_number
+                ),
+                level=logging.WARNING,
             )
+            return
+        self.finish_block(block_number)
+
+    def finish_block(self, block_number: int):
+        """
+        mark the block finished, and save the checkpoint file every `checkpoint_interval` finished blocks
+        """
+        if block_number < self._next_unfinished_block:
+            return
+        self._finished_blocks.add(block_number)
+        next_block = self._next_unfinished_block
+        while next_block in self._finished_blocks:
+            self._finished_blocks.remove(next_block)
+            next_block += 1
+        self._next_unfinished_block = next_block
+
+        self._unsaved_blocks += 1
+        if self._unsaved_blocks >= self.checkpoint_interval:
+            self.save_checkpoint()
+
+    def save_checkpoint(self):
+        if self.checkpoint is None:
+            return
+
+        # the finished blocks are saved by the pipelines before they are checkpointed,
+        # and the pipelines return the offsets of their output files
+        offsets = dict(self.checkpoint_offsets or dict())
+        crawler = getattr(self, 'crawler', None)
+        if crawler is not None:
+            results = crawler.signals.send_catch_log(signal=checkpoint_saving, spider=self)
+            if any([isinstance(result, Failure) for _, result in results]):
+                self.log(
+                    message='Failed to save the items before the checkpoint, and the checkpoint is not saved',
+                    level=logging.ERROR,
+                )
+                return
+            # the checkpoint is postponed if a pipeline can not save the items now, e.g. a columnar part is not full
+            if any([result is False for _, result in results]):
+                return
+            for _, result in results:
+                if isinstance(result, dict):
+                    offsets.update(result)
+        dirname = os.path.dirname(self.checkpoint)
+        if dirname != '' and not os.path.exists(dirname):
+            os.makedirs(dirname)
+
+        # replace the checkpoint file atomically
+        tmp_fn = self.checkpoint + '.tmp'
+        with open(tmp_fn, 'w') as f:
+            json.dump({
+                'start_blk': self.range_start_block,
+                'end_blk': self.end_block,
+                'next_blk': self._next_unfinished_block,
+                'finished_blks': sorted(self._finished_blocks),
+                'offsets': offsets,
+            }, f)
+        os.replace(tmp_fn, self.checkpoint)
+        self.checkpoint_offsets = offsets
+        self._unsaved_blocks = 0
+
+    def closed(self, reason):
+        self.save_checkpoint()
 
     @log_debug_tracing
     async def parse_eth_block_number(self, response: scrapy.http.Response, **kwargs):
@@ -105,10 +228,12 @@ class Web3BlockTransactionSpider(scrapy.Spider):
             end_block = int(result, 16) + 1
             start_block, self._block_cursor = self._block_cursor, end_block
             for blk in range(start_block, end_block):
+                if blk in self._finished_blocks:
+                    continue
                 yield await self.get_request_eth_block_by_number(
                     block_number=blk,
                     priority=end_block - blk,
-                    cb_kwargs={'block_number': blk},
+                    cb_kwargs={'sync_item': {'block_number': blk}},
                 )
         else:
             self.log(
@@ -129,6 +254,13 @@ class Web3BlockTransactionSpider(scrapy.Spider):
 
     @log_debug_tracing
     async def parse_eth_get_block_by_number(self, response: scrapy.http.Response, **kwargs):
+        # stream the next block of the range before parsing,
+        # or the slot of the window is lost if the response is broken
+        if self.end_block is not None:
+            request = await self.get_request_next_block()
+            if request is not None:
+                yield request
+
         result = json.loads(response.text)
         result = result.get('result')
 
@@ -213,6 +345,20 @@ class Web3BlockTransactionSpider(scrapy.Spider):
                 "id": 1
             }),
             callback=self.parse_eth_get_block_by_number,
+            errback=self.errback_eth_get_block_by_number,
             priority=priority,
             cb_kwargs=cb_kwargs,
         )
+
+    async def errback_eth_get_block_by_number(self, failure):
+        self.log(
+            message='Failed to get block: {}'.format(failure.request.cb_kwargs),
+            level=logging.ERROR,
+        )
+
+        # keep the window of the range, and the failed block stays unfinished in the checkpoint,
+        # the errback outputs skip the spider middlewares, so the refill is traced by the errback of `SyncMiddleware`
+        if self.end_block is not None:
+            request = await self.get_request_next_block()
+            if request is not None:
+                yield request
@@ -30,9 +30,10 @@ class TxsBTCSpider(scrapy.Spider):
         return scrapy.Request(
             url=QueryURLBuilder(
                 original_url=RouterURLBuiler(self.TXS_API_URL).get(['v1', 'btc', 'main', 'txs', txhash])
-            ).get(args={'token': self.apikey_bucket.get(), 'limit': 99999}),
+            ).get(args={'limit': 99999}),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': 'token'},
             cb_kwargs={
                 'source': kwargs['source'],
                 'hash': txhash,
@@ -19,6 +19,7 @@ class TxsBTCAPPRSpider(TxsBTCSpider):
         self.task_map = dict()
         self.alpha = float(kwargs.get('alpha', 0.15))
         self.epsilon = float(kwargs.get('epsilon', 1e-4))
+        self.local_push_budget = int(kwargs['local_push_budget']) if kwargs.get('local_push_budget') else None
 
     def start_requests(self):
         # load source nodes
@@ -28,13 +29,23 @@ class TxsBTCAPPRSpider(TxsBTCSpider):
                 for row in csv.reader(f):
                     source_nodes.add(row[0])
                     self.task_map[row[0]] = SyncSubgraphTask(
-                        strategy=APPR(source=row[0], alpha=self.alpha, epsilon=self.epsilon),
+                        strategy=APPR(
+                            source=row[0],
+                            alpha=self.alpha,
+                            epsilon=self.epsilon,
+                            local_push_budget=self.local_push_budget,
+                        ),
                         source=row[0],
                     )
         elif self.source is not None:
             source_nodes.add(self.source)
             self.task_map[self.source] = SyncSubgraphTask(
-                strategy=APPR(source=self.source, alpha=self.alpha, epsilon=self.epsilon),
+                strategy=APPR(
+                    source=self.source,
+                    alpha=self.alpha,
+                    epsilon=self.epsilon,
+                    local_push_budget=self.local_push_budget,
+                ),
                 source=self.source,
             )
 
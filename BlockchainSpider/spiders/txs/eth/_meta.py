@@ -109,12 +109,12 @@ class TxsETHSpider(scrapy.Spider):
             'sort': 'asc',
             'startblock': max(kwargs.get('startblock', self.start_blk), self.start_blk),
             'endblock': min(kwargs.get('endblock', self.end_blk), self.end_blk),
-            'apikey': self.apikey_bucket.get()
         }
         return scrapy.Request(
             url=QueryURLBuilder(self.TXS_API_URL).get(query_params),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': 'apikey'},
             cb_kwargs={
                 'address': address,
                 **kwargs
@@ -130,12 +130,12 @@ class TxsETHSpider(scrapy.Spider):
             'sort': 'asc',
             'startblock': max(kwargs.get('startblock', self.start_blk), self.start_blk),
             'endblock': min(kwargs.get('endblock', self.end_blk), self.end_blk),
-            'apikey': self.apikey_bucket.get()
         }
         return scrapy.Request(
             url=QueryURLBuilder(self.TXS_API_URL).get(query_params),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': 'apikey'},
             cb_kwargs={
                 'address': address,
                 **kwargs
@@ -151,12 +151,12 @@ class TxsETHSpider(scrapy.Spider):
             'sort': 'asc',
             'startblock': max(kwargs.get('startblock', self.start_blk), self.start_blk),
             'endblock': min(kwargs.get('endblock', self.end_blk), self.end_blk),
-            'apikey': self.apikey_bucket.get()
         }
         return scrapy.Request(
             url=QueryURLBuilder(self.TXS_API_URL).get(query_params),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': 'apikey'},
             cb_kwargs={
                 'address': address,
                 **kwargs
@@ -172,12 +172,12 @@ class TxsETHSpider(scrapy.Spider):
             'sort': 'asc',
             'startblock': max(kwargs.get('startblock', self.start_blk), self.start_blk),
             'endblock': min(kwargs.get('endblock', self.end_blk), self.end_blk),
-            'apikey': self.apikey_bucket.get()
         }
         return scrapy.Request(
             url=QueryURLBuilder(self.TXS_API_URL).get(query_params),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': 'apikey'},
             cb_kwargs={
                 'address': address,
                 **kwargs
@@ -191,6 +191,16 @@ class TxsETHSpider(scrapy.Spider):
 
     def load_txs_from_response(self, response, **kwargs):
         data = json.loads(response.text)
+        return self.parse_txs(data, self.symbols)
+
+    @staticmethod
+    def parse_txs(data: dict, symbols: set = None):
+        """
+        parse the txs from the json data of the api, and filter them by token symbols
+        :param data:
+        :param symbols:
+        :return: a list of txs, or None if the data is an error message
+        """
         txs = None
         if isinstance(data.get('result'), list):
             txs = list()
@@ -202,7 +212,7 @@ class TxsETHSpider(scrapy.Spider):
                 if tx['from'] == '' or tx['to'] == '':
                     continue
 
-                if self.symbols and tx.get('tokenSymbol', 'native') not in self.symbols:
+                if symbols and tx.get('tokenSymbol', 'native') not in symbols:
                     continue
 
                 tx['value'] = int(tx.get('value', 1))
@@ -16,6 +16,7 @@ class TxsETHAPPRSpider(TxsETHSpider):
         self.task_map = dict()
         self.alpha = float(kwargs.get('alpha', 0.15))
         self.epsilon = float(kwargs.get('epsilon', 1e-3))
+        self.local_push_budget = int(kwargs['local_push_budget']) if kwargs.get('local_push_budget') else None
 
     def start_requests(self):
         # load source nodes
@@ -27,6 +28,8 @@ class TxsETHAPPRSpider(TxsETHSpider):
                         source=info['source'],
                         alpha=float(info.get('alpha', 0.15)),
                         epsilon=float(info.get('epsilon', 1e-3)),
+                        local_push_budget=int(info['local_push_budget']) if info.get('local_push_budget') \
+                            else self.local_push_budget,
                     ),
                     **info
                 )
@@ -35,7 +38,8 @@ class TxsETHAPPRSpider(TxsETHSpider):
                 strategy=APPR(
                     source=self.source,
                     alpha=self.alpha,
-                    epsilon=self.epsilon
+                    epsilon=self.epsilon,
+                    local_push_budget=self.local_push_budget,
                 ),
                 **self.info
             )
@@ -1,10 +1,12 @@
 import json
 import logging
+import os
 
 from BlockchainSpider import strategies
 from BlockchainSpider.items import SubgraphTxItem, ImportanceItem
 from BlockchainSpider.spiders.txs.eth._meta import TxsETHSpider
 from BlockchainSpider.tasks import SyncSubgraphTask
+from BlockchainSpider.utils.token_price import resolve_prices
 
 
 class TxsETHTTRSpider(TxsETHSpider):
@@ -24,6 +26,37 @@ class TxsETHTTRSpider(TxsETHSpider):
         assert self.strategy_cls in TxsETHTTRSpider.allow_strategies
         self.strategy_cls = getattr(strategies, self.strategy_cls)
 
+        # push kernel of TTRBase and TTRWeight, `python` or `numpy`
+        self.kernel = kwargs.get('kernel', None)
+
+        # multi-epsilon mode, save the outputs of each epsilon into `epsilon_{epsilon}` of the output dir
+        self.epsilons = kwargs.get('epsilons', None)
+        self.epsilons = [float(e) for e in self.epsilons.split(',')] if self.epsilons else None
+
+        # share the in-flight requests of the same address among tasks,
+        # and fan out the response to the push of every waiting task
+        self.share_requests = kwargs.get('share_requests', 'True') == 'True'
+        self._inflight_requests = dict()
+
+        # the max number of token prices requested at the same time before the push of TTRPrice and TTRAlpha
+        self.price_concurrency = int(kwargs.get('price_concurrency', 8))
+
+        # speculative mode: prefetch the txs of the top-k residual nodes while the popped node is fetched,
+        # and the pushes stay in the order of pops, or the popped node can be replaced by a prefetched one
+        # whose residual is not less than `(1 - prefetch_tolerance)` of the popped residual
+        self.prefetch = int(kwargs.get('prefetch', 0))
+        self.prefetch_tolerance = float(kwargs.get('prefetch_tolerance', 0))
+        assert self.prefetch >= 0
+        assert 0 <= self.prefetch_tolerance < 1
+
+        # batch mode: push the top node and at most `batch_size - 1` other nodes whose residuals are
+        # greater than `epsilon * batch_threshold` together in one round, and fetch their txs concurrently
+        self.batch_size = int(kwargs.get('batch_size', 1))
+        self.batch_threshold = float(kwargs.get('batch_threshold', 1.0))
+        assert self.batch_size > 0
+        assert self.batch_threshold >= 1
+        assert self.prefetch == 0 or self.batch_size == 1, 'prefetch and batch mode can not be used together'
+
     def start_requests(self):
         # load source infos
         if self.filename is not None:
@@ -39,6 +72,8 @@ class TxsETHTTRSpider(TxsETHSpider):
                         alpha=float(info.get('alpha', 0.15)),
                         beta=float(info.get('beta', 0.7)),
                         epsilon=float(info.get('epsilon', 1e-3)),
+                        epsilons=self.load_epsilons(info.get('epsilons')),
+                        **({'kernel': info['kernel']} if info.get('kernel') else dict())
                     ),
                     **{k: v for k, v in info.items() if k != 'strategy'}
                 )
@@ -48,7 +83,9 @@ class TxsETHTTRSpider(TxsETHSpider):
                     source=self.source,
                     alpha=self.alpha,
                     beta=self.beta,
-                    epsilon=self.epsilon
+                    epsilon=self.epsilon,
+                    epsilons=self.epsilons,
+                    **({'kernel': self.kernel} if self.kernel else dict())
                 ),
                 **self.info
             )
@@ -58,7 +95,7 @@ class TxsETHTTRSpider(TxsETHSpider):
             task: SpiderTask = self.task_map[tid]
             task.wait_all()
             for txs_type in task.info['txs_types']:
-                yield self.txs_req_getter[txs_type](
+                request = self.txs_req_getter[txs_type](
                     address=task.info['source'],
                     **{
                         'residual': 1.0,
@@ -67,42 +104,229 @@ class TxsETHTTRSpider(TxsETHSpider):
                         'task_id': tid
                     }
                 )
+                if request is not None:
+                    yield request
+
+    @staticmethod
+    def load_epsilons(epsilons):
+        if not epsilons:
+            return None
+        if isinstance(epsilons, str):
+            epsilons = epsilons.split(',')
+        return [float(e) for e in epsilons]
+
+    def get_external_txs_request(self, address: str, **kwargs):
+        return self._get_shared_request(super().get_external_txs_request, address, **kwargs)
+
+    def get_internal_txs_request(self, address: str, **kwargs):
+        return self._get_shared_request(super().get_internal_txs_request, address, **kwargs)
+
+    def get_erc20_txs_request(self, address: str, **kwargs):
+        return self._get_shared_request(super().get_erc20_txs_request, address, **kwargs)
+
+    def get_erc721_txs_request(self, address: str, **kwargs):
+        return self._get_shared_request(super().get_erc721_txs_request, address, **kwargs)
+
+    @staticmethod
+    def _get_request_key(func_txs_type_request, address: str, **kwargs):
+        return func_txs_type_request.__name__, address, kwargs.get('startblock'), kwargs.get('endblock')
+
+    def _get_shared_request(self, func_txs_type_request, address: str, **kwargs):
+        """
+        get the request of the address, or None if the same request is in flight,
+        and the task will be pushed with the response of the in-flight request
+        """
+        if not self.share_requests:
+            return self._with_errback(func_txs_type_request, func_txs_type_request(address, **kwargs))
+
+        key = self._get_request_key(func_txs_type_request, address, **kwargs)
+        waiters = self._inflight_requests.get(key)
+        if waiters is not None:
+            waiters.append({'address': address, **kwargs})
+            self._inc_stats('ttr/shared_request/saved')
+            return None
+
+        self._inflight_requests[key] = [{'address': address, **kwargs}]
+        self._inc_stats('ttr/shared_request/sent')
+        return self._with_errback(func_txs_type_request, func_txs_type_request(address, **kwargs))
+
+    def _with_errback(self, func_txs_type_request, request):
+        # the failed downloads release the waiters of the request in `errback_txs`
+        return request.replace(
+            meta={**request.meta, 'txs_request': func_txs_type_request.__name__},
+            errback=self.errback_txs,
+        )
+
+    async def errback_txs(self, failure):
+        """
+        retry a failed download once, e.g. timeout or non-200 status,
+        then fuse the address for every task waiting for it
+        """
+        request = failure.request
+        func_txs_type_request = getattr(self, request.meta['txs_request'])
+        key = self._get_request_key(func_txs_type_request, **request.cb_kwargs)
+        waiters = self._inflight_requests.pop(key, None) or [request.cb_kwargs]
+
+        if not request.meta.get('errback_retried'):
+            self.log(
+                message="On errback: failed to download {}, retrying, for reason {}".format(
+                    request.url, failure.getErrorMessage()),
+                level=logging.WARNING,
+            )
+            if self.share_requests:
+                self._inflight_requests[key] = waiters
+            yield request.replace(meta={**request.meta, 'errback_retried': True})
+            return
+
+        self.log(
+            message="On errback: failed on {}, for reason {}".format(request.url, failure.getErrorMessage()),
+            level=logging.ERROR,
+        )
+        for _kwargs in waiters:
+            if _kwargs.get('prefetch'):
+                outputs = self.prefetch_error_process(**_kwargs)
+            else:
+                outputs = self.fuse_process(**_kwargs)
+            for output in self._filter_requests(outputs):
+                yield output
+        for tid in {_kwargs['task_id'] for _kwargs in waiters}:
+            async for output in self.consume_prefetched(tid):
+                yield output
+            async for output in self.consume_batch(tid):
+                yield output
+
+    def _inc_stats(self, key: str):
+        crawler = getattr(self, 'crawler', None)
+        if crawler is not None:
+            crawler.stats.inc_value(key, spider=self)
+
+    def closed(self, reason):
+        crawler = getattr(self, 'crawler', None)
+        if crawler is None:
+            return
+        sent = crawler.stats.get_value('ttr/shared_request/sent', 0, spider=self)
+        saved = crawler.stats.get_value('ttr/shared_request/saved', 0, spider=self)
+        if sent + saved > 0:
+            crawler.stats.set_value('ttr/shared_request/saved_ratio', saved / (sent + saved), spider=self)
+        sent = crawler.stats.get_value('ttr/prefetch/sent', 0, spider=self)
+        used = crawler.stats.get_value('ttr/prefetch/used', 0, spider=self)
+        if sent > 0:
+            crawler.stats.set_value('ttr/prefetch/used_ratio', used / sent, spider=self)
+        rounds = crawler.stats.get_value('ttr/batch/rounds', 0, spider=self)
+        nodes = crawler.stats.get_value('ttr/batch/nodes', 0, spider=self)
+        if rounds > 0:
+            crawler.stats.set_value('ttr/batch/avg_size', nodes / rounds, spider=self)
+
+    async def _proess_response(self, response, func_txs_type_request, **kwargs):
+        # load the tasks waiting for this response
+        key = self._get_request_key(func_txs_type_request, **kwargs)
+        waiters = self._inflight_requests.pop(key, None) or [kwargs]
 
-    def _proess_response(self, response, func_txs_type_request, **kwargs):
         # parse data from response and handle error
         txs = self.load_txs_from_response(response, **kwargs)
         if txs is None:
-            yield from self.error_process(func_txs_type_request, response, **kwargs)
+            for _kwargs in waiters:
+                if _kwargs.get('prefetch'):
+                    outputs = self.prefetch_error_process(**_kwargs)
+                elif _kwargs.get('batch'):
+                    outputs = self.batch_error_process(func_txs_type_request, response, **_kwargs)
+                else:
+                    outputs = self.error_process(func_txs_type_request, response, **_kwargs)
+                for output in self._filter_requests(outputs):
+                    yield output
         else:
-            yield from self.normal_process(func_txs_type_request, txs, **kwargs)
+            # strategies may modify the txs in place, so every waiting task pushes its own copy
+            txs_list = [txs] + [[dict(tx) for tx in txs] for _ in range(len(waiters) - 1)]
+            for _txs, _kwargs in zip(txs_list, waiters):
+                if _kwargs.get('prefetch'):
+                    outputs = self.prefetch_process(_txs, **_kwargs)
+                elif _kwargs.get('batch'):
+                    outputs = self.batch_process(func_txs_type_request, _txs, **_kwargs)
+                else:
+                    await self.resolve_prices(_txs, **_kwargs)
+                    outputs = self.normal_process(func_txs_type_request, _txs, **_kwargs)
+                for output in self._filter_requests(outputs):
+                    yield output
+
+        # push the popped nodes whose txs have been prefetched, or the batch whose txs have been fetched
+        for tid in {_kwargs['task_id'] for _kwargs in waiters}:
+            async for output in self.consume_prefetched(tid):
+                yield output
+            async for output in self.consume_batch(tid):
+                yield output
+
+    async def resolve_prices(self, txs: list, **kwargs):
+        """
+        resolve the token prices needed by the push in one batch without blocking the reactor,
+        and hand them to the strategy
+        """
+        task: SpiderTask = self.task_map[kwargs['task_id']]
+        if task.is_closed:
+            return
+        keys = task.strategy.get_price_keys(kwargs['address'], txs)
+        if len(keys) == 0:
+            return
+        prices = await resolve_prices(keys, concurrency=self.price_concurrency)
+        task.strategy.prices.update(prices)
+        self.log(
+            message='Resolved {}/{} token prices of {}'.format(len(prices), len(keys), kwargs['address']),
+            level=logging.INFO,
+        )
+
+    @staticmethod
+    def _filter_requests(outputs):
+        # the shared requests are None
+        for output in outputs:
+            if output is not None:
+                yield output
 
     def normal_process(self, func_txs_type_request, txs, **kwargs):
         tid = kwargs['task_id']
         task: SpiderTask = self.task_map[tid]
 
-        # push data to task and save tx
-        for tx in task.push(
-                node=kwargs['address'],
-                edges=txs,
-        ):
-            yield SubgraphTxItem(source=task.info['source'], tx=tx, task_info=task.info)
+        # push data to task and save tx,
+        # which belongs to the epsilons not terminated yet in multi-epsilon mode
+        epsilons = task.strategy.pending_epsilons if task.is_multi_epsilon() else None
+        yield from self.generate_subgraph_tx_items(task, task.push(node=kwargs['address'], edges=txs), epsilons)
 
-        if len(txs) > 10000 and task.info['auto_page'] is True:
+        if len(txs) > 10000 and task.info['auto_page'] is True and not kwargs.get('prefetch'):
             yield from self.generate_next_request(func_txs_type_request, txs, task, **kwargs)
             return
 
         if task.is_locked():
             return
+        yield from self.generate_pop_outputs(task, tid, epsilons)
+
+    @staticmethod
+    def generate_subgraph_tx_items(task, txs, epsilons: list):
+        # save the txs yielded by the push
+        for tx in txs:
+            if epsilons is None:
+                yield SubgraphTxItem(source=task.info['source'], tx=tx, task_info=task.info)
+                continue
+            for epsilon in epsilons:
+                yield SubgraphTxItem(source=task.info['source'], tx=tx, task_info=task.get_epsilon_info(epsilon))
 
+    def generate_pop_outputs(self, task, tid, epsilons: list):
         # save ttr
-        yield ImportanceItem(
-            source=task.info['source'],
-            importance=task.strategy.p,
-            task_info=task.info
-        )
+        if epsilons is None:
+            yield ImportanceItem(
+                source=task.info['source'],
+                importance=task.strategy.p,
+                task_info=task.info
+            )
 
         # generate next address or finish
+        if self.batch_size > 1:
+            items = task.pop_batch(self.batch_size, self.batch_threshold)
+            if epsilons is not None:
+                yield from self.generate_epsilon_importance_items(task, epsilons)
+            if len(items) > 0:
+                yield from self.generate_batch_requests(items, task, tid)
+            return
         item = task.pop()
+        if epsilons is not None:
+            yield from self.generate_epsilon_importance_items(task, epsilons)
         if item is not None:
             # next address request
             yield from self.generate_extend_request(item, task, tid)
@@ -135,10 +359,41 @@ class TxsETHTTRSpider(TxsETHSpider):
             message="On parse: failed on {}, for reason {}".format(response.url, str(response.text)),
             level=logging.ERROR,
         )
+        yield from self.fuse_process(**kwargs)
+
+    def fuse_process(self, **kwargs):
+        tid = kwargs['task_id']
+        task: SpiderTask = self.task_map[tid]
+        if task.is_closed:
+            return
+
+        # the node of a batch is pushed with the txs fetched so far
+        if kwargs.get('batch'):
+            entry = task.batch.get(kwargs['address'])
+            if entry is not None:
+                entry['pending'] -= 1
+            return
+
+        epsilons = task.strategy.pending_epsilons if task.is_multi_epsilon() else None
         item = task.fuse(kwargs['address'])
+        if epsilons is not None:
+            yield from self.generate_epsilon_importance_items(task, epsilons)
         if item is not None:
             yield from self.generate_extend_request(item, task, tid)
 
+    @staticmethod
+    def generate_epsilon_importance_items(task, epsilons: list):
+        # save the importance of the epsilons terminated on the last pop
+        for epsilon in epsilons:
+            importance = task.strategy.importances.get(epsilon)
+            if importance is None:
+                continue
+            yield ImportanceItem(
+                source=task.info['source'],
+                importance=importance,
+                task_info=task.get_epsilon_info(epsilon)
+            )
+
     @staticmethod
     def generate_binary_request(func_txs_type_request, task, **kwargs):
         task.wait()
@@ -182,6 +437,12 @@ class TxsETHTTRSpider(TxsETHSpider):
         )
 
     def generate_extend_request(self, item, task, tid):
+        if self.prefetch > 0:
+            yield from self.generate_speculative_request(item, task, tid)
+            return
+        yield from self.generate_fetch_request(item, task, tid)
+
+    def generate_fetch_request(self, item, task, tid):
         self.log(
             message='On parse: Extend {} from seed of {}, residual {}'.format(
                 item['node'], task.info['source'], item['residual']
@@ -200,20 +461,279 @@ class TxsETHTTRSpider(TxsETHSpider):
                 }
             )
 
-    def parse_external_txs(self, response, **kwargs):
-        yield from self._proess_response(response, self.get_external_txs_request, **kwargs)
+    def generate_speculative_request(self, item, task, tid):
+        """
+        extend the popped node with its prefetched txs if possible, and prefetch the next top-k nodes
+        """
+        ready = self._get_prefetched_item(item, task)
+        entry = task.prefetched.get(item['node'])
+        if ready is not None:
+            # the prefetched node is pushed by `consume_prefetched` after the response is processed
+            task.ready = ready
+        elif entry is not None:
+            # wait for the in-flight prefetch of the popped node
+            task.wanted = item
+        else:
+            yield from self.generate_fetch_request(item, task, tid)
+        yield from self.generate_prefetch_requests(task, tid, exclude=item['node'])
+
+    def _get_prefetched_item(self, item, task):
+        entry = task.prefetched.get(item['node'])
+        if entry is not None and len(entry['pending']) == 0:
+            return item
+        if self.prefetch_tolerance == 0:
+            return None
+
+        # replace the popped node by a prefetched node of nearly the same residual
+        for candidate in task.strategy.peek(self.prefetch + 1):
+            entry = task.prefetched.get(candidate['node'])
+            if entry is None or len(entry['pending']) > 0:
+                continue
+            if candidate['residual'] >= (1 - self.prefetch_tolerance) * item['residual']:
+                self._inc_stats('ttr/prefetch/reordered')
+                return candidate
+        return None
+
+    def generate_prefetch_requests(self, task, tid, exclude):
+        candidates = [c for c in task.strategy.peek(self.prefetch + 1) if c['node'] != exclude][:self.prefetch]
+
+        # drop the prefetched txs of the nodes falling out of the top-k
+        if len(task.prefetched) > 2 * self.prefetch:
+            keep = {c['node'] for c in candidates} | {exclude}
+            for node in list(task.prefetched.keys()):
+                if node not in keep and len(task.prefetched[node]['pending']) == 0:
+                    del task.prefetched[node]
+                    self._inc_stats('ttr/prefetch/dropped')
+
+        for candidate in candidates:
+            if candidate['node'] in task.prefetched:
+                continue
+            task.prefetched[candidate['node']] = dict(txs=list(), pending=set(task.info['txs_types']))
+            self._inc_stats('ttr/prefetch/sent')
+            for txs_type in task.info['txs_types']:
+                yield self.txs_req_getter[txs_type](
+                    address=candidate['node'],
+                    **{
+                        'startblock': task.info['start_blk'],
+                        'endblock': task.info['end_blk'],
+                        'residual': candidate['residual'],
+                        'task_id': tid,
+                        'prefetch': True,
+                        'txs_type': txs_type,
+                    }
+                )
+
+    def prefetch_process(self, txs, **kwargs):
+        task: SpiderTask = self.task_map[kwargs['task_id']]
+        entry = task.prefetched.get(kwargs['address'])
+        if task.is_closed or entry is None:
+            return
+
+        # the paged txs are fetched again when the node is popped
+        if len(txs) > 10000 and task.info['auto_page'] is True:
+            yield from self.prefetch_error_process(**kwargs)
+            return
+
+        entry['txs'].extend(txs)
+        entry['pending'].discard(kwargs['txs_type'])
+        if len(entry['pending']) == 0 and task.wanted is not None and task.wanted['node'] == kwargs['address']:
+            task.ready, task.wanted = task.wanted, None
+
+    def prefetch_error_process(self, **kwargs):
+        task: SpiderTask = self.task_map[kwargs['task_id']]
+        if task.is_closed or task.prefetched.pop(kwargs['address'], None) is None:
+            return
+        self._inc_stats('ttr/prefetch/failed')
+
+        # fetch the popped node again if it is waiting for the failed prefetch
+        if task.wanted is not None and task.wanted['node'] == kwargs['address']:
+            item, task.wanted = task.wanted, None
+            yield from self.generate_fetch_request(item, task, kwargs['task_id'])
+
+    async def consume_prefetched(self, tid):
+        """
+        push the ready nodes of the task with their prefetched txs, in the order of pops
+        """
+        task: SpiderTask = self.task_map[tid]
+        while task.ready is not None and not task.is_closed:
+            item, task.ready = task.ready, None
+            entry = task.prefetched.pop(item['node'])
+            self._inc_stats('ttr/prefetch/used')
+            self.log(
+                message='On parse: Extend {} from seed of {} with prefetched txs, residual {}'.format(
+                    item['node'], task.info['source'], item['residual']
+                ),
+                level=logging.INFO
+            )
+            kwargs = {
+                'address': item['node'],
+                'startblock': task.info['start_blk'],
+                'endblock': task.info['end_blk'],
+                'residual': item['residual'],
+                'task_id': tid,
+                'prefetch': True,
+            }
+            await self.resolve_prices(entry['txs'], **kwargs)
+
+            # the txs of all types are pushed at once
+            task.wait()
+            for output in self._filter_requests(self.normal_process(None, entry['txs'], **kwargs)):
+                yield output
+
+    def generate_batch_requests(self, items: list, task, tid):
+        """
+        fetch the txs of the popped nodes concurrently, and the nodes are pushed by `consume_batch`
+        after the txs of all nodes are fetched
+        """
+        self.log(
+            message='On parse: Extend {} nodes from seed of {} in batch, residual {} to {}'.format(
+                len(items), task.info['source'], items[0]['residual'], items[-1]['residual']
+            ),
+            level=logging.INFO
+        )
+        self._inc_stats('ttr/batch/rounds')
+        task.batch = {item['node']: dict(txs=list(), pending=len(task.info['txs_types'])) for item in items}
+        for item in items:
+            self._inc_stats('ttr/batch/nodes')
+            for txs_type in task.info['txs_types']:
+                yield self.txs_req_getter[txs_type](
+                    address=item['node'],
+                    **{
+                        'startblock': task.info['start_blk'],
+                        'endblock': task.info['end_blk'],
+                        'residual': item['residual'],
+                        'task_id': tid,
+                        'batch': True,
+                    }
+                )
+
+    def batch_process(self, func_txs_type_request, txs, **kwargs):
+        task: SpiderTask = self.task_map[kwargs['task_id']]
+        entry = task.batch.get(kwargs['address'])
+        if task.is_closed or entry is None:
+            return
+        entry['txs'].extend(txs)
+
+        # the next page replaces this request, so the pending count is unchanged
+        if len(txs) > 10000 and task.info['auto_page'] is True:
+            yield func_txs_type_request(
+                address=kwargs['address'],
+                **{
+                    **{k: v for k, v in kwargs.items() if k not in {'address', 'retry'}},
+                    'startblock': self.get_max_blk(txs),
+                }
+            )
+            return
+        entry['pending'] -= 1
+
+    def batch_error_process(self, func_txs_type_request, response, **kwargs):
+        task: SpiderTask = self.task_map[kwargs['task_id']]
+        entry = task.batch.get(kwargs['address'])
+        if task.is_closed or entry is None:
+            return
+        error_message = json.loads(response.text)["message"]
+
+        if error_message == "Query Timeout occured. Please select a smaller result dataset":
+            entry['pending'] += 1
+            mid_block = (int(kwargs['startblock']) + int(kwargs['endblock'])) // 2
+            for startblock, endblock in [(kwargs['startblock'], mid_block), (mid_block, kwargs['endblock'])]:
+                yield func_txs_type_request(
+                    address=kwargs['address'],
+                    **{
+                        **{k: v for k, v in kwargs.items() if k not in {'address', 'retry'}},
+                        'startblock': startblock,
+                        'endblock': endblock,
+                    }
+                )
+            return
+        if error_message == "Max rate limit reached":
+            yield from self.generate_retry_request(func_txs_type_request, **kwargs)
+            return
+
+        kwargs['retry'] = kwargs.get('retry', 0) + 1
+        if kwargs['retry'] < self.max_retry:
+            self.log(
+                message="On parse: Get error status from {}, retrying {}, for reason {}".format(
+                    response.url, kwargs['retry'], str(response.body)),
+                level=logging.WARNING,
+            )
+            yield from self.generate_retry_request(func_txs_type_request, **kwargs)
+            return
+
+        # the node is pushed with the txs fetched so far, as a fused node
+        self.log(
+            message="On parse: failed on {}, for reason {}".format(response.url, str(response.text)),
+            level=logging.ERROR,
+        )
+        yield from self.fuse_process(**kwargs)
+
+    async def consume_batch(self, tid):
+        """
+        push the nodes of the batch in one round after the txs of all nodes are fetched,
+        and fetch the next batch
+        """
+        task: SpiderTask = self.task_map[tid]
+        if task.is_closed or len(task.batch) == 0:
+            return
+        if any([entry['pending'] > 0 for entry in task.batch.values()]):
+            return
+        batch = [(node, entry['txs']) for node, entry in task.batch.items()]
+        task.batch = dict()
+        for node, txs in batch:
+            await self.resolve_prices(txs, address=node, task_id=tid)
+
+        epsilons = task.strategy.pending_epsilons if task.is_multi_epsilon() else None
+        outputs = self.generate_subgraph_tx_items(task, task.strategy.push_batch(batch), epsilons)
+        for output in self._filter_requests(outputs):
+            yield output
+        for output in self._filter_requests(self.generate_pop_outputs(task, tid, epsilons)):
+            yield output
 
-    def parse_internal_txs(self, response, **kwargs):
-        yield from self._proess_response(response, self.get_internal_txs_request, **kwargs)
+    async def parse_external_txs(self, response, **kwargs):
+        async for output in self._proess_response(response, self.get_external_txs_request, **kwargs):
+            yield output
 
-    def parse_erc20_txs(self, response, **kwargs):
-        yield from self._proess_response(response, self.get_erc20_txs_request, **kwargs)
+    async def parse_internal_txs(self, response, **kwargs):
+        async for output in self._proess_response(response, self.get_internal_txs_request, **kwargs):
+            yield output
 
-    def parse_erc721_txs(self, response, **kwargs):
-        yield from self._proess_response(response, self.get_erc721_txs_request, **kwargs)
+    async def parse_erc20_txs(self, response, **kwargs):
+        async for output in self._proess_response(response, self.get_erc20_txs_request, **kwargs):
+            yield output
+
+    async def parse_erc721_txs(self, response, **kwargs):
+        async for output in self._proess_response(response, self.get_erc721_txs_request, **kwargs):
+            yield output
 
 
 class SpiderTask(SyncSubgraphTask):
+    def __init__(self, strategy, **kwargs):
+        super().__init__(strategy, **kwargs)
+        self._epsilon_infos = dict()
+
+        # speculative mode, the prefetched txs of nodes, the popped node waiting for its prefetch,
+        # and the popped node ready to be pushed with its prefetched txs
+        self.prefetched = dict()
+        self.wanted = None
+        self.ready = None
+
+        # batch mode, the popped nodes of the round -> the fetched txs and the number of pending requests
+        self.batch = dict()
+
+    def pop_batch(self, batch_size: int, threshold: float) -> list:
+        if self.is_closed or self.is_locked():
+            return list()
+        return self.strategy.pop_batch(batch_size, threshold)
 
     def wait_all(self):
         super().wait(len(self.info['txs_types']))
+
+    def is_multi_epsilon(self):
+        return len(self.strategy.epsilons) > 1
+
+    def get_epsilon_info(self, epsilon: float) -> dict:
+        info = self._epsilon_infos.get(epsilon)
+        if info is None:
+            info = {**self.info, 'out_dir': os.path.join(self.info['out_dir'], 'epsilon_%s' % str(epsilon))}
+            self._epsilon_infos[epsilon] = info
+        return info
@@ -22,11 +22,11 @@ class TxsTRONAPPRSpider(TxsETHAPPRSpider):
             # 'start_timestamp': max(kwargs.get('startblock', self.start_blk), self.start_blk),
             # 'end_timestamp': min(kwargs.get('endblock', self.end_blk), self.end_blk),
         }
-        _ = self.apikey_bucket.get()
         return scrapy.Request(
             url=QueryURLBuilder(self.TXS_API_URL + '/transaction').get(query_params),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': ''},
             cb_kwargs={
                 'address': address,
                 **kwargs
@@ -42,11 +42,11 @@ class TxsTRONAPPRSpider(TxsETHAPPRSpider):
             # 'start_timestamp': max(kwargs.get('startblock', self.start_blk), self.start_blk),
             # 'end_timestamp': min(kwargs.get('endblock', self.end_blk), self.end_blk),
         }
-        _ = self.apikey_bucket.get()
         return scrapy.Request(
             url=QueryURLBuilder(self.TXS_API_URL + '/internal-transaction').get(query_params),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': ''},
             cb_kwargs={
                 'address': address,
                 **kwargs
@@ -62,13 +62,13 @@ class TxsTRONAPPRSpider(TxsETHAPPRSpider):
             # 'start_timestamp': max(kwargs.get('startblock', self.start_blk), self.start_blk),
             # 'end_timestamp': min(kwargs.get('endblock', self.end_blk), self.end_blk),
         }
-        _ = self.apikey_bucket.get()
         if kwargs.get('retry') is not None:
             query_params['retry'] = kwargs['retry']
         return scrapy.Request(
             url=QueryURLBuilder(self.TXS_API_URL + '/contract/events').get(query_params),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': ''},
             cb_kwargs={
                 'address': address,
                 **kwargs
@@ -24,11 +24,11 @@ class TxsTRONBFSSpider(TxsETHBFSSpider):
             # 'start_timestamp': max(kwargs.get('startblock', self.start_blk), self.start_blk),
             # 'end_timestamp': min(kwargs.get('endblock', self.end_blk), self.end_blk),
         }
-        _ = self.apikey_bucket.get()
         return scrapy.Request(
             url=QueryURLBuilder(self.TXS_API_URL + '/transaction').get(query_params),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': ''},
             cb_kwargs={
                 'address': address,
                 **kwargs
@@ -44,11 +44,11 @@ class TxsTRONBFSSpider(TxsETHBFSSpider):
             # 'start_timestamp': max(kwargs.get('startblock', self.start_blk), self.start_blk),
             # 'end_timestamp': min(kwargs.get('endblock', self.end_blk), self.end_blk),
         }
-        _ = self.apikey_bucket.get()
         return scrapy.Request(
             url=QueryURLBuilder(self.TXS_API_URL + '/internal-transaction').get(query_params),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': ''},
             cb_kwargs={
                 'address': address,
                 **kwargs
@@ -63,13 +63,13 @@ class TxsTRONBFSSpider(TxsETHBFSSpider):
             # 'start_timestamp': 0,
             'end_timestamp': max(kwargs.get('startblock', 0), self.start_blk),
         }
-        _ = self.apikey_bucket.get()
         if kwargs.get('retry') is not None:
             query_params['retry'] = kwargs['retry']
         return scrapy.Request(
             url=QueryURLBuilder(self.TXS_API_URL + '/contract/events').get(query_params),
             method='GET',
             dont_filter=True,
+            meta={'apikey_param': ''},
             cb_kwargs={
                 'address': address,
                 **kwargs
@@ -1,4 +1,4 @@
-from BlockchainSpider.strategies.txs.push_pop import PushPopModel
+from BlockchainSpider.strategies.txs.push_pop import PushPopModel, CachedPushPopModel
 from BlockchainSpider.strategies.txs.bfs import BFS
 from BlockchainSpider.strategies.txs.poison import Poison
 from BlockchainSpider.strategies.txs.appr import APPR
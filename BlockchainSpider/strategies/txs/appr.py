@@ -1,32 +1,12 @@
-from BlockchainSpider.strategies import PushPopModel
-
-
-class LRUCache:
-    def __init__(self, max_size: int = 1024):
-        self.max_size = max_size
-        self._cache = dict()
-        self._key_list = list()
-
-    def get(self, key):
-        value = self._cache.get(key)
-        if value is not None:
-            self._key_list.remove(key)
-            self._key_list.insert(0, key)
-        return value
+from collections import deque
 
-    def set(self, key, value):
-        # replace cache item if full
-        if len(self._cache) >= self.max_size:
-            _key = self._key_list.pop()
-            self._cache.pop(_key)
-
-        # set cache
-        self._cache[key] = value
-        self._key_list.insert(0, key)
+from BlockchainSpider.strategies import PushPopModel
+from BlockchainSpider.utils.cache import LRUCache
+from BlockchainSpider.utils.heap import LazyMaxHeap
 
 
 class APPR(PushPopModel):
-    def __init__(self, source, alpha: float = 0.15, epsilon: float = 1e-5):
+    def __init__(self, source, alpha: float = 0.15, epsilon: float = 1e-5, local_push_budget: int = None):
         super().__init__(source)
 
         assert 0 <= alpha <= 1
@@ -35,26 +15,40 @@ class APPR(PushPopModel):
         assert 0 < epsilon < 1
         self.epsilon = epsilon
 
+        # the max number of local pushes of the cached nodes in a pop, no limit if None
+        assert local_push_budget is None or local_push_budget > 0
+        self.local_push_budget = local_push_budget
+
         self.r = {self.source: 1}
         self.p = dict()
 
+        # the max residual is answered by a heap, which is updated
+        # with the final residuals of the nodes touched since the last pop
+        self._r_heap = LazyMaxHeap(self.r)
+        self._touched = dict()
+
         self._vis = set()
 
-        self.cache = LRUCache()
+        self.cache = LRUCache(max_size=1024)
+
+        # cached nodes whose residual may exceed epsilon, pushed locally in FIFO order
+        self._local_queue = deque()
+        self._queued = set()
+        self.stats = dict(pops=0, local_pushes=0, budget_exhausted=0)
 
     def push(self, node, edges: list, **kwargs):
         r_node = self.r.get(node, 0)
         if r_node == 0:
             return
         self.r[node] = 0
+        self._touched[node] = None
 
         self.p[node] = self.p.get(node, 0) + r_node * self.alpha
         # self.r[node] = (1 - self.alpha) * r_node / 2
 
         cache_dist = self.cache.get(node)
         if cache_dist is not None:
-            for v, d in cache_dist.items():
-                self.r[v] = self.r.get(v, 0) + d * r_node
+            self._push_distribution(cache_dist, r_node)
             return
 
         neighbours = set()
@@ -65,35 +59,56 @@ class APPR(PushPopModel):
             neighbours.remove(node)
 
         neighbours_cnt = len(neighbours)
-        inc = (1 - self.alpha) * r_node / neighbours_cnt if neighbours_cnt > 0 else 0
-        for neighbour in neighbours:
-            self.r[neighbour] = self.r.get(neighbour, 0) + inc
-        self.cache.set(node, {neighbour: (1 - self.alpha) / neighbours_cnt for neighbour in neighbours})
+        dist = {neighbour: (1 - self.alpha) / neighbours_cnt for neighbour in neighbours}
+        self.cache.set(node, dist)
+        self._push_distribution(dist, r_node)
 
         # yield edges
         if node not in self._vis:
             self._vis.add(node)
             yield from edges
 
+    def _push_distribution(self, dist: dict, r_node: float):
+        r, touched, queued, cache = self.r, self._touched, self._queued, self.cache
+        for v, d in dist.items():
+            r_v = r.get(v, 0) + d * r_node
+            r[v] = r_v
+            touched[v] = None
+
+            # the cached neighbours can be pushed without fetching their edges
+            if r_v > self.epsilon and v not in queued and v in cache:
+                queued.add(v)
+                self._local_queue.append(v)
+
     def pop(self):
-        while True:
-            node, r_node = None, None
-            for _node, _r_node in self.r.items():
-                if _r_node <= self.epsilon or not self.cache.get(_node):
-                    continue
-                node, r_node = _node, _r_node
+        # propagate the residual of the cached nodes locally
+        self.stats['pops'] += 1
+        local_pushes = 0
+        while len(self._local_queue) > 0:
+            if self.local_push_budget is not None and local_pushes >= self.local_push_budget:
+                self.stats['budget_exhausted'] += 1
                 break
+            node = self._local_queue.popleft()
+            self._queued.discard(node)
+            r_node = self.r.get(node, 0)
+            if r_node <= self.epsilon:
+                continue
+            distribution = self.cache.get(node)
+            if not distribution:
+                continue
 
-            if not node:
-                break
             self.r[node] = 0
+            self._touched[node] = None
             self.p[node] = self.p.get(node, 0) + r_node * self.alpha
-            for v, d in self.cache.get(node).items():
-                self.r[v] = self.r.get(v, 0) + d * r_node
-
-        node, r = None, self.epsilon
-        for _node, _r in self.r.items():
-            if _r > r:
-                node, r = _node, _r
-
-        return dict(node=node, residual=r) if node is not None else None
+            self._push_distribution(distribution, r_node)
+            local_pushes += 1
+        self.stats['local_pushes'] += local_pushes
+
+        for node in self._touched:
+            self._r_heap[node] = self.r[node]
+        self._touched.clear()
+        item = self._r_heap.top()
+        if item is None or item[1] <= self.epsilon:
+            return None
+        node, r = item
+        return dict(node=node, residual=r)
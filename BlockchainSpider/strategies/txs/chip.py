@@ -0,0 +1,84 @@
+from array import array
+
+
+class SymbolTable:
+    """
+    Intern the token symbols of chips as integer ids.
+    """
+
+    def __init__(self):
+        self.symbols = list()
+        self._ids = dict()
+
+    def intern(self, symbol: str) -> int:
+        sid = self._ids.get(symbol)
+        if sid is None:
+            sid = len(self.symbols)
+            self._ids[symbol] = sid
+            self.symbols.append(symbol)
+        return sid
+
+
+class ChipStore:
+    """
+    Columnar residual chips of a node.
+    The value, timestamp, symbol id (and ratio) of chips are kept in typed arrays,
+    and a chip is merged into the existing chip with the same symbol and timestamp on insert.
+    Most nodes only hold a few chips, so the merging index is built only for large stores.
+    """
+    INDEX_THRESHOLD = 8
+    __slots__ = ('values', 'timestamps', 'symbols', 'ratios', '_index')
+
+    def __init__(self, with_ratio: bool = False):
+        self.values = array('d')
+        self.timestamps = array('q')
+        self.symbols = array('l')
+        self.ratios = array('d') if with_ratio else None
+        self._index = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value: float, timestamp: int, symbol: int, ratio: float = 0):
+        i = self._find(timestamp, symbol)
+        if i is not None:
+            self.values[i] += value
+            return
+
+        if self._index is not None:
+            self._index[(timestamp << 32) | symbol] = len(self.values)
+        self.values.append(value)
+        self.timestamps.append(timestamp)
+        self.symbols.append(symbol)
+        if self.ratios is not None:
+            self.ratios.append(ratio)
+        if self._index is None and len(self.values) >= self.INDEX_THRESHOLD:
+            # pack symbol id and timestamp as the merging key
+            self._index = {(t << 32) | c: i for i, (t, c) in enumerate(zip(self.timestamps, self.symbols))}
+
+    def _find(self, timestamp: int, symbol: int):
+        if self._index is not None:
+            return self._index.get((timestamp << 32) | symbol)
+        for i in range(len(self.timestamps)):
+            if self.timestamps[i] == timestamp and self.symbols[i] == symbol:
+                return i
+        return None
+
+    def sum(self, min_value: float = None) -> float:
+        if min_value is None:
+            return sum(self.values)
+        return sum([v for v in self.values if v > min_value])
+
+    def sort(self) -> 'ChipStore':
+        """
+        get a copy of chips sorted by timestamp, which keeps the insertion order of the chips with the same timestamp
+        :return:
+        """
+        order = sorted(range(len(self.values)), key=self.timestamps.__getitem__)
+        rlt = ChipStore(with_ratio=self.ratios is not None)
+        rlt.values = array('d', [self.values[i] for i in order])
+        rlt.timestamps = array('q', [self.timestamps[i] for i in order])
+        rlt.symbols = array('l', [self.symbols[i] for i in order])
+        if self.ratios is not None:
+            rlt.ratios = array('d', [self.ratios[i] for i in order])
+        return rlt
@@ -0,0 +1,155 @@
+PROFIT_INDEX_THRESHOLD = 16
+
+
+class AggregatedEdgeProfit:
+    __slots__ = ('address', 'value', 'timestamp', 'symbol')
+
+    def __init__(
+            self,
+            _address: str,
+            _value: float,
+            _timestamp: int,
+            _symbol: str,
+    ):
+        self.address = _address
+        self.value = _value
+        self.timestamp = _timestamp
+        self.symbol = _symbol
+
+
+class AggregatedEdge:
+    __slots__ = ('hash', 'profits', 'aggregated_edges')
+
+    def __init__(
+            self,
+            _hash: str,
+            _profits: list,
+            _aggregated_edges: list,
+    ):
+        self.hash = _hash
+        self.profits = _profits
+        self.aggregated_edges = _aggregated_edges
+
+    def get_input_profit(self, symbol):
+        for profit in self.profits:
+            if profit.symbol == symbol and profit.value > 0:
+                return profit
+
+    def get_output_profit(self, symbol):
+        for profit in self.profits:
+            if profit.symbol == symbol and profit.value < 0:
+                return profit
+
+    def get_output_profits(self):
+        rlt = list()
+        for profit in self.profits:
+            if profit.value < 0:
+                rlt.append(profit)
+        return rlt
+
+    def get_input_profits(self):
+        rlt = list()
+        for profit in self.profits:
+            if profit.value > 0:
+                rlt.append(profit)
+        return rlt
+
+    def get_output_symbols(self):
+        symbols = set()
+        for profit in self.profits:
+            if profit.value < 0:
+                symbols.add(profit.symbol)
+        return symbols
+
+    def get_input_symbols(self):
+        symbols = set()
+        for profit in self.profits:
+            if profit.value > 0:
+                symbols.add(profit.symbol)
+        return symbols
+
+    def get_timestamp(self):
+        timestamp = 0
+        if len(self.profits) > 0:
+            timestamp = self.profits[0].timestamp
+        return timestamp
+
+
+def aggregate_edges(node, edges: list) -> list:
+    """
+    group the edges by hash in one pass, and aggregate the profits of each group by symbol and address
+    :param node:
+    :param edges: hash, from, to, value, timeStamp, symbol
+    :return: a list of aggregated edges, and the profits of an edge are ordered from the latest updated one
+    """
+    groups = dict()
+    for edge in edges:
+        _hash = edge.get('hash')
+        is_output = edge.get('from') == node
+        profit = AggregatedEdgeProfit(
+            _address=edge.get('to') if is_output else edge.get('from'),
+            _value=-edge.get('value') if is_output else edge.get('value'),
+            _timestamp=edge.get('timeStamp'),
+            _symbol=edge.get('symbol'),
+        )
+
+        # the profits are kept from the earliest updated one until all edges are grouped
+        aggregated_edge = groups.get(_hash)
+        if aggregated_edge is None:
+            groups[_hash] = AggregatedEdge(
+                _hash=_hash,
+                _profits=[profit],
+                _aggregated_edges=[edge],
+            )
+            continue
+
+        # a zero profit is kept only if the hash has a single edge
+        if len(aggregated_edge.aggregated_edges) == 1 and aggregated_edge.profits[0].value == 0:
+            aggregated_edge.profits.clear()
+        aggregated_edge.aggregated_edges.append(edge)
+
+        if profit.value != 0:
+            _add_profit(aggregated_edge, profit)
+        if len(aggregated_edge.profits) == 0:
+            del groups[_hash]
+
+    rlt = list(groups.values())
+    for aggregated_edge in rlt:
+        if isinstance(aggregated_edge.profits, dict):
+            aggregated_edge.profits = list(aggregated_edge.profits.values())
+        aggregated_edge.profits.reverse()
+        aggregated_edge.aggregated_edges.reverse()
+    return rlt
+
+
+def _add_profit(aggregated_edge: AggregatedEdge, profit: AggregatedEdgeProfit):
+    """
+    merge the profit into the one with the same symbol and address, and move it to the latest updated one.
+    The profits are scanned linearly for most transactions,
+    and indexed by a dict of (symbol, address) -> profit for the large ones.
+    """
+    profits = aggregated_edge.profits
+    if isinstance(profits, dict):
+        _profit = profits.pop((profit.symbol, profit.address), None)
+    else:
+        _profit = None
+        for i in range(len(profits)):
+            if profits[i].symbol == profit.symbol and profits[i].address == profit.address:
+                _profit = profits.pop(i)
+                break
+
+    if _profit is not None:
+        value = _profit.value + profit.value
+        if value == 0:
+            return
+        # keep the profit with the same direction as the aggregated value
+        if (profit.value > 0) != (value > 0):
+            profit = _profit
+        profit.value = value
+
+    if isinstance(profits, dict):
+        profits[(profit.symbol, profit.address)] = profit
+        return
+    profits.append(profit)
+    if len(profits) > PROFIT_INDEX_THRESHOLD:
+        aggregated_edge.profits = {(_profit.symbol, _profit.address): _profit for _profit in profits}
@@ -28,6 +28,32 @@ class Haircut(PushPopModel):
             self.weight_map[out_neibor] = self.weight_map.get(out_neibor, 0) + \
                                           node_weight * (edge_value / out_sum)
 
+    def get_distribution(self, node, edges: list) -> dict:
+        out_sum = 0
+        out_edges = list()
+        for e in edges:
+            if e.get('from') == node:
+                out_sum += float(e.get('value', 0))
+                out_edges.append(e)
+
+        distribution = dict()
+        if out_sum == 0:
+            return distribution
+        for oe in out_edges:
+            out_neibor = oe.get('to')
+            distribution[out_neibor] = distribution.get(out_neibor, 0) + float(oe.get('value')) / out_sum
+        return distribution
+
+    def push_distribution(self, node, distribution: dict, edges: list, **kwargs):
+        # the weight stays on the node without output
+        if len(distribution) == 0:
+            return
+
+        node_weight = self.weight_map.get(node, 0)
+        self.weight_map[node] = 0
+        for neibor, rate in distribution.items():
+            self.weight_map[neibor] = self.weight_map.get(neibor, 0) + node_weight * rate
+
     def pop(self):
         node, weight = None, 0
         for _node, _weight in self.weight_map.items():
@@ -74,3 +100,30 @@ class OPICHaircut(Haircut):
             self.weight_map[in_neibor] = self.weight_map.get(in_neibor, 0) + \
                                          node_weight * (edge_value / in_sum) * \
                                          (1 - self.tendency) * R
+
+    def get_distribution(self, node, edges: list) -> dict:
+        in_sum, out_sum = 0, 0
+        in_edges, out_edges = list(), list()
+        for e in edges:
+            if e.get('from') == node:
+                out_sum += float(e.get('value', 0))
+                out_edges.append(e)
+            elif e.get('to') == node:
+                in_sum += float(e.get('value', 0))
+                in_edges.append(e)
+
+        distribution = dict()
+        if out_sum == 0 or in_sum / out_sum <= 0:
+            return distribution
+
+        R = in_sum / out_sum
+        R = 1 if R > 1 else R
+        for oe in out_edges:
+            out_neibor = oe.get('to')
+            distribution[out_neibor] = distribution.get(out_neibor, 0) + \
+                                       (float(oe.get('value')) / out_sum) * self.tendency * R
+        for ie in in_edges:
+            in_neibor = ie.get('from')
+            distribution[in_neibor] = distribution.get(in_neibor, 0) + \
+                                      (float(ie.get('value')) / in_sum) * (1 - self.tendency) * R
+        return distribution
@@ -22,25 +22,81 @@ class PushPopModel:
         """
         raise NotImplementedError()
 
+    def get_distribution(self, node, edges: list) -> dict:
+        """
+        get the normalized distribution of the pushed weight of node,
+        which only depends on the edges of node
+        :param node:
+        :param edges:
+        :return: a dict of neighbour -> increment per unit weight, or None if not supported by the model
+        """
+        return None
+
+    def push_distribution(self, node, distribution: dict, edges: list, **kwargs):
+        """
+        push a node by its distribution instead of scanning the edges
+        :param node:
+        :param distribution: the result of `get_distribution`
+        :param edges:
+        :param kwargs:
+        :return: the same as `push`
+        """
+        raise NotImplementedError()
+
 
 class CachedPushPopModel:
-    def __init__(self, instance: PushPopModel, max_cache_size: int = 1024):
+    """
+    Wrap a push-pop model and memoize the distribution of each pushed node in an LRU cache,
+    so the repeated pushes of a node skip scanning its edges.
+    The edges of a node are assumed unchanged in a task, and the models
+    without distributions, e.g. TTRTime, are pushed as usual.
+    The fused nodes, i.e. pushed with no edges or with `fused=True` on failed requests,
+    are pushed as usual and never cached, since their edges are incomplete.
+    """
+
+    def __init__(self, instance: PushPopModel, max_cache_size: int = 1024, max_cache_neighbours: int = None):
+        """
+        :param instance:
+        :param max_cache_size: the max number of cached nodes
+        :param max_cache_neighbours: the max number of neighbours in all cached distributions, no limit if None
+        """
         self.instance = instance
-        self._cache = LRUCache(max_size=max_cache_size)
+        self._cache = LRUCache(max_size=max_cache_size, max_bytes=max_cache_neighbours, sizeof=len)
+        self.uncached_pushes = 0
 
     def push(self, node, edges: list, **kwargs):
         """
         push a node with related edges
         :param node:
         :param edges:
-        :param kwargs:
+        :param kwargs: `fused=True` if the edges are incomplete
         :return:
         """
-        raise NotImplementedError()
+        if len(edges) == 0 or kwargs.get('fused'):
+            self.uncached_pushes += 1
+            return self.instance.push(node, edges, **kwargs)
+
+        distribution = self._cache.get(node)
+        if distribution is None:
+            distribution = self.instance.get_distribution(node, edges)
+            if distribution is None:
+                self.uncached_pushes += 1
+                return self.instance.push(node, edges, **kwargs)
+            self._cache.set(node, distribution)
+        return self.instance.push_distribution(node, distribution, edges, **kwargs)
 
     def pop(self):
         """
         pop a series of nodes
         :return:
         """
-        raise NotImplementedError()
+        return self.instance.pop()
+
+    def stats(self) -> dict:
+        return dict(**self._cache.stats(), uncached_pushes=self.uncached_pushes)
+
+    def __getattr__(self, name):
+        # expose the results of the instance, e.g. `p` and `source`
+        if name == 'instance':
+            raise AttributeError(name)
+        return getattr(self.instance, name)
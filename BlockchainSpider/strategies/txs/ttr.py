@@ -4,6 +4,9 @@ import time
 import scrapy
 
 from BlockchainSpider.strategies import PushPopModel
+from BlockchainSpider.strategies.txs.chip import ChipStore, SymbolTable
+from BlockchainSpider.strategies.txs.edge import aggregate_edges
+from BlockchainSpider.utils.heap import LazyMaxHeap
 from BlockchainSpider.utils.token_price import TokenPrice
 import numpy as np
 import logging
@@ -11,17 +14,62 @@ import logging
 logger = logging.getLogger("strategies")
 
 
+def _index_edges(node, edges: list) -> tuple:
+    """
+    convert the edges of node into arrays in one pass
+    :param node:
+    :param edges: from, to, value
+    :return: the out neighbours, and the neighbour index and value of each out edge, then the same for in edges;
+    the neighbours are ordered by their first edge
+    """
+    out_ids, out_index, out_values = dict(), list(), list()
+    in_ids, in_index, in_values = dict(), list(), list()
+    for e in edges:
+        if e['from'] == node:
+            out_index.append(out_ids.setdefault(e['to'], len(out_ids)))
+            out_values.append(e['value'])
+        if e['to'] == node:
+            in_index.append(in_ids.setdefault(e['from'], len(in_ids)))
+            in_values.append(e['value'])
+    return (
+        list(out_ids.keys()), np.array(out_index, dtype=np.int64), np.array(out_values, dtype=np.float64),
+        list(in_ids.keys()), np.array(in_index, dtype=np.int64), np.array(in_values, dtype=np.float64),
+    )
+
+
+def _get_price_key(e: dict) -> tuple:
+    """
+    get the key of the token price of the edge
+    :param e: symbol, blockNumber, timeStamp
+    :return: a tuple of (contract, block, timestamp), and the contract of the native token is ''
+    """
+    token_contract = e.get('symbol').split('_')[1]
+    token_symbol = e.get('symbol').split('_')[0]
+    if token_symbol in ['WETH', 'native']:
+        token_contract = ''
+    return token_contract, e.get('blockNumber'), e.get('timeStamp')
+
+
 class TTR(PushPopModel):
     def __init__(
             self,
             source, alpha: float = 0.15,
             beta: float = 0.8,
             epsilon: float = 1e-5,
+            epsilons: list = None,
     ):
         super().__init__(source)
         self.alpha = alpha
         self.beta = beta
-        self.epsilon = epsilon
+
+        # multi-epsilon mode: run with the min epsilon,
+        # and record the importance where the run of each greater epsilon would have terminated
+        self.epsilons = sorted(epsilons, reverse=True) if epsilons else [epsilon]
+        self.epsilon = self.epsilons[-1]
+        self.importances = dict()
+
+        # token prices resolved before the push, (contract, block, timestamp) -> price
+        self.prices = dict()
 
     def push(self, node, edges: list, **kwargs):
         raise NotImplementedError()
@@ -29,6 +77,121 @@ class TTR(PushPopModel):
     def pop(self):
         raise NotImplementedError()
 
+    def get_price_keys(self, node, edges: list) -> set:
+        """
+        get the token prices needed by the push of node,
+        which can be resolved in batch and updated into `self.prices` before the push
+        :param node:
+        :param edges:
+        :return: a set of (contract, block, timestamp)
+        """
+        return set()
+
+    def push_distribution(self, node, distribution: dict, edges: list, **kwargs):
+        """
+        push a node by its distribution, for the models with a residual heap of scalars
+        :param node:
+        :param distribution:
+        :param edges:
+        :param kwargs:
+        :return:
+        """
+        r = self.r.get(node, 0)
+        self.r[node] = 0
+
+        self._self_push(node, r)
+        self.r.increase(list(distribution.keys()), [rate * r for rate in distribution.values()])
+
+        # yield edges
+        if node not in self._vis:
+            self._vis.add(node)
+            yield from edges
+
+    def peek(self, k: int) -> list:
+        """
+        get the top-k nodes which may be popped next without popping them,
+        e.g. for prefetching their edges
+        :param k:
+        :return: a list of dict(node, residual) in descending order of residual
+        """
+        heap = self.r if isinstance(self.r, LazyMaxHeap) else self._r_sum
+        return [dict(node=node, residual=r) for node, r in heap.top_k(k) if r > self.epsilon]
+
+    def pop_batch(self, batch_size: int, threshold: float = 1.0) -> list:
+        """
+        pop the top node and the next nodes whose residuals are greater than `epsilon * threshold`,
+        which are pushed together in one round by `push_batch`
+        :param batch_size: the max number of nodes in the batch
+        :param threshold: not less than 1, and the batch shrinks to the top node near convergence
+        :return: a list of dict(node, residual) in descending order of residual, empty if finished
+        """
+        assert batch_size > 0
+        assert threshold >= 1
+        item = self.pop()
+        if item is None:
+            return list()
+        items = [item]
+        for candidate in self.peek(batch_size):
+            if len(items) >= batch_size or candidate['residual'] <= self.epsilon * threshold:
+                break
+            if candidate['node'] != item['node']:
+                items.append(candidate)
+        return items
+
+    def push_batch(self, batch: list, **kwargs):
+        """
+        push the nodes of a batch in one round, with their residuals at the start of the round,
+        and merge the increments of all nodes into the residual heap at once;
+        the models without distributions push the nodes one by one in order
+        :param batch: a list of (node, edges)
+        :param kwargs:
+        :return: the edges of the nodes pushed for the first time
+        """
+        distributions = [self.get_distribution(node, edges) for node, edges in batch]
+        if any([distribution is None for distribution in distributions]):
+            for node, edges in batch:
+                yield from self.push(node, edges, **kwargs)
+            return
+
+        # take the residuals of all nodes before the increments of the round
+        rs = list()
+        for node, _ in batch:
+            rs.append(self.r.get(node, 0))
+            self.r[node] = 0
+
+        # merge the increments to the same neighbour from different nodes
+        ids, index, incs = dict(), list(), list()
+        for (node, _), distribution, r in zip(batch, distributions, rs):
+            self._self_push(node, r)
+            for neighbour, rate in distribution.items():
+                index.append(ids.setdefault(neighbour, len(ids)))
+                incs.append(rate * r)
+        if len(index) > 0:
+            incs = np.bincount(np.array(index, dtype=np.int64), weights=incs, minlength=len(ids))
+            self.r.increase(list(ids.keys()), incs.tolist())
+
+        # yield edges
+        for node, edges in batch:
+            if node not in self._vis:
+                self._vis.add(node)
+                yield from edges
+
+    @property
+    def pending_epsilons(self) -> list:
+        return [epsilon for epsilon in self.epsilons if epsilon not in self.importances]
+
+    def _record_importances(self, residual: float):
+        """
+        record the importance for the epsilons which are not less than the max residual at the first time
+        :param residual: the max residual, 0 if no residual left
+        :return:
+        """
+        for epsilon in self.epsilons:
+            if residual > epsilon:
+                break
+            if epsilon not in self.importances:
+                self.importances[epsilon] = dict(self.p)
+
 
 class TTRBase(TTR):
     name = 'TTRBase'
@@ -39,10 +202,14 @@ class TTRBase(TTR):
             alpha: float = 0.15,
             beta: float = 0.8,
             epsilon: float = 1e-5,
+            kernel: str = 'python',
+            epsilons: list = None,
     ):
-        super().__init__(source, alpha, beta, epsilon)
+        super().__init__(source, alpha, beta, epsilon, epsilons)
+        assert kernel in {'python', 'numpy'}
+        self.kernel = kernel
         self.p = dict()
-        self.r = {source: 1.0}
+        self.r = LazyMaxHeap({source: 1.0})
         self._vis = set()
 
     def push(self, node, edges: list, **kwargs):
@@ -56,8 +223,11 @@ class TTRBase(TTR):
 
         # push
         self._self_push(node, r)
-        self._forward_push(node, edges, r)
-        self._backward_push(node, edges, r)
+        if self.kernel == 'numpy':
+            self._numpy_push(node, edges, r)
+        else:
+            self._forward_push(node, edges, r)
+            self._backward_push(node, edges, r)
 
         # yield edges
         if node not in self._vis:
@@ -89,21 +259,56 @@ class TTRBase(TTR):
             inc = (1 - self.alpha) * (1 - self.beta) * r / in_edges_cnt if in_edges_cnt > 0 else 0
             self.r[e['from']] = self.r.get(e['from'], 0) + inc
 
+    def get_distribution(self, node, edges: list) -> dict:
+        out_nodes, out_index, _, in_nodes, in_index, _ = _index_edges(node, edges)
+        distribution = dict()
+        if len(out_index) > 0:
+            rate = (1 - self.alpha) * self.beta / len(out_index)
+            for neighbour, cnt in zip(out_nodes, np.bincount(out_index, minlength=len(out_nodes)).tolist()):
+                distribution[neighbour] = distribution.get(neighbour, 0) + cnt * rate
+        if len(in_index) > 0:
+            rate = (1 - self.alpha) * (1 - self.beta) / len(in_index)
+            for neighbour, cnt in zip(in_nodes, np.bincount(in_index, minlength=len(in_nodes)).tolist()):
+                distribution[neighbour] = distribution.get(neighbour, 0) + cnt * rate
+        return distribution
+
+    def _numpy_push(self, node, edges: list, r):
+        out_nodes, out_index, _, in_nodes, in_index, _ = _index_edges(node, edges)
+        if len(out_index) > 0:
+            inc = np.bincount(out_index, minlength=len(out_nodes))
+            inc = inc * ((1 - self.alpha) * self.beta * r / len(out_index))
+            self.r.increase(out_nodes, inc.tolist())
+        if len(in_index) > 0:
+            inc = np.bincount(in_index, minlength=len(in_nodes))
+            inc = inc * ((1 - self.alpha) * (1 - self.beta) * r / len(in_index))
+            self.r.increase(in_nodes, inc.tolist())
+
     def pop(self):
-        node, r = None, self.epsilon
-        for _node, _r in self.r.items():
-            if _r > r:
-                node, r = _node, _r
-        return dict(node=node, residual=r) if node is not None else None
+        item = self.r.top()
+        self._record_importances(item[1] if item is not None else 0)
+        if item is None or item[1] <= self.epsilon:
+            return None
+        node, r = item
+        return dict(node=node, residual=r)
 
 
 class TTRWeight(TTR):
     name = 'TTRWeight'
 
-    def __init__(self, source, alpha: float = 0.15, beta: float = 0.8, epsilon=1e-5):
-        super().__init__(source, alpha, beta, epsilon)
+    def __init__(
+            self,
+            source,
+            alpha: float = 0.15,
+            beta: float = 0.8,
+            epsilon=1e-5,
+            kernel: str = 'python',
+            epsilons: list = None,
+    ):
+        super().__init__(source, alpha, beta, epsilon, epsilons)
+        assert kernel in {'python', 'numpy'}
+        self.kernel = kernel
         self.p = dict()
-        self.r = {source: 1.0}
+        self.r = LazyMaxHeap({source: 1.0})
         self._vis = set()
 
     def push(self, node, edges: list, **kwargs):
@@ -117,8 +322,11 @@ class TTRWeight(TTR):
 
         # push过程
         self._self_push(node, r)
-        self._forward_push(node, edges, r)
-        self._backward_push(node, edges, r)
+        if self.kernel == 'numpy':
+            self._numpy_push(node, edges, r)
+        else:
+            self._forward_push(node, edges, r)
+            self._backward_push(node, edges, r)
 
         # yield edges
         if node not in self._vis:
@@ -152,27 +360,59 @@ class TTRWeight(TTR):
             self.r[e['from']] = self.r.get(e['from'], 0) + inc
             # yield e
 
+    def get_distribution(self, node, edges: list) -> dict:
+        out_nodes, out_index, out_values, in_nodes, in_index, in_values = _index_edges(node, edges)
+        distribution = dict()
+        if len(out_index) > 0:
+            out_sum = out_values.sum()
+            weights = np.bincount(out_index, weights=out_values, minlength=len(out_nodes))
+            weights = weights * ((1 - self.alpha) * self.beta / out_sum) if out_sum > 0 else np.zeros(len(out_nodes))
+            for neighbour, rate in zip(out_nodes, weights.tolist()):
+                distribution[neighbour] = distribution.get(neighbour, 0) + rate
+        if len(in_index) > 0:
+            in_sum = in_values.sum()
+            weights = np.bincount(in_index, weights=in_values, minlength=len(in_nodes))
+            weights = weights * ((1 - self.alpha) * (1 - self.beta) / in_sum) if in_sum > 0 else np.zeros(len(in_nodes))
+            for neighbour, rate in zip(in_nodes, weights.tolist()):
+                distribution[neighbour] = distribution.get(neighbour, 0) + rate
+        return distribution
+
+    def _numpy_push(self, node, edges: list, r):
+        out_nodes, out_index, out_values, in_nodes, in_index, in_values = _index_edges(node, edges)
+        if len(out_index) > 0:
+            out_sum = out_values.sum()
+            inc = np.bincount(out_index, weights=out_values, minlength=len(out_nodes))
+            inc = inc * ((1 - self.alpha) * self.beta * r / out_sum) if out_sum > 0 else np.zeros(len(out_nodes))
+            self.r.increase(out_nodes, inc.tolist())
+        if len(in_index) > 0:
+            in_sum = in_values.sum()
+            inc = np.bincount(in_index, weights=in_values, minlength=len(in_nodes))
+            inc = inc * ((1 - self.alpha) * (1 - self.beta) * r / in_sum) if in_sum > 0 else np.zeros(len(in_nodes))
+            self.r.increase(in_nodes, inc.tolist())
+
     def pop(self):
-        node, r = None, self.epsilon
-        for _node, _r in self.r.items():
-            if _r > r:
-                node, r = _node, _r
-        return dict(node=node, residual=r) if node is not None else None
+        item = self.r.top()
+        self._record_importances(item[1] if item is not None else 0)
+        if item is None or item[1] <= self.epsilon:
+            return None
+        node, r = item
+        return dict(node=node, residual=r)
 
 
 class TTRTime(TTR):
     name = 'TTRTime'
 
-    def __init__(self, source, alpha: float = 0.15, beta: float = 0.8, epsilon=1e-5):
-        super().__init__(source, alpha, beta, epsilon)
+    def __init__(self, source, alpha: float = 0.15, beta: float = 0.8, epsilon=1e-5, epsilons: list = None):
+        super().__init__(source, alpha, beta, epsilon, epsilons)
         self.p = dict()
         self.r = dict()
         self._vis = set()
+        self._r_sum = LazyMaxHeap()
+        self._touched = dict()
 
     def push(self, node, edges: list, **kwargs):
         # residual vector空值判定
-        if self.r.get(node) is None:
-            self.r[node] = dict()
+        self._get_chips(node)
 
         # 当更新的是源节点时
         if node == self.source and self.source not in self._vis:
@@ -200,6 +440,7 @@ class TTRTime(TTR):
                 # self.p[self.source] += (1 - self.alpha) * (1 - self.beta)
                 self.r[self.source][sys.maxsize] = (1 - self.alpha) * (1 - self.beta)
 
+            self._update_residual_sums()
             return
 
         # 拷贝一份residual vector，原有的清空
@@ -210,6 +451,7 @@ class TTRTime(TTR):
         self._self_push(node, r)
         self._forward_push(node, edges, r)
         self._backward_push(node, edges, r)
+        self._update_residual_sums()
 
         # yield edges
         if node not in self._vis:
@@ -259,10 +501,9 @@ class TTRTime(TTR):
                 d += (r_node[j][1] / W[r_node[j]]) if W[r_node[j]] > 0 else 0
                 j += 1
 
-            if self.r.get(e['to']) is None:
-                self.r[e['to']] = dict()
+            chips = self._get_chips(e['to'])
             inc = (1 - self.alpha) * self.beta * e['value'] * d
-            self.r[e['to']][e['timeStamp']] = self.r[e['to']].get(e['timeStamp'], 0) + inc
+            chips[e['timeStamp']] = chips.get(e['timeStamp'], 0) + inc
 
         # 当流动权重碎片缺失输出边时将回流到自身
         while j < len(r_node):
@@ -307,10 +548,9 @@ class TTRTime(TTR):
                 d += (r_node[j][1] / W[r_node[j]]) if W[r_node[j]] > 0 else 0
                 j -= 1
 
-            if self.r.get(e['from']) is None:
-                self.r[e['from']] = dict()
+            chips = self._get_chips(e['from'])
             inc = (1 - self.alpha) * (1 - self.beta) * e['value'] * d
-            self.r[e['from']][e['timeStamp']] = self.r[e['from']].get(e['timeStamp'], 0) + inc
+            chips[e['timeStamp']] = chips.get(e['timeStamp'], 0) + inc
 
         # 当流动权重碎片缺失输入边时将回流到自身
         while j >= 0:
@@ -318,33 +558,44 @@ class TTRTime(TTR):
                                          (1 - self.alpha) * (1 - self.beta) * r_node[j][1]
             j -= 1
 
-    def pop(self):
-        node, r = None, self.epsilon
-        for _node, chips in self.r.items():
-            sum_r = 0
-            for v in chips.values():
-                sum_r += v
-            if sum_r > r:
-                node, r = _node, sum_r
+    def _get_chips(self, node) -> dict:
+        chips = self.r.get(node)
+        if chips is None:
+            chips = self.r[node] = dict()
+        self._touched[node] = True
+        return chips
 
-        return dict(node=node, residual=r) if node is not None else None
+    def _update_residual_sums(self):
+        for node in self._touched:
+            self._r_sum[node] = sum(self.r[node].values())
+        self._touched = dict()
+
+    def pop(self):
+        item = self._r_sum.top()
+        self._record_importances(item[1] if item is not None else 0)
+        if item is None or item[1] <= self.epsilon:
+            return None
+        node, r = item
+        return dict(node=node, residual=r)
 
 
 class TTRRedirect(TTR):
     name = 'TTRRedirect'
 
-    def __init__(self, source, alpha: float = 0.15, beta: float = 0.8, epsilon=1e-5):
-        super().__init__(source, alpha, beta, epsilon)
+    def __init__(self, source, alpha: float = 0.15, beta: float = 0.8, epsilon=1e-5, epsilons: list = None):
+        super().__init__(source, alpha, beta, epsilon, epsilons)
         self.p = dict()
         self.r = dict()
         self._vis = set()
+        self._r_sum = LazyMaxHeap()
+        self._touched = dict()
+        self._symbols = SymbolTable()
 
     def push(self, node, edges: list, **kwargs):
         start = time.time()
 
         # if residual vector is none, add empty list
-        if self.r.get(node) is None:
-            self.r[node] = list()
+        self._get_chips(node)
 
         # push on first time
         if node == self.source and node not in self._vis:
@@ -367,93 +618,82 @@ class TTRRedirect(TTR):
             # first forward and backward push
             for e in edges:
                 if e.get('from') == self.source and out_sum.get(e.get('symbol'), 0) != 0:
-                    if self.r.get(e.get('to')) is None:
-                        self.r[e.get('to')] = list()
                     value = (1 - self.alpha) * self.beta * e.get('value', 0) / out_sum[e.get('symbol')] * 2
                     if value > 0:
-                        self.r[e.get('to')].append(dict(
+                        self._add_chip(
+                            e.get('to'),
                             value=value,
                             timestamp=e.get('timeStamp'),
                             symbol=e.get('symbol')
-                        ))
+                        )
                 elif e.get('to') == self.source and in_sum.get(e.get('symbol'), 0) != 0:
-                    if self.r.get(e.get('from')) is None:
-                        self.r[e.get('from')] = list()
                     value = (1 - self.alpha) * (1 - self.beta) * e.get('value', 0) / in_sum[e.get('symbol')] * 2
                     if value > 0:
-                        self.r[e.get('from')].append(dict(
+                        self._add_chip(
+                            e.get('from'),
                             value=value,
                             timestamp=e.get('timeStamp'),
                             symbol=e.get('symbol')
-                        ))
+                        )
 
             for symbol in symbols:
                 if out_sum.get(symbol, 0) == 0:
-                    self.r[self.source].append(dict(
+                    self._add_chip(
+                        self.source,
                         value=(1 - self.alpha) * self.beta * 2,
                         timestamp=0,
                         symbol=symbol
-                    ))
+                    )
                 elif in_sum.get(symbol, 0) == 0:
-                    self.r[self.source].append(dict(
+                    self._add_chip(
+                        self.source,
                         value=(1 - self.alpha) * (1 - self.beta) * 2,
                         timestamp=sys.maxsize,
                         symbol=symbol
-                    ))
+                    )
+
+            self._update_residual_sums()
             return
 
         # copy residual vector with sort and clear
-        r = self.r[node]
-        r.sort(key=lambda x: x.get('timestamp', 0))
-        self.r[node] = list()
+        r = self.r[node].sort()
+        self.r[node] = ChipStore()
 
         # aggregate edges
-        agg_es = self._get_aggregated_edges(node, edges)
+        agg_es = aggregate_edges(node, edges)
         agg_es.sort(key=lambda x: x.get_timestamp())
 
         # push
         self._self_push(node, r)
         self._forward_push(node, agg_es, r)
         self._backward_push(node, agg_es, r)
-
-        # marge chips
-        for node, chips in self.r.items():
-            _chips = dict()
-            for chip in chips:
-                key = (chip.get('symbol'), chip.get('timestamp'))
-                if _chips.get(key) is None:
-                    _chips[key] = chip
-                    continue
-                _chips[key]['value'] += chip.get('value', 0)
-            self.r[node] = [v for v in _chips.values()]
+        self._update_residual_sums()
 
         # yield edges
         if node not in self._vis:
             self._vis.add(node)
             yield from edges
 
-    def _self_push(self, node, r: list):
-        sum_r = 0
-        for chip in r:
-            sum_r += chip.get('value', 0)
+    def _self_push(self, node, r: ChipStore):
+        sum_r = r.sum()
         self.p[node] = self.p.get(node, 0) + self.alpha * sum_r
 
-    def _forward_push(self, node, aggregated_edges: list, r: list):
+    def _forward_push(self, node, aggregated_edges: list, r: ChipStore):
         if len(r) == 0:
             return
+        symbols = self._symbols.symbols
 
         # calc the weight sum after each chip
         j = len(aggregated_edges) - 1
         sum_w, W = dict(), dict()
         for i in range(len(r) - 1, -1, -1):
-            c = r[i]
-            while j >= 0 and aggregated_edges[j].get_timestamp() > c.get('timestamp', 0):
+            while j >= 0 and aggregated_edges[j].get_timestamp() > r.timestamps[i]:
                 e = aggregated_edges[j]
                 profits = e.get_output_profits()
                 for profit in profits:
                     sum_w[profit.symbol] = sum_w.get(profit.symbol, 0) + profit.value
                 j -= 1
-            W[str(c)] = sum_w.get(c.get('symbol'), 0)
+            W[i] = sum_w.get(symbols[r.symbols[i]], 0)
 
         # construct index for distributing profit
         symbol_agg_es = dict()
@@ -485,10 +725,9 @@ class TTRRedirect(TTR):
             if len(output_profits) == 0:
                 continue
 
-            while j < len(r) and e.get_timestamp() > r[j].get('timestamp', 0):
-                c = r[j]
-                symbol = c.get('symbol')
-                inc_d = (c.get('value', 0) / W[str(c)]) if W[str(c)] != 0 else 0
+            while j < len(r) and e.get_timestamp() > r.timestamps[j]:
+                symbol = symbols[r.symbols[j]]
+                inc_d = (r.values[j] / W[j]) if W[j] != 0 else 0
                 d[symbol] = d.get(symbol, 0) + inc_d
                 j += 1
 
@@ -507,44 +746,43 @@ class TTRRedirect(TTR):
                     chip_value=inc
                 )
                 for dp in distributing_profits:
-                    if self.r.get(dp.address) is None:
-                        self.r[dp.address] = list()
-                    self.r[dp.address].append(dict(
+                    self._add_chip(
+                        dp.address,
                         value=inc / len(distributing_profits),
                         symbol=dp.symbol,
                         timestamp=dp.timestamp,
-                    ))
+                    )
 
         # recycle the residual without push
         cs = dict()
         while j < len(r):
-            c = r[j]
-            key = c.get('symbol'), c.get('timestamp')
-            cs[key] = cs.get(key, 0) + (1 - self.alpha) * self.beta * c.get('value', 0)
+            key = symbols[r.symbols[j]], r.timestamps[j]
+            cs[key] = cs.get(key, 0) + (1 - self.alpha) * self.beta * r.values[j]
             j += 1
         for key, value in cs.items():
-            self.r[node].append(dict(
+            self._add_chip(
+                node,
                 value=value,
                 symbol=key[0],
                 timestamp=key[1]
-            ))
+            )
 
-    def _backward_push(self, node, aggregated_edges: list, r: list):
+    def _backward_push(self, node, aggregated_edges: list, r: ChipStore):
         if len(r) == 0:
             return
+        symbols = self._symbols.symbols
 
         # calc the weight sum before each chip
         j = 0
         sum_w, W = dict(), dict()
         for i in range(0, len(r)):
-            c = r[i]
-            while j < len(aggregated_edges) and aggregated_edges[j].get_timestamp() < c.get('timestamp', 0):
+            while j < len(aggregated_edges) and aggregated_edges[j].get_timestamp() < r.timestamps[i]:
                 e = aggregated_edges[j]
                 profits = e.get_input_profits()
                 for profit in profits:
                     sum_w[profit.symbol] = sum_w.get(profit.symbol, 0) + profit.value
                 j += 1
-            W[i] = sum_w.get(c.get('symbol'), 0)
+            W[i] = sum_w.get(symbols[r.symbols[i]], 0)
 
         # construct index for distributing profit
         symbol_agg_es = dict()
@@ -576,10 +814,9 @@ class TTRRedirect(TTR):
             if len(input_profits) == 0:
                 continue
 
-            while j >= 0 and e.get_timestamp() < r[j].get('timestamp', 0):
-                c = r[j]
-                symbol = c.get('symbol')
-                inc_d = (c.get('value', 0) / W[j]) if W[j] != 0 else 0
+            while j >= 0 and e.get_timestamp() < r.timestamps[j]:
+                symbol = symbols[r.symbols[j]]
+                inc_d = (r.values[j] / W[j]) if W[j] != 0 else 0
                 d[symbol] = d.get(symbol, 0) + inc_d
                 j -= 1
 
@@ -598,38 +835,52 @@ class TTRRedirect(TTR):
                     chip_value=inc
                 )
                 for dp in distributing_profits:
-                    if self.r.get(dp.address) is None:
-                        self.r[dp.address] = list()
-                    self.r[dp.address].append(dict(
+                    self._add_chip(
+                        dp.address,
                         value=inc / len(distributing_profits),
                         symbol=dp.symbol,
                         timestamp=dp.timestamp,
-                    ))
+                    )
 
         # recycle the residual without push
         cs = dict()
         while j >= 0:
-            c = r[j]
-            key = c.get('symbol'), c.get('timestamp')
-            cs[key] = cs.get(key, 0) + (1 - self.alpha) * (1 - self.beta) * c.get('value', 0)
+            key = symbols[r.symbols[j]], r.timestamps[j]
+            cs[key] = cs.get(key, 0) + (1 - self.alpha) * (1 - self.beta) * r.values[j]
             j -= 1
         for key, value in cs.items():
-            self.r[node].append(dict(
+            self._add_chip(
+                node,
                 value=value,
                 symbol=key[0],
                 timestamp=key[1]
-            ))
+            )
 
-    def pop(self):
-        node, r = None, self.epsilon
-        for _node, chips in self.r.items():
-            sum_r = 0
-            for chip in chips:
-                sum_r += chip.get('value', 0)
-            if sum_r > r:
-                node, r = _node, sum_r
+    def _get_chips(self, node) -> ChipStore:
+        chips = self.r.get(node)
+        if chips is None:
+            chips = self.r[node] = ChipStore()
+        self._touched[node] = True
+        return chips
+
+    def _add_chip(self, node, value: float, timestamp: int, symbol: str, **kwargs):
+        """
+        add a chip to the residual of node, and merge it into the chip with the same symbol and timestamp
+        """
+        self._get_chips(node).add(value, timestamp, self._symbols.intern(symbol), **kwargs)
 
-        return dict(node=node, residual=r) if node is not None else None
+    def _update_residual_sums(self):
+        for node in self._touched:
+            self._r_sum[node] = self.r[node].sum()
+        self._touched = dict()
+
+    def pop(self):
+        item = self._r_sum.top()
+        self._record_importances(item[1] if item is not None else 0)
+        if item is None or item[1] <= self.epsilon:
+            return None
+        node, r = item
+        return dict(node=node, residual=r)
 
     def _get_distributing_profit_v2(
             self,
@@ -742,149 +993,30 @@ class TTRRedirect(TTR):
 
         return rlt
 
-    def _get_aggregated_edges(self, node, edges: list) -> list:
-        """
-        :param node:
-        :param edges: hash, from, to, value, timeStamp, symbol
-        :return:
-        """
-        aggregated_edges = dict()
-        for edge in edges:
-            _hash = edge.get('hash')
-            aggregated_edge = TTRRedirect.AggregatedEdge(
-                _hash=_hash,
-                _profits=[TTRRedirect.AggregatedEdgeProfit(
-                    _address=edge.get('to') if edge.get('from') == node else edge.get('from'),
-                    _value=-edge.get('value') if edge.get('from') == node else edge.get('value'),
-                    _timestamp=edge.get('timeStamp'),
-                    _symbol=edge.get('symbol')
-                )],
-                _aggregated_edges=[edge],
-            )
-
-            aggregated_edge = aggregated_edge.aggregate(aggregated_edges.get(_hash))
-            aggregated_edges[_hash] = aggregated_edge
-            if len(aggregated_edge.profits) == 0:
-                del aggregated_edges[_hash]
-        return [aggregated_edge for aggregated_edge in aggregated_edges.values()]
-
-    class AggregatedEdge:
-        def __init__(
-                self,
-                _hash: str,
-                _profits: list,
-                _aggregated_edges: list,
-        ):
-            self.hash = _hash
-            self.profits = _profits
-            self.aggregated_edges = _aggregated_edges
-
-        def aggregate(self, aggregated_edge):
-            if aggregated_edge is None:
-                return self
-            assert isinstance(aggregated_edge, self.__class__)
-
-            # 1. collect all edges
-            self.aggregated_edges.extend(aggregated_edge.aggregated_edges)
-
-            # 2. according to symbol to classify profit and aggregate
-            aggregated_profits = dict()
-            for profit in self.profits + aggregated_edge.profits:
-                key = (profit.symbol, profit.address)
-                _profit = aggregated_profits.get(key)
-                if _profit is None:
-                    if profit.value != 0:
-                        aggregated_profits[key] = profit
-                    continue
-
-                if _profit.value + profit.value == 0:
-                    del aggregated_profits[key]
-                    continue
-
-                sgn = 1 if _profit.value > 0 else -1
-                sgn *= 1 if _profit.value + profit.value > 0 else -1
-                aggregated_value = _profit.value + profit.value
-                if sgn < 0:
-                    _profit = profit
-                _profit.value = aggregated_value
-                aggregated_profits[key] = _profit
-            self.profits = [v for v in aggregated_profits.values()]
-
-            return self
-
-        def get_input_profit(self, symbol):
-            for profit in self.profits:
-                if profit.symbol == symbol and profit.value > 0:
-                    return profit
-
-        def get_output_profit(self, symbol):
-            for profit in self.profits:
-                if profit.symbol == symbol and profit.value < 0:
-                    return profit
-
-        def get_output_profits(self):
-            rlt = list()
-            for profit in self.profits:
-                if profit.value < 0:
-                    rlt.append(profit)
-            return rlt
-
-        def get_input_profits(self):
-            rlt = list()
-            for profit in self.profits:
-                if profit.value > 0:
-                    rlt.append(profit)
-            return rlt
-
-        def get_output_symbols(self):
-            symbols = set()
-            for profit in self.profits:
-                if profit.value < 0:
-                    symbols.add(profit.symbol)
-            return symbols
-
-        def get_input_symbols(self):
-            symbols = set()
-            for profit in self.profits:
-                if profit.value > 0:
-                    symbols.add(profit.symbol)
-            return symbols
-
-        def get_timestamp(self):
-            timestamp = 0
-            if len(self.profits) > 0:
-                timestamp = self.profits[0].timestamp
-            return timestamp
-
-    class AggregatedEdgeProfit:
-        def __init__(
-                self,
-                _address: str,
-                _value: float,
-                _timestamp: int,
-                _symbol: str,
-        ):
-            self.address = _address
-            self.value = _value
-            self.timestamp = _timestamp
-            self.symbol = _symbol
-
 
 class TTRPrice(TTR):
     name = 'TTRPrice'
 
-    def __init__(self, source, alpha: float = 0.15, beta: float = 0.8, epsilon=1e-5):
-        super().__init__(source, alpha, beta, epsilon)
+    def __init__(self, source, alpha: float = 0.15, beta: float = 0.8, epsilon=1e-5, epsilons: list = None):
+        super().__init__(source, alpha, beta, epsilon, epsilons)
         self.p = dict()
         self.r = dict()
         self._vis = set()
+        self._r_sum = LazyMaxHeap()
+        self._touched = dict()
+        self._symbols = SymbolTable()
+
+    def get_price_keys(self, node, edges: list) -> set:
+        # only the first push of source prices the edges
+        if node != self.source or node in self._vis:
+            return set()
+        return {_get_price_key(e) for e in edges if e.get('value', 0) != 0}
 
     def push(self, node, edges: list, **kwargs):
         start = time.time()
 
         # if residual vector is none, add empty list
-        if self.r.get(node) is None:
-            self.r[node] = list()
+        self._get_chips(node)
 
         # push on first time
         if node == self.source and node not in self._vis:
@@ -896,15 +1028,13 @@ class TTRPrice(TTR):
             symbols = set()
             for e in edges:
 
-                token_contract = e.get('symbol').split('_')[1]
-                token_symbol = e.get('symbol').split('_')[0]
-                if token_symbol in ['WETH', 'native']:
-                    token_contract = ''
+                price_key = _get_price_key(e)
+                token_contract, block_number, timestamp = price_key
                 e['value'] = e.get('value', 0) / (10 ** int(e.get('tokenDecimal', 18)))
-                block_number = e.get('blockNumber')
-                timestamp = e.get('timeStamp')
                 if not e.get('value') == 0:
-                    token_price = TokenPrice(token_contract).get_price_at_specific_block(block_number, timestamp)
+                    token_price = self.prices.get(price_key)
+                    if token_price is None:
+                        token_price = TokenPrice(token_contract).get_price_at_specific_block(block_number, timestamp)
                     logger.warning("Token {} price is {} at block number {} timestamp {}".format(e.get('symbol'),
                                                                                                  token_price,
                                                                                                  block_number,
@@ -919,6 +1049,8 @@ class TTRPrice(TTR):
                 elif e.get('from') == self.source:
                     out_sum[e.get('symbol')] = out_sum.get(e.get('symbol'), 0) + e.get('value', 0)
 
+            self.prices = dict()
+
             for key in symbol_value.keys():
                 symbol_value[key] = math.log(symbol_value[key]+1)+1
             _sum = sum(symbol_value.values())
@@ -931,93 +1063,82 @@ class TTRPrice(TTR):
             # first forward and backward push
             for e in edges:
                 if e.get('from') == self.source and out_sum.get(e.get('symbol'), 0) != 0:
-                    if self.r.get(e.get('to')) is None:
-                        self.r[e.get('to')] = list()
                     value = (1 - self.alpha) * self.beta * e.get('value', 0) / out_sum[e.get('symbol')] * symbol_value[e.get('symbol')]
                     if value > 0:
-                        self.r[e.get('to')].append(dict(
+                        self._add_chip(
+                            e.get('to'),
                             value=value,
                             timestamp=e.get('timeStamp'),
                             symbol=e.get('symbol')
-                        ))
+                        )
                 elif e.get('to') == self.source and in_sum.get(e.get('symbol'), 0) != 0:
-                    if self.r.get(e.get('from')) is None:
-                        self.r[e.get('from')] = list()
                     value = (1 - self.alpha) * (1 - self.beta) * e.get('value', 0) / in_sum[e.get('symbol')] * symbol_value[e.get('symbol')]
                     if value > 0:
-                        self.r[e.get('from')].append(dict(
+                        self._add_chip(
+                            e.get('from'),
                             value=value,
                             timestamp=e.get('timeStamp'),
                             symbol=e.get('symbol')
-                        ))
+                        )
 
             for symbol in symbols:
                 if out_sum.get(symbol, 0) == 0:
-                    self.r[self.source].append(dict(
+                    self._add_chip(
+                        self.source,
                         value=(1 - self.alpha) * self.beta * symbol_value[symbol],
                         timestamp=0,
                         symbol=symbol
-                    ))
+                    )
                 elif in_sum.get(symbol, 0) == 0:
-                    self.r[self.source].append(dict(
+                    self._add_chip(
+                        self.source,
                         value=(1 - self.alpha) * (1 - self.beta) * symbol_value[symbol],
                         timestamp=sys.maxsize,
                         symbol=symbol
-                    ))
+                    )
+
+            self._update_residual_sums()
             return
 
         # copy residual vector with sort and clear
-        r = self.r[node]
-        r.sort(key=lambda x: x.get('timestamp', 0))
-        self.r[node] = list()
+        r = self.r[node].sort()
+        self.r[node] = ChipStore()
 
         # aggregate edges
-        agg_es = self._get_aggregated_edges(node, edges)
+        agg_es = aggregate_edges(node, edges)
         agg_es.sort(key=lambda x: x.get_timestamp())
 
         # push
         self._self_push(node, r)
         self._forward_push(node, agg_es, r)
         self._backward_push(node, agg_es, r)
-
-        # marge chips
-        for node, chips in self.r.items():
-            _chips = dict()
-            for chip in chips:
-                key = (chip.get('symbol'), chip.get('timestamp'))
-                if _chips.get(key) is None:
-                    _chips[key] = chip
-                    continue
-                _chips[key]['value'] += chip.get('value', 0)
-            self.r[node] = [v for v in _chips.values()]
+        self._update_residual_sums()
 
         # yield edges
         if node not in self._vis:
             self._vis.add(node)
             yield from edges
 
-    def _self_push(self, node, r: list):
-        sum_r = 0
-        for chip in r:
-            sum_r += chip.get('value', 0)
+    def _self_push(self, node, r: ChipStore):
+        sum_r = r.sum()
         self.p[node] = self.p.get(node, 0) + self.alpha * sum_r
 
-    def _forward_push(self, node, aggregated_edges: list, r: list):
+    def _forward_push(self, node, aggregated_edges: list, r: ChipStore):
         if len(r) == 0:
             return
+        symbols = self._symbols.symbols
 
         # calc the weight sum after each chip
         j = len(aggregated_edges) - 1
         sum_w, W = dict(), dict()
         for i in range(len(r) - 1, -1, -1):
-            c = r[i]
-            while j >= 0 and aggregated_edges[j].get_timestamp() > c.get('timestamp', 0):
+            while j >= 0 and aggregated_edges[j].get_timestamp() > r.timestamps[i]:
                 e = aggregated_edges[j]
                 profits = e.get_output_profits()
                 for profit in profits:
                     sum_w[profit.symbol] = sum_w.get(profit.symbol, 0) + profit.value
                 j -= 1
-            W[str(c)] = sum_w.get(c.get('symbol'), 0)
+            W[i] = sum_w.get(symbols[r.symbols[i]], 0)
 
         # construct index for distributing profit
         symbol_agg_es = dict()
@@ -1049,10 +1170,9 @@ class TTRPrice(TTR):
             if len(output_profits) == 0:
                 continue
 
-            while j < len(r) and e.get_timestamp() > r[j].get('timestamp', 0):
-                c = r[j]
-                symbol = c.get('symbol')
-                inc_d = (c.get('value', 0) / W[str(c)]) if W[str(c)] != 0 else 0
+            while j < len(r) and e.get_timestamp() > r.timestamps[j]:
+                symbol = symbols[r.symbols[j]]
+                inc_d = (r.values[j] / W[j]) if W[j] != 0 else 0
                 d[symbol] = d.get(symbol, 0) + inc_d
                 j += 1
 
@@ -1071,44 +1191,43 @@ class TTRPrice(TTR):
                     chip_value=inc
                 )
                 for dp in distributing_profits:
-                    if self.r.get(dp.address) is None:
-                        self.r[dp.address] = list()
-                    self.r[dp.address].append(dict(
+                    self._add_chip(
+                        dp.address,
                         value=inc / len(distributing_profits),
                         symbol=dp.symbol,
                         timestamp=dp.timestamp,
-                    ))
+                    )
 
         # recycle the residual without push
         cs = dict()
         while j < len(r):
-            c = r[j]
-            key = c.get('symbol'), c.get('timestamp')
-            cs[key] = cs.get(key, 0) + (1 - self.alpha) * self.beta * c.get('value', 0)
+            key = symbols[r.symbols[j]], r.timestamps[j]
+            cs[key] = cs.get(key, 0) + (1 - self.alpha) * self.beta * r.values[j]
             j += 1
         for key, value in cs.items():
-            self.r[node].append(dict(
+            self._add_chip(
+                node,
                 value=value,
                 symbol=key[0],
                 timestamp=key[1]
-            ))
+            )
 
-    def _backward_push(self, node, aggregated_edges: list, r: list):
+    def _backward_push(self, node, aggregated_edges: list, r: ChipStore):
         if len(r) == 0:
             return
+        symbols = self._symbols.symbols
 
         # calc the weight sum before each chip
         j = 0
         sum_w, W = dict(), dict()
         for i in range(0, len(r)):
-            c = r[i]
-            while j < len(aggregated_edges) and aggregated_edges[j].get_timestamp() < c.get('timestamp', 0):
+            while j < len(aggregated_edges) and aggregated_edges[j].get_timestamp() < r.timestamps[i]:
                 e = aggregated_edges[j]
                 profits = e.get_input_profits()
                 for profit in profits:
                     sum_w[profit.symbol] = sum_w.get(profit.symbol, 0) + profit.value
                 j += 1
-            W[i] = sum_w.get(c.get('symbol'), 0)
+            W[i] = sum_w.get(symbols[r.symbols[i]], 0)
 
         # construct index for distributing profit
         symbol_agg_es = dict()
@@ -1140,10 +1259,9 @@ class TTRPrice(TTR):
             if len(input_profits) == 0:
                 continue
 
-            while j >= 0 and e.get_timestamp() < r[j].get('timestamp', 0):
-                c = r[j]
-                symbol = c.get('symbol')
-                inc_d = (c.get('value', 0) / W[j]) if W[j] != 0 else 0
+            while j >= 0 and e.get_timestamp() < r.timestamps[j]:
+                symbol = symbols[r.symbols[j]]
+                inc_d = (r.values[j] / W[j]) if W[j] != 0 else 0
                 d[symbol] = d.get(symbol, 0) + inc_d
                 j -= 1
 
@@ -1162,39 +1280,52 @@ class TTRPrice(TTR):
                     chip_value=inc
                 )
                 for dp in distributing_profits:
-                    if self.r.get(dp.address) is None:
-                        self.r[dp.address] = list()
-                    self.r[dp.address].append(dict(
+                    self._add_chip(
+                        dp.address,
                         value=inc / len(distributing_profits),
                         symbol=dp.symbol,
                         timestamp=dp.timestamp,
-                    ))
+                    )
 
         # recycle the residual without push
         cs = dict()
         while j >= 0:
-            c = r[j]
-            key = c.get('symbol'), c.get('timestamp')
-            cs[key] = cs.get(key, 0) + (1 - self.alpha) * (1 - self.beta) * c.get('value', 0)
+            key = symbols[r.symbols[j]], r.timestamps[j]
+            cs[key] = cs.get(key, 0) + (1 - self.alpha) * (1 - self.beta) * r.values[j]
             j -= 1
         for key, value in cs.items():
-            self.r[node].append(dict(
+            self._add_chip(
+                node,
                 value=value,
                 symbol=key[0],
                 timestamp=key[1]
-            ))
+            )
 
-    def pop(self):
-        node, r = None, self.epsilon
-        for _node, chips in self.r.items():
-            sum_r = 0
-            for chip in chips:
-                if chip.get('value', 0) > self.epsilon * self.alpha:
-                    sum_r += chip.get('value', 0)
-            if sum_r > r:
-                node, r = _node, sum_r
+    def _get_chips(self, node) -> ChipStore:
+        chips = self.r.get(node)
+        if chips is None:
+            chips = self.r[node] = ChipStore()
+        self._touched[node] = True
+        return chips
+
+    def _add_chip(self, node, value: float, timestamp: int, symbol: str, **kwargs):
+        """
+        add a chip to the residual of node, and merge it into the chip with the same symbol and timestamp
+        """
+        self._get_chips(node).add(value, timestamp, self._symbols.intern(symbol), **kwargs)
+
+    def _update_residual_sums(self):
+        for node in self._touched:
+            self._r_sum[node] = self.r[node].sum(min_value=self.epsilon * self.alpha)
+        self._touched = dict()
 
-        return dict(node=node, residual=r) if node is not None else None
+    def pop(self):
+        item = self._r_sum.top()
+        self._record_importances(item[1] if item is not None else 0)
+        if item is None or item[1] <= self.epsilon:
+            return None
+        node, r = item
+        return dict(node=node, residual=r)
 
     def _get_distributing_profit_v2(
             self,
@@ -1307,149 +1438,31 @@ class TTRPrice(TTR):
 
         return rlt
 
-    def _get_aggregated_edges(self, node, edges: list) -> list:
-        """
-        :param node:
-        :param edges: hash, from, to, value, timeStamp, symbol
-        :return:
-        """
-        aggregated_edges = dict()
-        for edge in edges:
-            _hash = edge.get('hash')
-            aggregated_edge = TTRRedirect.AggregatedEdge(
-                _hash=_hash,
-                _profits=[TTRRedirect.AggregatedEdgeProfit(
-                    _address=edge.get('to') if edge.get('from') == node else edge.get('from'),
-                    _value=-edge.get('value') if edge.get('from') == node else edge.get('value'),
-                    _timestamp=edge.get('timeStamp'),
-                    _symbol=edge.get('symbol')
-                )],
-                _aggregated_edges=[edge],
-            )
-
-            aggregated_edge = aggregated_edge.aggregate(aggregated_edges.get(_hash))
-            aggregated_edges[_hash] = aggregated_edge
-            if len(aggregated_edge.profits) == 0:
-                del aggregated_edges[_hash]
-        return [aggregated_edge for aggregated_edge in aggregated_edges.values()]
-
-    class AggregatedEdge:
-        def __init__(
-                self,
-                _hash: str,
-                _profits: list,
-                _aggregated_edges: list,
-        ):
-            self.hash = _hash
-            self.profits = _profits
-            self.aggregated_edges = _aggregated_edges
-
-        def aggregate(self, aggregated_edge):
-            if aggregated_edge is None:
-                return self
-            assert isinstance(aggregated_edge, self.__class__)
-
-            # 1. collect all edges
-            self.aggregated_edges.extend(aggregated_edge.aggregated_edges)
-
-            # 2. according to symbol to classify profit and aggregate
-            aggregated_profits = dict()
-            for profit in self.profits + aggregated_edge.profits:
-                key = (profit.symbol, profit.address)
-                _profit = aggregated_profits.get(key)
-                if _profit is None:
-                    if profit.value != 0:
-                        aggregated_profits[key] = profit
-                    continue
-
-                if _profit.value + profit.value == 0:
-                    del aggregated_profits[key]
-                    continue
-
-                sgn = 1 if _profit.value > 0 else -1
-                sgn *= 1 if _profit.value + profit.value > 0 else -1
-                aggregated_value = _profit.value + profit.value
-                if sgn < 0:
-                    _profit = profit
-                _profit.value = aggregated_value
-                aggregated_profits[key] = _profit
-            self.profits = [v for v in aggregated_profits.values()]
-
-            return self
-
-        def get_input_profit(self, symbol):
-            for profit in self.profits:
-                if profit.symbol == symbol and profit.value > 0:
-                    return profit
-
-        def get_output_profit(self, symbol):
-            for profit in self.profits:
-                if profit.symbol == symbol and profit.value < 0:
-                    return profit
-
-        def get_output_profits(self):
-            rlt = list()
-            for profit in self.profits:
-                if profit.value < 0:
-                    rlt.append(profit)
-            return rlt
-
-        def get_input_profits(self):
-            rlt = list()
-            for profit in self.profits:
-                if profit.value > 0:
-                    rlt.append(profit)
-            return rlt
-
-        def get_output_symbols(self):
-            symbols = set()
-            for profit in self.profits:
-                if profit.value < 0:
-                    symbols.add(profit.symbol)
-            return symbols
-
-        def get_input_symbols(self):
-            symbols = set()
-            for profit in self.profits:
-                if profit.value > 0:
-                    symbols.add(profit.symbol)
-            return symbols
-
-        def get_timestamp(self):
-            timestamp = 0
-            if len(self.profits) > 0:
-                timestamp = self.profits[0].timestamp
-            return timestamp
-
-    class AggregatedEdgeProfit:
-        def __init__(
-                self,
-                _address: str,
-                _value: float,
-                _timestamp: int,
-                _symbol: str,
-        ):
-            self.address = _address
-            self.value = _value
-            self.timestamp = _timestamp
-            self.symbol = _symbol
 
 class TTRAlpha(TTR):
     name = 'TTRAlpha'
 
-    def __init__(self, source, alpha: float = 0.15, beta: float = 0.8, epsilon=1e-5):
-        super().__init__(source, alpha, beta, epsilon)
+    def __init__(self, source, alpha: float = 0.15, beta: float = 0.8, epsilon=1e-5, epsilons: list = None):
+        super().__init__(source, alpha, beta, epsilon, epsilons)
         self.total_weight = None
         self.p = dict()
         self.r = dict()
         self._vis = set()
+        self._r_sum = LazyMaxHeap()
+        self._touched = dict()
+        self._symbols = SymbolTable()
+
+    def get_price_keys(self, node, edges: list) -> set:
+        # only the first push of source prices the edges
+        if node != self.source or node in self._vis:
+            return set()
+        return {_get_price_key(e) for e in edges if e.get('value', 0) != 0}
 
     def push(self, node, edges: list, **kwargs):
         start = time.time()
 
         # if residual vector is none, add empty list
-        if self.r.get(node) is None:
-            self.r[node] = list()
+        self._get_chips(node)
 
         # push on first time
         if node == self.source and node not in self._vis:
@@ -1461,15 +1474,13 @@ class TTRAlpha(TTR):
             symbols = set()
             for e in edges:
 
-                token_contract = e.get('symbol').split('_')[1]
-                token_symbol = e.get('symbol').split('_')[0]
-                if token_symbol in ['WETH', 'native']:
-                    token_contract = ''
+                price_key = _get_price_key(e)
+                token_contract, block_number, timestamp = price_key
                 e['value'] = e.get('value', 0) / (10 ** int(e.get('tokenDecimal', 18)))
-                block_number = e.get('blockNumber')
-                timestamp = e.get('timeStamp')
                 if not e.get('value') == 0:
-                    token_price = TokenPrice(token_contract).get_price_at_specific_block(block_number, timestamp)
+                    token_price = self.prices.get(price_key)
+                    if token_price is None:
+                        token_price = TokenPrice(token_contract).get_price_at_specific_block(block_number, timestamp)
                     logger.warning("Token {} price is {} at block number {} timestamp {}".format(e.get('symbol'),
                                                                                                  token_price,
                                                                                                  block_number,
@@ -1484,6 +1495,8 @@ class TTRAlpha(TTR):
                 elif e.get('from') == self.source:
                     out_sum[e.get('symbol')] = out_sum.get(e.get('symbol'), 0) + e.get('value', 0)
 
+            self.prices = dict()
+
             for key in symbol_value.keys():
                 symbol_value[key] = math.log(symbol_value[key]+1)+1
             _sum = sum(symbol_value.values())
@@ -1496,72 +1509,61 @@ class TTRAlpha(TTR):
             # first forward and backward push
             for e in edges:
                 if e.get('from') == self.source and out_sum.get(e.get('symbol'), 0) != 0:
-                    if self.r.get(e.get('to')) is None:
-                        self.r[e.get('to')] = list()
                     value = (1 - self.alpha) * self.beta * e.get('value', 0) / out_sum[e.get('symbol')] * symbol_value[e.get('symbol')]
                     if value > 0:
-                        self.r[e.get('to')].append(dict(
+                        self._add_chip(
+                            e.get('to'),
                             value=value,
                             timestamp=e.get('timeStamp'),
                             symbol=e.get('symbol'),
                             ratio=value/(len(out_sum) * self.beta * (1 - self.alpha))
-                        ))
+                        )
                 elif e.get('to') == self.source and in_sum.get(e.get('symbol'), 0) != 0:
-                    if self.r.get(e.get('from')) is None:
-                        self.r[e.get('from')] = list()
                     value = (1 - self.alpha) * (1 - self.beta) * e.get('value', 0) / in_sum[e.get('symbol')] * symbol_value[e.get('symbol')]
                     if value > 0:
-                        self.r[e.get('from')].append(dict(
+                        self._add_chip(
+                            e.get('from'),
                             value=value,
                             timestamp=e.get('timeStamp'),
                             symbol=e.get('symbol'),
                             ratio=value/(len(in_sum) * (1 - self.beta) * (1 - self.alpha))
-                        ))
+                        )
 
             for symbol in symbols:
                 if out_sum.get(symbol, 0) == 0:
-                    self.r[self.source].append(dict(
+                    self._add_chip(
+                        self.source,
                         value=(1 - self.alpha) * self.beta * symbol_value[symbol],
                         timestamp=0,
                         symbol=symbol,
                         ratio=symbol_value[symbol]/(len(out_sum))
-                    ))
+                    )
                 elif in_sum.get(symbol, 0) == 0:
-                    self.r[self.source].append(dict(
+                    self._add_chip(
+                        self.source,
                         value=(1 - self.alpha) * (1 - self.beta) * symbol_value[symbol],
                         timestamp=sys.maxsize,
                         symbol=symbol,
                         ratio=symbol_value[symbol]/(len(in_sum))
-                    ))
+                    )
+
+            self._update_residual_sums()
             return
 
         # copy residual vector with sort and clear
-        r = self.r[node]
-        r.sort(key=lambda x: x.get('timestamp', 0))
-        self.r[node] = list()
+        r = self.r[node].sort()
+        self.r[node] = ChipStore(with_ratio=True)
 
         # aggregate edges
-        agg_es = self._get_aggregated_edges(node, edges)
+        agg_es = aggregate_edges(node, edges)
         agg_es.sort(key=lambda x: x.get_timestamp())
 
         # push
-        sum_r = 0
-        for chip in r:
-            sum_r += chip.get('value', 0)
+        sum_r = r.sum()
         self._self_push(node, r)
         self._forward_push(node, agg_es, r, sum_r)
         self._backward_push(node, agg_es, r, sum_r)
-
-        # marge chips
-        for node, chips in self.r.items():
-            _chips = dict()
-            for chip in chips:
-                key = (chip.get('symbol'), chip.get('timestamp'))
-                if _chips.get(key) is None:
-                    _chips[key] = chip
-                    continue
-                _chips[key]['value'] += chip.get('value', 0)
-            self.r[node] = [v for v in _chips.values()]
+        self._update_residual_sums()
 
         # yield edges
         if node not in self._vis:
@@ -1571,15 +1573,16 @@ class TTRAlpha(TTR):
     def get_adaptive_alpha(self, x, total):
         return self.alpha * (1 - np.tanh(x/total-1/2))
 
-    def _self_push(self, node, r: list):
+    def _self_push(self, node, r: ChipStore):
         sum_inc = 0
-        for chip in r:
-            sum_inc += chip.get('value', 0) * self.alpha
+        for value in r.values:
+            sum_inc += value * self.alpha
         self.p[node] = self.p.get(node, 0) + sum_inc
 
-    def _forward_push(self, node, aggregated_edges: list, r: list, sum_r):
+    def _forward_push(self, node, aggregated_edges: list, r: ChipStore, sum_r):
         if len(r) == 0:
             return
+        symbols = self._symbols.symbols
 
         sum_r *= self.beta * (1-self.alpha)
 
@@ -1587,14 +1590,13 @@ class TTRAlpha(TTR):
         j = len(aggregated_edges) - 1
         sum_w, W = dict(), dict()
         for i in range(len(r) - 1, -1, -1):
-            c = r[i]
-            while j >= 0 and aggregated_edges[j].get_timestamp() > c.get('timestamp', 0):
+            while j >= 0 and aggregated_edges[j].get_timestamp() > r.timestamps[i]:
                 e = aggregated_edges[j]
                 profits = e.get_output_profits()
                 for profit in profits:
                     sum_w[profit.symbol] = sum_w.get(profit.symbol, 0) + profit.value
                 j -= 1
-            W[str(c)] = sum_w.get(c.get('symbol'), 0)
+            W[i] = sum_w.get(symbols[r.symbols[i]], 0)
 
         # construct index for distributing profit
         symbol_agg_es = dict()
@@ -1626,10 +1628,9 @@ class TTRAlpha(TTR):
             if len(output_profits) == 0:
                 continue
 
-            while j < len(r) and e.get_timestamp() > r[j].get('timestamp', 0):
-                c = r[j]
-                symbol = c.get('symbol')
-                inc_d = (1 - self.get_adaptive_alpha(c.get('ratio'), 1)) * c.get('value', 0) / W[str(c)] if W[str(c)] != 0 else 0
+            while j < len(r) and e.get_timestamp() > r.timestamps[j]:
+                symbol = symbols[r.symbols[j]]
+                inc_d = (1 - self.get_adaptive_alpha(r.ratios[j], 1)) * r.values[j] / W[j] if W[j] != 0 else 0
                 d[symbol] = d.get(symbol, 0) + inc_d
                 j += 1
 
@@ -1648,33 +1649,33 @@ class TTRAlpha(TTR):
                     chip_value=inc
                 )
                 for dp in distributing_profits:
-                    if self.r.get(dp.address) is None:
-                        self.r[dp.address] = list()
                     value = inc / len(distributing_profits)
-                    self.r[dp.address].append(dict(
+                    self._add_chip(
+                        dp.address,
                         value=value,
                         symbol=dp.symbol,
                         timestamp=dp.timestamp,
                         ratio=value/sum_r
-                    ))
+                    )
         # recycle the residual without push
         cs = dict()
         while j < len(r):
-            c = r[j]
-            key = c.get('symbol'), c.get('timestamp')
-            cs[key] = cs.get(key, 0) + (1 - self.get_adaptive_alpha(c.get('ratio'), 1)) * self.beta * c.get('value', 0)
+            key = symbols[r.symbols[j]], r.timestamps[j]
+            cs[key] = cs.get(key, 0) + (1 - self.get_adaptive_alpha(r.ratios[j], 1)) * self.beta * r.values[j]
             j += 1
         for key, value in cs.items():
-            self.r[node].append(dict(
+            self._add_chip(
+                node,
                 value=value,
                 symbol=key[0],
                 timestamp=key[1],
                 ratio=value/sum_r
-            ))
+            )
 
-    def _backward_push(self, node, aggregated_edges: list, r: list, sum_r):
+    def _backward_push(self, node, aggregated_edges: list, r: ChipStore, sum_r):
         if len(r) == 0:
             return
+        symbols = self._symbols.symbols
 
         sum_r *= (1 - self.alpha) * (1 - self.beta)
 
@@ -1682,14 +1683,13 @@ class TTRAlpha(TTR):
         j = 0
         sum_w, W = dict(), dict()
         for i in range(0, len(r)):
-            c = r[i]
-            while j < len(aggregated_edges) and aggregated_edges[j].get_timestamp() < c.get('timestamp', 0):
+            while j < len(aggregated_edges) and aggregated_edges[j].get_timestamp() < r.timestamps[i]:
                 e = aggregated_edges[j]
                 profits = e.get_input_profits()
                 for profit in profits:
                     sum_w[profit.symbol] = sum_w.get(profit.symbol, 0) + profit.value
                 j += 1
-            W[i] = sum_w.get(c.get('symbol'), 0)
+            W[i] = sum_w.get(symbols[r.symbols[i]], 0)
 
         # construct index for distributing profit
         symbol_agg_es = dict()
@@ -1721,10 +1721,9 @@ class TTRAlpha(TTR):
             if len(input_profits) == 0:
                 continue
 
-            while j >= 0 and e.get_timestamp() < r[j].get('timestamp', 0):
-                c = r[j]
-                symbol = c.get('symbol')
-                inc_d = (1 - self.get_adaptive_alpha(c.get('ratio'), 1)) * c.get('value', 0) / W[j] if W[j] != 0 else 0
+            while j >= 0 and e.get_timestamp() < r.timestamps[j]:
+                symbol = symbols[r.symbols[j]]
+                inc_d = (1 - self.get_adaptive_alpha(r.ratios[j], 1)) * r.values[j] / W[j] if W[j] != 0 else 0
                 d[symbol] = d.get(symbol, 0) + inc_d
                 j -= 1
 
@@ -1743,41 +1742,55 @@ class TTRAlpha(TTR):
                     chip_value=inc
                 )
                 for dp in distributing_profits:
-                    if self.r.get(dp.address) is None:
-                        self.r[dp.address] = list()
                     value = inc / len(distributing_profits)
-                    self.r[dp.address].append(dict(
+                    self._add_chip(
+                        dp.address,
                         value=value,
                         symbol=dp.symbol,
                         timestamp=dp.timestamp,
                         ratio=value/sum_r
-                    ))
+                    )
 
         # recycle the residual without push
         cs = dict()
         while j >= 0:
-            c = r[j]
-            key = c.get('symbol'), c.get('timestamp')
-            cs[key] = cs.get(key, 0) + (1 - self.get_adaptive_alpha(c.get('ratio'), 1)) * (1 - self.beta) * c.get('value', 0)
+            key = symbols[r.symbols[j]], r.timestamps[j]
+            cs[key] = cs.get(key, 0) + (1 - self.get_adaptive_alpha(r.ratios[j], 1)) * (1 - self.beta) * r.values[j]
             j -= 1
         for key, value in cs.items():
-            self.r[node].append(dict(
+            self._add_chip(
+                node,
                 value=value,
                 symbol=key[0],
                 timestamp=key[1],
                 ratio=value/sum_r
-            ))
+            )
 
-    def pop(self):
-        node, r = None, self.epsilon
-        for _node, chips in self.r.items():
-            sum_r = 0
-            for chip in chips:
-                sum_r += chip.get('value', 0)
-            if sum_r > r:
-                node, r = _node, sum_r
+    def _get_chips(self, node) -> ChipStore:
+        chips = self.r.get(node)
+        if chips is None:
+            chips = self.r[node] = ChipStore(with_ratio=True)
+        self._touched[node] = True
+        return chips
 
-        return dict(node=node, residual=r) if node is not None else None
+    def _add_chip(self, node, value: float, timestamp: int, symbol: str, **kwargs):
+        """
+        add a chip to the residual of node, and merge it into the chip with the same symbol and timestamp
+        """
+        self._get_chips(node).add(value, timestamp, self._symbols.intern(symbol), **kwargs)
+
+    def _update_residual_sums(self):
+        for node in self._touched:
+            self._r_sum[node] = self.r[node].sum()
+        self._touched = dict()
+
+    def pop(self):
+        item = self._r_sum.top()
+        self._record_importances(item[1] if item is not None else 0)
+        if item is None or item[1] <= self.epsilon:
+            return None
+        node, r = item
+        return dict(node=node, residual=r)
 
     def _get_distributing_profit_v2(
             self,
@@ -1889,130 +1902,3 @@ class TTRAlpha(TTR):
                 rlt.extend([profit for profit in no_reverse_profits if profit.symbol == symbol])
 
         return rlt
-
-    def _get_aggregated_edges(self, node, edges: list) -> list:
-        """
-        :param node:
-        :param edges: hash, from, to, value, timeStamp, symbol
-        :return:
-        """
-        aggregated_edges = dict()
-        for edge in edges:
-            _hash = edge.get('hash')
-            aggregated_edge = TTRRedirect.AggregatedEdge(
-                _hash=_hash,
-                _profits=[TTRRedirect.AggregatedEdgeProfit(
-                    _address=edge.get('to') if edge.get('from') == node else edge.get('from'),
-                    _value=-edge.get('value') if edge.get('from') == node else edge.get('value'),
-                    _timestamp=edge.get('timeStamp'),
-                    _symbol=edge.get('symbol')
-                )],
-                _aggregated_edges=[edge],
-            )
-
-            aggregated_edge = aggregated_edge.aggregate(aggregated_edges.get(_hash))
-            aggregated_edges[_hash] = aggregated_edge
-            if len(aggregated_edge.profits) == 0:
-                del aggregated_edges[_hash]
-        return [aggregated_edge for aggregated_edge in aggregated_edges.values()]
-
-    class AggregatedEdge:
-        def __init__(
-                self,
-                _hash: str,
-                _profits: list,
-                _aggregated_edges: list,
-        ):
-            self.hash = _hash
-            self.profits = _profits
-            self.aggregated_edges = _aggregated_edges
-
-        def aggregate(self, aggregated_edge):
-            if aggregated_edge is None:
-                return self
-            assert isinstance(aggregated_edge, self.__class__)
-
-            # 1. collect all edges
-            self.aggregated_edges.extend(aggregated_edge.aggregated_edges)
-
-            # 2. according to symbol to classify profit and aggregate
-            aggregated_profits = dict()
-            for profit in self.profits + aggregated_edge.profits:
-                key = (profit.symbol, profit.address)
-                _profit = aggregated_profits.get(key)
-                if _profit is None:
-                    if profit.value != 0:
-                        aggregated_profits[key] = profit
-                    continue
-
-                if _profit.value + profit.value == 0:
-                    del aggregated_profits[key]
-                    continue
-
-                sgn = 1 if _profit.value > 0 else -1
-                sgn *= 1 if _profit.value + profit.value > 0 else -1
-                aggregated_value = _profit.value + profit.value
-                if sgn < 0:
-                    _profit = profit
-                _profit.value = aggregated_value
-                aggregated_profits[key] = _profit
-            self.profits = [v for v in aggregated_profits.values()]
-
-            return self
-
-        def get_input_profit(self, symbol):
-            for profit in self.profits:
-                if profit.symbol == symbol and profit.value > 0:
-                    return profit
-
-        def get_output_profit(self, symbol):
-            for profit in self.profits:
-                if profit.symbol == symbol and profit.value < 0:
-                    return profit
-
-        def get_output_profits(self):
-            rlt = list()
-            for profit in self.profits:
-                if profit.value < 0:
-                    rlt.append(profit)
-            return rlt
-
-        def get_input_profits(self):
-            rlt = list()
-            for profit in self.profits:
-                if profit.value > 0:
-                    rlt.append(profit)
-            return rlt
-
-        def get_output_symbols(self):
-            symbols = set()
-            for profit in self.profits:
-                if profit.value < 0:
-                    symbols.add(profit.symbol)
-            return symbols
-
-        def get_input_symbols(self):
-            symbols = set()
-            for profit in self.profits:
-                if profit.value > 0:
-                    symbols.add(profit.symbol)
-            return symbols
-
-        def get_timestamp(self):
-            timestamp = 0
-            if len(self.profits) > 0:
-                timestamp = self.profits[0].timestamp
-            return timestamp
-
-    class AggregatedEdgeProfit:
-        def __init__(
-                self,
-                _address: str,
-                _value: float,
-                _timestamp: int,
-                _symbol: str,
-        ):
-            self.address = _address
-            self.value = _value
-            self.timestamp = _timestamp
-            self.symbol = _symbol
@@ -1,2 +1,3 @@
 from .asynchronous import AsyncSubgraphTask
 from .synchronize import SyncSubgraphTask
+from .offline import OfflineSubgraphTask, EdgeStore, MemoryEdgeStore, CSVEdgeStore, HttpCacheEdgeStore
@@ -0,0 +1,192 @@
+import csv
+import gzip
+import json
+import os
+import pickle
+from collections.abc import Iterator
+from urllib.parse import urlparse, parse_qs
+
+from BlockchainSpider.items import SubgraphTxItem, ImportanceItem
+from ._meta import SubgraphTask
+
+
+class EdgeStore:
+    def get(self, address) -> list:
+        """
+        get the edges of the address
+        :param address:
+        :return: a list of edges, or None if the address is not stored
+        """
+        raise NotImplementedError()
+
+
+class MemoryEdgeStore(EdgeStore):
+    def __init__(self):
+        self._edges = dict()
+        self._ids = dict()
+
+    def add(self, address, edge: dict):
+        # deduplicate the edges of the address by id
+        key = edge.get('id')
+        ids = self._ids.setdefault(address, set())
+        if key is not None:
+            if key in ids:
+                return
+            ids.add(key)
+        self._edges.setdefault(address, list()).append(edge)
+
+    def get(self, address) -> list:
+        edges = self._edges.get(address)
+        if edges is None:
+            return None
+
+        # strategies may modify the edges in place, so copy them for each replay
+        return [dict(e) for e in edges]
+
+    def __len__(self):
+        return len(self._edges)
+
+
+class CSVEdgeStore(MemoryEdgeStore):
+    """
+    Edges loaded from the csv files saved by `SubgraphTxsPipeline`, indexed by address.
+
+    Only the edges of the addresses crawled in the original trace are complete,
+    so a replay is exact if it pushes no more addresses than the original one.
+    Note that TTRPrice and TTRAlpha save the edges of the source with the normalized values.
+    """
+    NUMERIC_FIELDS = {'value', 'timeStamp', 'blockNumber'}
+
+    def __init__(self, path: str):
+        super().__init__()
+        if os.path.isdir(path):
+            fns = [os.path.join(path, fn) for fn in sorted(os.listdir(path)) if fn.endswith('.csv')]
+        else:
+            fns = [path]
+
+        for fn in fns:
+            with open(fn, 'r', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                for row in reader:
+                    edge = {header[i]: row[i] for i in range(len(header))}
+                    for field in self.NUMERIC_FIELDS & edge.keys():
+                        edge[field] = self._parse_number(edge[field])
+                    self.add(edge.get('from'), edge)
+                    if edge.get('to') != edge.get('from'):
+                        self.add(edge.get('to'), edge)
+
+    @staticmethod
+    def _parse_number(value: str):
+        if value == '':
+            return 0
+        try:
+            return int(value)
+        except ValueError:
+            return float(value)
+
+
+class HttpCacheEdgeStore(MemoryEdgeStore):
+    """
+    Edges loaded from the http cache of a txs spider, e.g. `.scrapy/cache/txs.eth.ttr`,
+    indexed by the address of the cached request.
+    The edges are parsed in the same way as the spider, so the replay of a cached trace is exact.
+    """
+    TXS_TYPES = {
+        'txlist': 'external',
+        'txlistinternal': 'internal',
+        'tokentx': 'erc20',
+        'tokennfttx': 'erc721',
+    }
+
+    def __init__(
+            self,
+            path: str,
+            txs_types: list = None,
+            start_blk: int = 0,
+            end_blk: int = 99999999,
+            symbols: set = None,
+    ):
+        super().__init__()
+        from BlockchainSpider.spiders.txs.eth._meta import TxsETHSpider
+
+        for root, _, fns in os.walk(path):
+            if 'pickled_meta' not in fns or 'response_body' not in fns:
+                continue
+            meta = pickle.loads(self._read(os.path.join(root, 'pickled_meta')))
+            if meta.get('status') != 200:
+                continue
+
+            # load the txs type and address of the request
+            query = parse_qs(urlparse(meta['url']).query)
+            txs_type = self.TXS_TYPES.get(query.get('action', [''])[0])
+            address = query.get('address', [None])[0]
+            if txs_type is None or address is None:
+                continue
+            if txs_types is not None and txs_type not in txs_types:
+                continue
+
+            data = json.loads(self._read(os.path.join(root, 'response_body')))
+            txs = TxsETHSpider.parse_txs(data, symbols)
+            if txs is None:
+                continue
+            for tx in txs:
+                if start_blk <= int(tx.get('blockNumber', 0)) <= end_blk:
+                    self.add(address, tx)
+
+    @staticmethod
+    def _read(fn: str) -> bytes:
+        with open(fn, 'rb') as f:
+            data = f.read()
+        return gzip.decompress(data) if data[:2] == b'\x1f\x8b' else data
+
+
+class OfflineSubgraphTask(SubgraphTask):
+    """
+    Replay a strategy against a local edge store without the scrapy engine,
+    and the addresses missed in the store are fused as the spider does on failed requests.
+    """
+
+    def __init__(self, strategy, store: EdgeStore, **kwargs):
+        super().__init__(strategy, **kwargs)
+        self.store = store
+        self.stats = dict(pushes=0, missing=0, edges=0)
+
+    def push(self, node, edges: list, **kwargs):
+        if self.is_closed:
+            return
+
+        rlt = self.strategy.push(node, edges, **kwargs)
+        if isinstance(rlt, Iterator):
+            yield from rlt
+
+    def pop(self):
+        if self.is_closed:
+            return
+        return self.strategy.pop()
+
+    def run(self, max_pushes: int = None):
+        """
+        push the addresses popped by the strategy until it stops,
+        and yield the items which the spider would save
+        :param max_pushes: the max number of pushes, no limit if None
+        :return:
+        """
+        node = self.strategy.source
+        while node is not None and (max_pushes is None or self.stats['pushes'] < max_pushes):
+            edges = self.store.get(node)
+            if edges is None:
+                self.stats['missing'] += 1
+                edges = list()
+            self.stats['pushes'] += 1
+            self.stats['edges'] += len(edges)
+
+            for tx in self.push(node, edges):
+                yield SubgraphTxItem(source=self.info['source'], tx=tx, task_info=self.info)
+
+            item = self.pop()
+            node = item['node'] if item is not None else None
+
+        importance = getattr(self.strategy, 'p', None)
+        if importance is not None:
+            yield ImportanceItem(source=self.info['source'], importance=importance, task_info=self.info)
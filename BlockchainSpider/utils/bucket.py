@@ -2,39 +2,138 @@ import asyncio
 import json
 import sys
 import time
-
-from twisted.internet.defer import DeferredLock
+from collections import deque
 
 from BlockchainSpider import settings
 
 
-class APIKeyBucket:
-    def __init__(self, apikeys: [str], kps: int):
-        self.apikeys = apikeys
-        self.kps = kps
-
-        self._last_get_time = 0
-        self._get_interval = 1 / (len(self.apikeys) * kps)
-        self._lock = DeferredLock()
-
-    def get(self) -> str:
-        # get lock
-        self._lock.acquire()
+class RollingWindowBucket:
+    """
+    A non-blocking rate limiter of items, e.g. apikeys or providers.
+
+    Each item has rolling windows of (max count, seconds), and `reserve` books the item
+    which is available the earliest, returning how long the caller should wait before using it.
+
+    The rate of each item is adapted by the `feedback` of its responses in AIMD style:
+    the rate is cut down on rate limit errors and raised slowly on successes,
+    and the items failing too many times in a row are quarantined for a while.
+    """
+    RATE_DECREASE = 0.5
+    RATE_INCREASE = 0.05
+    MIN_RATE = 0.2
+    MAX_FAILURES = 3
+    QUARANTINE_SECS = 60
+
+    def __init__(self, items: list, rate: int, windows: list = None, quotas: dict = None):
+        """
+        :param items:
+        :param rate: the default max count of each item in one second
+        :param windows: extra rolling windows shared by all items, e.g. [(100000, 86400)]
+        :param quotas: the max count in one second of the given items, overriding `rate`
+        """
+        assert len(items) > 0
+        self.items = items
+        self.windows = dict()
+        for item in items:
+            _windows = [(quotas.get(item, rate) if quotas else rate, 1)]
+            _windows.extend((int(count), float(seconds)) for count, seconds in windows or list())
+            for count, _ in _windows:
+                assert count > 0
+            self.windows[item] = _windows
+
+        self._history = {item: deque() for item in items}
+        self._index = 0
 
-        # get apikey
+        # adaptive rates, consecutive failures and quarantine deadlines of items
+        self.rates = {item: float(self.windows[item][0][0]) for item in items}
+        self._failures = {item: 0 for item in items}
+        self._quarantine = dict()
+
+    def get_available_time(self, item, now: float = None) -> float:
+        """
+        get the earliest time when the item can be used without exceeding any window
+        :param item:
+        :param now:
+        :return:
+        """
+        now = now if now is not None else time.time()
+        history = self._history[item]
+        rlt = max(now, self._quarantine.get(item, 0))
+        for count, seconds in self.windows[item]:
+            if len(history) >= count:
+                rlt = max(rlt, history[-count] + seconds)
+
+        # space the reservations evenly if the rate is cut down
+        if len(history) > 0 and self.rates[item] < self.windows[item][0][0]:
+            rlt = max(rlt, history[-1] + 1 / self.rates[item])
+        return rlt
+
+    def feedback(self, item, limited: bool):
+        """
+        adapt the rate of the item by the response
+        :param item:
+        :param limited: whether the response is a rate limit error
+        :return: the seconds of quarantine if the item is quarantined, otherwise 0
+        """
+        if item not in self.rates:
+            return 0
+        if not limited:
+            self._failures[item] = 0
+            self.rates[item] = min(self.rates[item] + self.RATE_INCREASE, self.windows[item][0][0])
+            return 0
+
+        self.rates[item] = max(self.rates[item] * self.RATE_DECREASE, self.MIN_RATE)
+        self._failures[item] += 1
+        if self._failures[item] < self.MAX_FAILURES:
+            return 0
+
+        # quarantine the item longer if it still fails after the last quarantine
+        seconds = self.QUARANTINE_SECS * 2 ** min(self._failures[item] - self.MAX_FAILURES, 4)
+        self._quarantine[item] = time.time() + seconds
+        return seconds
+
+    def reserve(self) -> tuple:
+        """
+        book the item which is available the earliest, and the ties are broken in round-robin order
+        :return: a tuple of item and the seconds to wait before using it
+        """
         now = time.time()
-        duration = now - self._last_get_time
-        if duration < self._get_interval:
-            time.sleep(self._get_interval - duration)
-        self._last_get_time = time.time()
-        key = self.get_apikey()
+        idx, available_time = None, None
+        for i in range(len(self.items)):
+            _idx = (self._index + i) % len(self.items)
+            _available_time = self.get_available_time(self.items[_idx], now)
+            if available_time is None or _available_time < available_time:
+                idx, available_time = _idx, _available_time
+            if available_time <= now:
+                break
+        self._index = (idx + 1) % len(self.items)
+
+        # only the latest reservations in the largest window are needed
+        item = self.items[idx]
+        history = self._history[item]
+        history.append(available_time)
+        max_count = max(count for count, _ in self.windows[item])
+        while len(history) > max_count:
+            history.popleft()
+        return item, available_time - now
+
+    async def get(self):
+        """
+        get an item, waiting without blocking the reactor until the item is available,
+        the same as `AsyncItemBucket.get`
+        :return:
+        """
+        item, delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return item
 
-        # release lock and return key
-        self._lock.release()
-        return key
 
-    def get_apikey(self) -> str:
-        raise NotImplementedError()
+class APIKeyBucket(RollingWindowBucket):
+    def __init__(self, apikeys: [str], kps: int, windows: list = None, quotas: dict = None):
+        super().__init__(apikeys, kps, windows, quotas)
+        self.apikeys = apikeys
+        self.kps = kps
 
 
 class StaticAPIKeyBucket(APIKeyBucket):
@@ -44,14 +143,11 @@ class StaticAPIKeyBucket(APIKeyBucket):
 
         apikeys = apikeys.get(net, list())
         assert len(apikeys) > 0
-        super().__init__(apikeys, kps)
-
-        self._index = 0
-
-    def get_apikey(self) -> str:
-        key = self.apikeys[self._index]
-        self._index = (self._index + 1) % len(self.apikeys)
-        return key
+        super().__init__(
+            apikeys, kps,
+            windows=getattr(settings, 'APIKEYS_WINDOWS', dict()).get(net),
+            quotas=getattr(settings, 'APIKEYS_QUOTAS', None),
+        )
 
 
 class JsonAPIKeyBucket(APIKeyBucket):
@@ -66,48 +162,19 @@ class JsonAPIKeyBucket(APIKeyBucket):
             apikeys = data.get(self.net)
 
         assert len(apikeys) > 0
-        super().__init__(apikeys, kps)
+        super().__init__(
+            apikeys, kps,
+            windows=getattr(settings, 'APIKEYS_WINDOWS', dict()).get(net),
+            quotas=getattr(settings, 'APIKEYS_QUOTAS', None),
+        )
 
-        self._index = 0
 
-    def get_apikey(self) -> str:
-        key = self.apikeys[self._index]
-        self._index = (self._index + 1) % len(self.apikeys)
-        return key
-
-
-class ProvidersBucket:
-    def __init__(self, providers: [str], qps: int):
+class ProvidersBucket(RollingWindowBucket):
+    def __init__(self, providers: [str], qps: int, windows: list = None, quotas: dict = None):
+        super().__init__(providers, qps, windows, quotas)
         self.providers = providers
         self.qps = qps
 
-        self._last_get_time = [0 for _ in range(len(self.providers))]
-        self._get_interval = 1 / (len(self.providers) * qps)
-        self._lock = DeferredLock()
-
-    def get(self) -> str:
-        # get lock
-        self._lock.acquire()
-
-        # choose a provider
-        idx, last_get_time = 0, sys.maxsize
-        for _idx, _last_get_time in enumerate(self._last_get_time):
-            if _last_get_time < last_get_time:
-                last_get_time = _last_get_time
-                idx = _idx
-
-        # get provider
-        now = time.time()
-        duration = now - last_get_time
-        if duration < self._get_interval:
-            time.sleep(self._get_interval - duration)
-        self._last_get_time[idx] = time.time()
-        provider = self.providers[idx]
-
-        # release lock and return provider
-        self._lock.release()
-        return provider
-
 
 class StaticProvidersBucket(ProvidersBucket):
     def __init__(self, net: str, kps: int = 5):
@@ -1,22 +1,73 @@
+import sys
+from collections import OrderedDict
+from typing import Callable
+
+
 class LRUCache:
-    def __init__(self, max_size: int = 128):
+    """
+    A least recently used cache with O(1) get and set.
+
+    The items are evicted if there are more than `max_size` items, or if the total size
+    of the values measured by `sizeof` is larger than `max_bytes`.
+    The hits, misses and evictions are counted for tuning the cache size.
+    """
+
+    def __init__(self, max_size: int = 128, max_bytes: int = None, sizeof: Callable = sys.getsizeof):
+        assert max_size > 0
+        assert max_bytes is None or max_bytes > 0
         self.max_size = max_size
-        self._cache = dict()
-        self._key_list = list()
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._cache = OrderedDict()
+        self._sizes = dict()
+        self.bytes = 0
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-    def get(self, key):
+    def get(self, key, default=None):
         value = self._cache.get(key)
-        if value is not None:
-            self._key_list.remove(key)
-            self._key_list.insert(0, key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._cache.move_to_end(key)
         return value
 
     def set(self, key, value):
-        # replace cache item if full
-        if len(self._cache) >= self.max_size:
-            _key = self._key_list.pop()
-            self._cache.pop(_key)
-
-        # set cache
+        if key in self._cache:
+            self._cache.move_to_end(key)
         self._cache[key] = value
-        self._key_list.insert(0, key)
+        if self.max_bytes is not None:
+            size = self.sizeof(value)
+            self.bytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+
+        # evict the least recently used items, but keep the latest one
+        while len(self._cache) > self.max_size or \
+                (self.max_bytes is not None and self.bytes > self.max_bytes and len(self._cache) > 1):
+            _key, _ = self._cache.popitem(last=False)
+            self.bytes -= self._sizes.pop(_key, 0)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        value = self._cache.pop(key, default)
+        self.bytes -= self._sizes.pop(key, 0)
+        return value
+
+    def stats(self) -> dict:
+        return dict(
+            size=len(self._cache),
+            bytes=self.bytes,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def __len__(self):
+        return len(self._cache)
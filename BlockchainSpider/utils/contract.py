@@ -0,0 +1,146 @@
+import asyncio
+import atexit
+import json
+import os
+import sqlite3
+import time
+
+from BlockchainSpider import settings
+from BlockchainSpider.utils.web3 import web3_json_rpc
+
+
+class ContractStore:
+    """
+    A persistent cache of the contract types, token metadata and codes in SQLite,
+    keyed by address in a file per chain and opened once per process.
+
+    The fields of an address are saved as a json object, and the new fields are
+    buffered and written in batch. The least recently used addresses are evicted
+    if the store is larger than `max_size`.
+    """
+    BATCH_SIZE = 256
+    _stores = dict()
+
+    def __init__(self, path: str, max_size: int = 1000000):
+        self.path = path
+        self.max_size = max_size
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS contracts ('
+            'address TEXT PRIMARY KEY, data TEXT NOT NULL, last_used REAL NOT NULL) WITHOUT ROWID'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS contracts_last_used ON contracts (last_used)')
+        self._pending = dict()
+        self._touched = dict()
+
+    @classmethod
+    def open(cls, path: str = None, max_size: int = None, chain_id: int = None):
+        """
+        get the store of the path opened in this process, or open it
+        :param path: the sqlite file, `CONTRACT_DB_FILENAME` in settings by default
+        :param max_size: the max number of addresses, `CONTRACT_DB_MAX_SIZE` in settings by default
+        :param chain_id: the chain of the addresses, saved in `<path>.<chain_id>.db` since
+        the same address may be different contracts on different chains
+        :return:
+        """
+        if path is None:
+            path = getattr(settings, 'CONTRACT_DB_FILENAME', None) or \
+                   os.path.join(os.path.dirname(os.path.abspath(__file__)), 'contract.db')
+        if chain_id is not None:
+            name, ext = os.path.splitext(path)
+            path = '%s.%d%s' % (name, chain_id, ext)
+        if max_size is None:
+            max_size = getattr(settings, 'CONTRACT_DB_MAX_SIZE', 1000000)
+        path = os.path.abspath(path)
+
+        store = cls._stores.get(path)
+        if store is None:
+            store = cls(path, max_size)
+            cls._stores[path] = store
+            atexit.register(store.close)
+        return store
+
+    def _load(self, address: str) -> dict:
+        data = self._pending.get(address)
+        if data is not None:
+            return data
+        row = self.conn.execute('SELECT data FROM contracts WHERE address = ?', (address,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def get(self, address: str, field: str):
+        """
+        :param address:
+        :param field: e.g. is_token721, name, code
+        :return: the cached value, or None if not cached
+        """
+        data = self._load(address)
+        if data is None or field not in data:
+            return None
+        self._touched[address] = time.time()
+        if len(self._touched) >= self.BATCH_SIZE:
+            self.flush()
+        return data[field]
+
+    def set(self, address: str, field: str, value):
+        data = self._load(address) or dict()
+        data[field] = value
+        self._pending[address] = data
+        self._touched[address] = time.time()
+        if len(self._pending) >= self.BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if len(self._pending) > 0:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO contracts VALUES (?, ?, ?)',
+                [(address, json.dumps(data), self._touched.get(address, time.time()))
+                 for address, data in self._pending.items()],
+            )
+        self.conn.executemany(
+            'UPDATE contracts SET last_used = ? WHERE address = ?',
+            [(last_used, address) for address, last_used in self._touched.items() if address not in self._pending],
+        )
+        self._pending.clear()
+        self._touched.clear()
+
+        # evict the least recently used addresses
+        size = self.conn.execute('SELECT COUNT(*) FROM contracts').fetchone()[0]
+        if size > self.max_size:
+            self.conn.execute(
+                'DELETE FROM contracts WHERE address IN '
+                '(SELECT address FROM contracts ORDER BY last_used LIMIT ?)',
+                (size - self.max_size,),
+            )
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is None:
+            return
+        self.flush()
+        self.conn.close()
+        self.conn = None
+        self._stores.pop(self.path, None)
+
+
+_chain_ids = dict()
+
+
+async def get_chain_id(provider_bucket, timeout: int):
+    """
+    get the chain id of the providers by `eth_chainId`, which is requested once per process
+    :param provider_bucket:
+    :param timeout:
+    :return: the chain id, or None if the providers fail
+    """
+    key = tuple(provider_bucket.items)
+    if key not in _chain_ids:
+        async def _request():
+            result = await web3_json_rpc(
+                tx_obj={"jsonrpc": "2.0", "method": "eth_chainId", "params": [], "id": 1},
+                provider=await provider_bucket.get(),
+                timeout=timeout,
+            )
+            return int(result, 16) if isinstance(result, str) else None
+
+        _chain_ids[key] = asyncio.ensure_future(_request())
+    return await _chain_ids[key]
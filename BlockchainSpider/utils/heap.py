@@ -0,0 +1,97 @@
+import heapq
+
+
+class LazyMaxHeap(dict):
+    """
+    A dict of node -> priority which also answers the max-priority query in O(log n).
+
+    Every assignment pushes a new heap entry, and outdated entries are dropped lazily
+    when they reach the heap top. Ties are broken by the first insertion order of keys,
+    which is the same order as a linear scan over the dict with `>`.
+    """
+
+    def __init__(self, items: dict = None):
+        super().__init__()
+        self._heap = list()
+        self._order = dict()
+        if items is not None:
+            for key, value in items.items():
+                self[key] = value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+
+        order = self._order.get(key)
+        if order is None:
+            order = len(self._order)
+            self._order[key] = order
+        if value > 0:
+            heapq.heappush(self._heap, (-value, order, key))
+
+        # rebuild the heap if too many outdated entries
+        if len(self._heap) > 2 * len(self) + 1024:
+            self._rebuild()
+
+    def increase(self, keys: list, incs: list):
+        """
+        add the increments to the priorities of keys in batch,
+        which heapifies once instead of pushing every entry for a large batch
+        :param keys:
+        :param incs:
+        :return:
+        """
+        entries = list()
+        for key, inc in zip(keys, incs):
+            value = self.get(key, 0) + inc
+            super().__setitem__(key, value)
+            order = self._order.get(key)
+            if order is None:
+                order = len(self._order)
+                self._order[key] = order
+            if value > 0:
+                entries.append((-value, order, key))
+
+        if len(entries) > len(self._heap):
+            self._heap.extend(entries)
+            heapq.heapify(self._heap)
+        else:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self) + 1024:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(-v, self._order[k], k) for k, v in self.items() if v > 0]
+        heapq.heapify(self._heap)
+
+    def top(self):
+        """
+        get the key with the max priority
+        :return: a tuple of key and priority, or None if no positive priority
+        """
+        while len(self._heap) > 0:
+            value, _, key = self._heap[0]
+            if self.get(key) == -value:
+                return key, -value
+            heapq.heappop(self._heap)
+        return None
+
+    def top_k(self, k: int) -> list:
+        """
+        get the k keys with the max priorities without removing them,
+        which walks the heap from the top in O(k log k) plus the outdated entries met
+        :param k:
+        :return: a list of tuples of key and priority, in descending order of priority
+        """
+        rlt, keys = list(), set()
+        candidates = [(self._heap[0], 0)] if len(self._heap) > 0 else list()
+        while len(candidates) > 0 and len(rlt) < k:
+            entry, i = heapq.heappop(candidates)
+            value, _, key = entry
+            if key not in keys and self.get(key) == -value:
+                keys.add(key)
+                rlt.append((key, -value))
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self._heap):
+                    heapq.heappush(candidates, (self._heap[child], child))
+        return rlt
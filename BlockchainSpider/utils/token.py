@@ -1,10 +1,12 @@
 import binascii
+from functools import wraps
 
 import async_lru
 from web3 import Web3
 
+from BlockchainSpider.utils.contract import ContractStore, get_chain_id
 from BlockchainSpider.utils.enum import TokenType
-from BlockchainSpider.utils.web3 import web3_json_rpc, parse_bytes_data
+from BlockchainSpider.utils.web3 import web3_json_rpc_batched, parse_bytes_data, track_rpc_errors
 
 ERC20_TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
 ERC721_TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
@@ -14,7 +16,40 @@ TOKEN_APPROVE_TOPIC = '0x8c5be1e5ebec7d5bd14f71427d1e84f3dd0314c0f7b2291e5b200ac
 TOKEN_APPROVE_ALL_TOPIC = '0x17307eab39ab6107e8899845ad3d59bd9653f200f220920489ca2b5937696c31'
 
 
+def cache_in_contract_store(field: str):
+    """
+    Cache the result of the contract query in the `ContractStore` of the chain across runs,
+    unless any JSON-RPC request of the query failed.
+    The results changing over time, e.g. total supply, should not be cached.
+
+    :param field:
+    :return:
+    """
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(address: str, provider_bucket, timeout: int):
+            chain_id = await get_chain_id(provider_bucket, timeout)
+            if chain_id is None:
+                return await func(address, provider_bucket, timeout)
+            store = ContractStore.open(chain_id=chain_id)
+            rlt = store.get(address, field)
+            if rlt is not None:
+                return rlt
+
+            with track_rpc_errors() as errors:
+                rlt = await func(address, provider_bucket, timeout)
+            if len(errors) == 0:
+                store.set(address, field, rlt)
+            return rlt
+
+        return wrapper
+
+    return decorator
+
+
 @async_lru.alru_cache(maxsize=1024)
+@cache_in_contract_store('is_token721')
 async def is_token721_contract(address: str, provider_bucket, timeout: int) -> bool:
     """
     Detect the contract is ERC721-based or not.
@@ -26,7 +61,7 @@ async def is_token721_contract(address: str, provider_bucket, timeout: int) -> b
     """
     # detect ERC721, return if contract is ERC721
     # see https://ethereum.stackexchange.com/questions/44880/erc-165-query-on-erc-721-implementation
-    data = await web3_json_rpc(
+    data = await web3_json_rpc_batched(
         tx_obj={
             "method": "eth_call",
             "params": [{
@@ -60,6 +95,7 @@ async def is_token721_contract(address: str, provider_bucket, timeout: int) -> b
 
 
 @async_lru.alru_cache(maxsize=1024)
+@cache_in_contract_store('is_token1155')
 async def is_token1155_contract(address: str, provider_bucket, timeout: int) -> bool:
     """
     Detect the contract is ERC1155-based or not.
@@ -71,7 +107,7 @@ async def is_token1155_contract(address: str, provider_bucket, timeout: int) ->
     """
     # detect ERC1155, return if contract is ERC1155
     # see https://github.com/ethereum/EIPs/blob/master/EIPS/eip-1155.md
-    data = await web3_json_rpc(
+    data = await web3_json_rpc_batched(
         tx_obj={
             "method": "eth_call",
             "params": [{
@@ -94,6 +130,7 @@ async def is_token1155_contract(address: str, provider_bucket, timeout: int) ->
 
 
 @async_lru.alru_cache(maxsize=1024)
+@cache_in_contract_store('name')
 async def get_token_name(address: str, provider_bucket, timeout: int) -> str:
     """
     query the token name for the given address.
@@ -103,7 +140,7 @@ async def get_token_name(address: str, provider_bucket, timeout: int) -> str:
     :return:
     """
     name = ''
-    data = await web3_json_rpc(
+    data = await web3_json_rpc_batched(
         tx_obj={
             "method": "eth_call",
             "params": [
@@ -123,6 +160,7 @@ async def get_token_name(address: str, provider_bucket, timeout: int) -> str:
 
 
 @async_lru.alru_cache(maxsize=1024)
+@cache_in_contract_store('symbol')
 async def get_token_symbol(address: str, provider_bucket, timeout: int) -> str:
     """
     query the token symbol for the given address.
@@ -136,7 +174,7 @@ async def get_token_symbol(address: str, provider_bucket, timeout: int) -> str:
     call_data = ['symbol()', 'SYMBOL()', 'symbol()', 'SYMBOL()']
     call_data_types = [["string", ], ["string", ], ["bytes32", ], ["bytes32", ]]
     for i in range(len(call_data)):
-        data = await web3_json_rpc(
+        data = await web3_json_rpc_batched(
             tx_obj={
                 "method": "eth_call",
                 "params": [
@@ -157,6 +195,7 @@ async def get_token_symbol(address: str, provider_bucket, timeout: int) -> str:
 
 
 @async_lru.alru_cache(maxsize=1024)
+@cache_in_contract_store('decimals')
 async def get_token_decimals(address: str, provider_bucket, timeout: int) -> int:
     """
     query the token decimals for the given address, e.g. ERC20 token.
@@ -169,7 +208,7 @@ async def get_token_decimals(address: str, provider_bucket, timeout: int) -> int
     call_data = ['decimals()', 'DECIMALS()']
     call_data_types = [["uint8", ], ["uint8", ]]
     for i in range(len(call_data)):
-        data = await web3_json_rpc(
+        data = await web3_json_rpc_batched(
             tx_obj={
                 "method": "eth_call",
                 "params": [
@@ -199,7 +238,7 @@ async def get_token_total_supply(address: str, provider_bucket, timeout: int) ->
     :return:
     """
     total_supply = -1
-    data = await web3_json_rpc(
+    data = await web3_json_rpc_batched(
         tx_obj={
             "method": "eth_call",
             "params": [
@@ -1,32 +1,319 @@
+import asyncio
+import atexit
+import bisect
+import csv
 import json
 import logging
+import os
+import sqlite3
 
+import aiohttp
 import requests
+
+from BlockchainSpider import settings
 from BlockchainSpider.utils.url import QueryURLBuilder
 
 
 logger = logging.getLogger("token_price")
 
 
-class TokenPrice:
-    def __init__(self, contract_address):
-        self.contract_address = contract_address
-        self.cache_file_path = "../BlockchainSpider/utils/token_price.json"
-        self.cache = self.load_cache()
+def filter_valid_ticks(ticks: list, price_type: str) -> list:
+    """
+    filter the ticks of large trades with the price of the given type
+    :param ticks: the ticks of the price api, with `price_usd`, `amount_token` and the `price_type`
+    :param price_type: price_usd, price_eth
+    :return:
+    """
+    rlt = list()
+    for tick in ticks:
+        price_usd = tick['price_usd'] if tick['price_usd'] is not None else 0
+        if tick['amount_token'] * price_usd < 10000:
+            continue
+        if tick[price_type] is not None:
+            rlt.append(tick)
+    return rlt
+
+
+class PriceSeries:
+    """
+    The tick prices of a token sorted by timestamp, answering the price queries by bisect.
+    """
+
+    def __init__(self, ticks: list = None):
+        self.timestamps = list()
+        self.prices = list()
+        self.extend(ticks or list())
+
+    def extend(self, ticks: list):
+        """
+        add the ticks in batch, which are merged and sorted once instead of inserted one by one
+        :param ticks: a list of (timestamp, price), and the later tick of the same timestamp wins
+        :return:
+        """
+        if len(ticks) == 0:
+            return
+        merged = dict(zip(self.timestamps, self.prices))
+        for timestamp, price in ticks:
+            merged[timestamp] = price
+        items = sorted(merged.items())
+        self.timestamps = [timestamp for timestamp, _ in items]
+        self.prices = [price for _, price in items]
+
+    def nearest(self, timestamp: int, tolerance: int):
+        """
+        get the price of the nearest tick
+        :param timestamp:
+        :param tolerance: the max distance in seconds of the tick
+        :return: the price, or None if no tick within the tolerance
+        """
+        i = bisect.bisect_left(self.timestamps, timestamp)
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(self.timestamps)]
+        if len(candidates) == 0:
+            return None
+        j = min(candidates, key=lambda j: abs(self.timestamps[j] - timestamp))
+        if abs(self.timestamps[j] - timestamp) > tolerance:
+            return None
+        return self.prices[j]
+
+    def interpolate(self, timestamp: int, tolerance: int):
+        """
+        interpolate the price linearly between the ticks around the timestamp,
+        or use the nearest tick if only one side is within the tolerance
+        :param timestamp:
+        :param tolerance: the max distance in seconds of the ticks
+        :return: the price, or None if no tick within the tolerance
+        """
+        i = bisect.bisect_left(self.timestamps, timestamp)
+        if i < len(self.timestamps) and self.timestamps[i] == timestamp:
+            return self.prices[i]
+        if 0 < i < len(self.timestamps) \
+                and timestamp - self.timestamps[i - 1] <= tolerance \
+                and self.timestamps[i] - timestamp <= tolerance:
+            t0, t1 = self.timestamps[i - 1], self.timestamps[i]
+            p0, p1 = self.prices[i - 1], self.prices[i]
+            return p0 + (p1 - p0) * (timestamp - t0) / (t1 - t0)
+        return self.nearest(timestamp, tolerance)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+class TokenPriceStore:
+    """
+    A persistent price store keyed by (contract, block) in SQLite, opened once per process.
+
+    The prices are clustered by (contract, block) in a B-tree, so a lookup or
+    a block range query is O(log n). The new prices are buffered and written in batch,
+    and flushed when the process exits. The legacy `token_price.json` is imported on creation.
+
+    The tick prices fetched for the nearest block queries are also stored,
+    and loaded as a `PriceSeries` of each (contract, price type) on demand.
+    A csv dump of the tick api, `TOKEN_PRICE_TICKS_FILENAME` in settings, pre-fills a store without ticks.
+    """
+    BATCH_SIZE = 256
+    _stores = dict()
+
+    def __init__(self, path: str, json_path: str = None, ticks_path: str = None):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS prices ('
+            'contract TEXT NOT NULL, block INTEGER NOT NULL, timestamp INTEGER, price REAL, '
+            'PRIMARY KEY (contract, block)) WITHOUT ROWID'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS ticks ('
+            'contract TEXT NOT NULL, price_type TEXT NOT NULL, timestamp INTEGER NOT NULL, price REAL, '
+            'PRIMARY KEY (contract, price_type, timestamp)) WITHOUT ROWID'
+        )
+        self._pending = dict()
+        self._pending_ticks = dict()
+        self._series = dict()
+
+        empty = self.conn.execute('SELECT 1 FROM prices LIMIT 1').fetchone() is None
+        if empty and json_path is not None and os.path.exists(json_path):
+            self._import_json(json_path)
+
+        empty = self.conn.execute('SELECT 1 FROM ticks LIMIT 1').fetchone() is None
+        if empty and ticks_path is not None:
+            assert os.path.exists(ticks_path), 'ticks file not found: %s' % ticks_path
+            count = self.import_ticks_csv(ticks_path)
+            logger.info('imported %d ticks from %s' % (count, ticks_path))
+
+    @classmethod
+    def open(cls, path: str = None, json_path: str = None, ticks_path: str = None):
+        """
+        get the store of the path opened in this process, or open it
+        :param path: the sqlite file, `TOKEN_PRICE_DB_FILENAME` in settings by default
+        :param json_path: the legacy json cache imported into an empty store
+        :param ticks_path: the csv dump of ticks imported into a store without ticks,
+        `TOKEN_PRICE_TICKS_FILENAME` in settings by default
+        :return:
+        """
+        utils_dir = os.path.dirname(os.path.abspath(__file__))
+        if path is None:
+            path = getattr(settings, 'TOKEN_PRICE_DB_FILENAME', None) or os.path.join(utils_dir, 'token_price.db')
+        if json_path is None:
+            json_path = os.path.join(utils_dir, 'token_price.json')
+        if ticks_path is None:
+            ticks_path = getattr(settings, 'TOKEN_PRICE_TICKS_FILENAME', None)
+        path = os.path.abspath(path)
+
+        store = cls._stores.get(path)
+        if store is None:
+            store = cls(path, json_path, ticks_path)
+            cls._stores[path] = store
+            atexit.register(store.close)
+        return store
+
+    def _import_json(self, json_path: str):
+        with open(json_path, 'r') as f:
+            data = json.load(f)
+        rows = list()
+        for key, price in data.items():
+            # the key is formatted as `block_timestamp_contract`
+            block, timestamp, contract = key.split('_', 2)
+            rows.append((contract, int(block), int(timestamp), price))
+        self.conn.executemany('INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?)', rows)
+        self.conn.commit()
+        logger.info('imported %d prices from %s' % (len(rows), json_path))
+
+    def get(self, contract: str, block: int) -> tuple:
+        """
+        get the price of the contract at the block
+        :param contract: the token contract, or '' for the native token
+        :param block:
+        :return: a tuple of (found, price), and the price may be None
+        """
+        key = (contract, int(block))
+        if key in self._pending:
+            return True, self._pending[key][1]
+        row = self.conn.execute(
+            'SELECT price FROM prices WHERE contract = ? AND block = ?', key
+        ).fetchone()
+        if row is None:
+            return False, None
+        return True, row[0]
+
+    def get_range(self, contract: str, start_blk: int, end_blk: int) -> list:
+        """
+        get the prices of the contract in the block range
+        :param contract:
+        :param start_blk: inclusive
+        :param end_blk: inclusive
+        :return: a list of (block, timestamp, price) sorted by block
+        """
+        self.flush()
+        return self.conn.execute(
+            'SELECT block, timestamp, price FROM prices WHERE contract = ? AND block BETWEEN ? AND ? ORDER BY block',
+            (contract, int(start_blk), int(end_blk)),
+        ).fetchall()
+
+    def put(self, contract: str, block: int, timestamp: int, price):
+        self._pending[(contract, int(block))] = (int(timestamp), price)
+        if len(self._pending) >= self.BATCH_SIZE:
+            self.flush()
+
+    def get_series(self, contract: str, price_type: str) -> PriceSeries:
+        """
+        get the tick prices of the contract, loaded from the store at the first query
+        :param contract:
+        :param price_type: price_usd, price_eth
+        :return:
+        """
+        key = (contract, price_type)
+        series = self._series.get(key)
+        if series is None:
+            series = PriceSeries(self.conn.execute(
+                'SELECT timestamp, price FROM ticks WHERE contract = ? AND price_type = ?', key
+            ).fetchall())
+            self._series[key] = series
+        return series
+
+    def put_ticks(self, contract: str, price_type: str, ticks: list):
+        """
+        :param contract:
+        :param price_type: price_usd, price_eth
+        :param ticks: a list of (timestamp, price)
+        :return:
+        """
+        ticks = [(int(timestamp), price) for timestamp, price in ticks]
+        self.get_series(contract, price_type).extend(ticks)
+        for timestamp, price in ticks:
+            self._pending_ticks[(contract, price_type, timestamp)] = price
+        if len(self._pending_ticks) >= self.BATCH_SIZE:
+            self.flush()
+
+    def import_ticks_csv(self, fn: str) -> int:
+        """
+        pre-fill the tick prices from a csv dump of the tick api, with the columns of
+        token_address, timestamp, price_usd, price_eth and amount_token
+        :param fn:
+        :return: the number of imported ticks
+        """
+        ticks = list()
+        with open(fn, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                ticks.append({
+                    'token_address': row['token_address'],
+                    'timestamp': int(row['timestamp']),
+                    'amount_token': float(row['amount_token'] or 0),
+                    'price_usd': float(row['price_usd']) if row.get('price_usd') else None,
+                    'price_eth': float(row['price_eth']) if row.get('price_eth') else None,
+                })
+
+        count = 0
+        for price_type in ['price_usd', 'price_eth']:
+            groups = dict()
+            for tick in filter_valid_ticks(ticks, price_type):
+                groups.setdefault(tick['token_address'], list()).append((tick['timestamp'], tick[price_type]))
+            for contract, _ticks in groups.items():
+                self.put_ticks(contract, price_type, _ticks)
+                count += len(_ticks)
+        self.flush()
+        return count
+
+    def flush(self):
+        if len(self._pending) > 0:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?)',
+                [(contract, block, timestamp, price) for (contract, block), (timestamp, price) in self._pending.items()],
+            )
+            self._pending.clear()
+        if len(self._pending_ticks) > 0:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO ticks VALUES (?, ?, ?, ?)',
+                [(*key, price) for key, price in self._pending_ticks.items()],
+            )
+            self._pending_ticks.clear()
+        self.conn.commit()
 
-    def load_cache(self):
-        with open(self.cache_file_path, 'r') as f:
-            return json.load(f)
+    def close(self):
+        if self.conn is None:
+            return
+        self.flush()
+        self.conn.close()
+        self.conn = None
+        self._stores.pop(self.path, None)
 
-    def save_cache(self):
-        with open(self.cache_file_path, 'w') as f:
-            json.dump(self.cache, f)
+
+class TokenPrice:
+    def __init__(self, contract_address, store: TokenPriceStore = None, tolerance: int = None):
+        """
+        :param contract_address: the token contract, or '' for the native token
+        :param store: the price store, the one of `TOKEN_PRICE_DB_FILENAME` by default
+        :param tolerance: the max seconds between a query and the stored ticks answering it,
+        `TOKEN_PRICE_TOLERANCE_SECS` in settings by default
+        """
+        self.contract_address = contract_address
+        self.store = store if store is not None else TokenPriceStore.open()
+        self.tolerance = tolerance if tolerance is not None else getattr(settings, 'TOKEN_PRICE_TOLERANCE_SECS', 3600)
 
     def get_price_at_specific_block(self, block_number, timestamp):
         price = 0
-        key = "{}_{}_{}".format(block_number, timestamp, self.contract_address)
-        if key in self.cache.keys():
-            price = self.cache[key]
+        found, cached_price = self.store.get(self.contract_address, block_number)
+        if found:
+            price = cached_price
         else:
             if self.contract_address == '':
                 price = self.eth_price_at_specific_block(block_number, timestamp)
@@ -41,8 +328,7 @@ class TokenPrice:
                     price = self.get_price_at_nearest_block(self.contract_address, timestamp, 100,
                                                             'price_usd')
 
-            self.cache[key] = price
-            self.save_cache()
+            self.store.put(self.contract_address, block_number, timestamp, price)
 
         return price if price is not None else 0
 
@@ -69,6 +355,12 @@ class TokenPrice:
         if interval > 10000000000:
             return 0
 
+        # answer by the stored ticks around the timestamp
+        if interval == 100:
+            price = self.store.get_series(contract_address, price_type).interpolate(timestamp, self.tolerance)
+            if price is not None:
+                return price
+
         base_url = "https://api.syve.ai/v1/price/historical/tick"
         if interval == 100:
             params = {
@@ -107,17 +399,16 @@ class TokenPrice:
             print(response.text)
             return 0
 
-        valid_data = []
-        for tx in data:
-            price_usd = tx['price_usd'] if tx['price_usd'] is not None else 0
-            if tx['amount_token'] * price_usd < 10000:
-                continue
-            if tx[price_type] is not None:
-                valid_data.append(tx) 
+        valid_data = filter_valid_ticks(data, price_type)
+        self.store.put_ticks(contract_address, price_type, [(tx['timestamp'], tx[price_type]) for tx in valid_data])
 
         if len(valid_data) == 0:
             return self.get_price_at_nearest_block(contract_address, timestamp, interval*2, price_type)
 
+        return self._pick_nearest_price(valid_data, timestamp, price_type)
+
+    @staticmethod
+    def _pick_nearest_price(valid_data: list, timestamp, price_type):
         for index, tx in enumerate(valid_data):
             tx_timestamp = tx['timestamp']
             if tx_timestamp < timestamp and index >= 1:
@@ -131,7 +422,15 @@ class TokenPrice:
     @staticmethod
     def price_usd_api(contract_address, block_number):
         url = "https://api.syve.ai/v1/prices_usd?key=l7cId0s9b6Icd6"
-        payload = json.dumps({
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        payload = TokenPrice._price_usd_payload(contract_address, block_number)
+        return requests.request("POST", url, headers=headers, data=payload)
+
+    @staticmethod
+    def _price_usd_payload(contract_address, block_number):
+        return json.dumps({
             "filter": {
                 "type": "and",
                 "params": {
@@ -169,10 +468,112 @@ class TokenPrice:
                 }
             ],
         })
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        return requests.request("POST", url, headers=headers, data=payload)
+
+    async def async_get_price_at_specific_block(self, block_number, timestamp, session: aiohttp.ClientSession):
+        """
+        the same as `get_price_at_specific_block`, but requests the price api in the event loop
+        """
+        found, price = self.store.get(self.contract_address, block_number)
+        if not found:
+            if self.contract_address == '':
+                usdt_contract = '0xdAC17F958D2ee523a2206206994597C13D831ec7'
+                usdt_to_eth = await self.async_get_price_at_nearest_block(
+                    session, usdt_contract, timestamp, 100, 'price_eth'
+                )
+                price = 1 / usdt_to_eth
+            else:
+                async with session.post(
+                        url="https://api.syve.ai/v1/prices_usd?key=l7cId0s9b6Icd6",
+                        headers={'Content-Type': 'application/json'},
+                        data=self._price_usd_payload(self.contract_address, block_number),
+                ) as response:
+                    data = json.loads(await response.text())
+                results: list = data.get('results', [])
+
+                if len(results) != 0:
+                    price = results[0]['price_token_usd_tick_1']
+                else:
+                    price = await self.async_get_price_at_nearest_block(
+                        session, self.contract_address, timestamp, 100, 'price_usd'
+                    )
+
+            self.store.put(self.contract_address, block_number, timestamp, price)
+
+        return price if price is not None else 0
+
+    async def async_get_price_at_nearest_block(
+            self, session: aiohttp.ClientSession, contract_address, timestamp, interval, price_type
+    ):
+        base_url = "https://api.syve.ai/v1/price/historical/tick"
+        while interval <= 10000000000:
+            # answer by the stored ticks around the timestamp
+            if interval == 100:
+                price = self.store.get_series(contract_address, price_type).interpolate(timestamp, self.tolerance)
+                if price is not None:
+                    return price
+
+                params = {"key": "l7cId0s9b6Icd6", "token_address": contract_address}
+                async with session.get(QueryURLBuilder(base_url).get(params)) as response:
+                    data = json.loads(await response.text()).get('data')
+                if data is None or len(data) == 0:
+                    logger.warning('no tick price of %s' % contract_address)
+                    return 0
+
+            params = {
+                "key": "l7cId0s9b6Icd6",
+                "token_address": contract_address,
+                "size": 10000,
+                "from_timestamp": timestamp - interval // 2,
+                "until_timestamp": timestamp + interval // 2,
+            }
+            async with session.get(QueryURLBuilder(base_url).get(params)) as response:
+                data = json.loads(await response.text()).get('data')
+            if data is None:
+                logger.warning('no tick price of %s' % contract_address)
+                return 0
+
+            valid_data = filter_valid_ticks(data, price_type)
+            self.store.put_ticks(contract_address, price_type, [(tx['timestamp'], tx[price_type]) for tx in valid_data])
+            if len(valid_data) > 0:
+                return self._pick_nearest_price(valid_data, timestamp, price_type)
+            interval *= 2
+        return 0
+
+
+async def resolve_prices(keys, store: TokenPriceStore = None, concurrency: int = 8, timeout: int = 120) -> dict:
+    """
+    resolve the prices of tokens in one batch, the stored ones are loaded
+    and the others are requested concurrently in the event loop
+    :param keys: an iterable of (contract, block, timestamp)
+    :param store:
+    :param concurrency: the max number of prices requested at the same time
+    :param timeout:
+    :return: a dict of (contract, block, timestamp) -> price, without the failed keys
+    """
+    store = store if store is not None else TokenPriceStore.open()
+    rlt, misses = dict(), list()
+    for key in set(keys):
+        found, price = store.get(key[0], key[1])
+        if found:
+            rlt[key] = price if price is not None else 0
+        else:
+            misses.append(key)
+    if len(misses) == 0:
+        return rlt
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async def _resolve(key):
+            async with semaphore:
+                try:
+                    rlt[key] = await TokenPrice(key[0], store).async_get_price_at_specific_block(
+                        key[1], key[2], session
+                    )
+                except Exception as e:
+                    logger.warning('failed to resolve the price of %s: %s' % (str(key), str(e)))
+
+        await asyncio.gather(*[_resolve(key) for key in misses])
+    return rlt
 
 
 if __name__ == "__main__":
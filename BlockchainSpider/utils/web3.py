@@ -1,12 +1,134 @@
 import asyncio
+import contextlib
+import contextvars
 import json
+import time
 import traceback
 from typing import Union
+from urllib.parse import urlparse
 
 import aiohttp
 from multidict import CIMultiDict
 from web3 import Web3
 
+from BlockchainSpider import settings
+
+
+# the errors of the JSON-RPC requests in the current context, see `track_rpc_errors`
+_rpc_errors = contextvars.ContextVar('rpc_errors', default=None)
+
+
+@contextlib.contextmanager
+def track_rpc_errors():
+    """
+    Collect the errors of the JSON-RPC requests in the context,
+    so that the callers can tell a failed request from an empty `result`.
+    The errors are also collected by the outer tracking contexts.
+    """
+    errors = list()
+    token = _rpc_errors.set(errors)
+    try:
+        yield errors
+    finally:
+        _rpc_errors.reset(token)
+        parent = _rpc_errors.get()
+        if parent is not None:
+            parent.extend(errors)
+
+
+def _record_rpc_error(e: Exception):
+    errors = _rpc_errors.get()
+    if errors is not None:
+        errors.append(e)
+
+
+class JsonRPCError(Exception):
+    """
+    The `error` of a JSON-RPC reply, e.g. rate limit or internal errors of the provider.
+    """
+
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+
+# the execution errors of eth_call are the results of the call, e.g. calling a missing method
+EXECUTION_ERROR_CODES = {3}
+EXECUTION_ERROR_KEYWORDS = ('revert', 'invalid opcode', 'execution')
+
+
+def get_rpc_error(data) -> Union[JsonRPCError, None]:
+    """
+    get the error of a JSON-RPC reply, except the execution errors of the call
+    :param data: the reply
+    :return:
+    """
+    if not isinstance(data, dict) or data.get('error') is None:
+        return None
+    error = data['error']
+    code = error.get('code') if isinstance(error, dict) else None
+    message = str(error.get('message', '') if isinstance(error, dict) else error).lower()
+    if code in EXECUTION_ERROR_CODES or any([keyword in message for keyword in EXECUTION_ERROR_KEYWORDS]):
+        return None
+    return JsonRPCError(error)
+
+
+class SessionPool:
+    """
+    The process-wide aiohttp sessions of each provider origin in each event loop,
+    keeping the connections alive among the JSON-RPC requests.
+
+    The connections created and reused are counted by the trace of aiohttp,
+    and the sessions should be closed when the spider is closed, e.g. `Web3SessionPoolExtension`.
+    """
+    LIMIT = 100
+    LIMIT_PER_HOST = 32
+    DNS_TTL = 300
+    KEEPALIVE_TIMEOUT = 30
+
+    def __init__(self):
+        self._sessions = dict()
+        self.stats = dict(requests=0, connections_created=0, connections_reused=0)
+
+    def get(self, provider: str) -> aiohttp.ClientSession:
+        url = urlparse(provider)
+        loop = asyncio.get_event_loop()
+        key = (url.scheme, url.netloc, id(loop))
+        session = self._sessions.get(key)
+        if session is not None and not session.closed:
+            return session
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.LIMIT,
+                limit_per_host=self.LIMIT_PER_HOST,
+                ttl_dns_cache=self.DNS_TTL,
+                keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+            ),
+            trace_configs=[trace_config],
+        )
+        self._sessions[key] = session
+        return session
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.stats['connections_created'] += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.stats['connections_reused'] += 1
+
+    async def close(self):
+        sessions = list(self._sessions.values())
+        self._sessions = dict()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+
+
+session_pool = SessionPool()
+
 
 async def web3_json_rpc(tx_obj: dict, provider: str, timeout: int):
     """
@@ -17,28 +139,164 @@ async def web3_json_rpc(tx_obj: dict, provider: str, timeout: int):
     :param timeout:
     :return:
     """
-    client = aiohttp.ClientSession(
-        loop=asyncio.get_event_loop(),
-        timeout=aiohttp.ClientTimeout(total=timeout)
-    )
+    session = session_pool.get(provider)
+    session_pool.stats['requests'] += 1
     try:
-        rsp = await client.request(
-            url=provider,
-            method='POST',
-            headers=CIMultiDict(**{'Content-Type': 'application/json'}),
-            data=json.dumps(tx_obj),
-        )
-        data = await rsp.read()
-    except:
+        async with session.request(
+                url=provider,
+                method='POST',
+                headers=CIMultiDict(**{'Content-Type': 'application/json'}),
+                data=json.dumps(tx_obj),
+                timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as rsp:
+            data = await rsp.read()
+    except Exception as e:
         traceback.print_exc()
+        _record_rpc_error(e)
         return
-    finally:
-        await client.close()
 
     # parse response
-    data = data.decode()
-    data = json.loads(data)
-    return data.get('result')
+    try:
+        data = json.loads(data.decode())
+    except Exception as e:
+        _record_rpc_error(e)
+        return
+    e = get_rpc_error(data)
+    if e is not None:
+        _record_rpc_error(e)
+    return data.get('result') if isinstance(data, dict) else None
+
+
+class JsonRPCBatcher:
+    """
+    Coalesce the pending JSON-RPC calls of each provider into array-form batch requests,
+    which are flushed when the batch is full or the time window is over.
+
+    The calls are sent one by one through `web3_json_rpc` for the providers rejecting batches,
+    and the batches are tried again after a cool-down. The other errors of a batch, e.g. rate limits,
+    only make the calls of the batch fall back.
+    """
+    # the error replies of the providers not supporting batches, e.g. `invalid request`
+    BATCH_REJECTION_CODES = {-32600}
+    BATCH_REJECTION_KEYWORDS = ('batch',)
+    UNBATCHABLE_SECS = 600
+
+    def __init__(self, max_batch_size: int = 50, window: float = 0.01):
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._pending = dict()
+        self._unbatchable = dict()
+        self.stats = dict(calls=0, batches=0, fallback_calls=0)
+
+    async def call(self, tx_obj: dict, provider: str, timeout: int):
+        """
+        Request the JSON-RPC in a batch, and return the raw data of the `result`.
+
+        :param tx_obj:
+        :param provider:
+        :param timeout:
+        :return:
+        """
+        self.stats['calls'] += 1
+        if self.max_batch_size <= 1 or self._unbatchable.get(provider, 0) > time.time():
+            self.stats['fallback_calls'] += 1
+            return await web3_json_rpc(tx_obj, provider, timeout)
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        calls = self._pending.setdefault(provider, list())
+        calls.append((tx_obj, future, timeout, _rpc_errors.get()))
+        if len(calls) >= self.max_batch_size:
+            self._flush(provider, calls)
+        elif len(calls) == 1:
+            loop.call_later(self.window, self._flush, provider, calls)
+        return await future
+
+    def _flush(self, provider: str, calls: list):
+        # the batch may have been flushed for being full
+        if self._pending.get(provider) is not calls:
+            return
+        del self._pending[provider]
+        asyncio.ensure_future(self._send(provider, calls))
+
+    async def _send(self, provider: str, calls: list):
+
+        # the ids of calls are renumbered in the batch
+        self.stats['batches'] += 1
+        results = None
+        try:
+            async with session_pool.get(provider).request(
+                    url=provider,
+                    method='POST',
+                    headers=CIMultiDict(**{'Content-Type': 'application/json'}),
+                    data=json.dumps([{**tx_obj, 'id': i} for i, (tx_obj, _, _, _) in enumerate(calls)]),
+                    timeout=aiohttp.ClientTimeout(total=max(timeout for _, _, timeout, _ in calls)),
+            ) as rsp:
+                data = json.loads(await rsp.read())
+            if isinstance(data, list):
+                results = {item.get('id'): item for item in data if isinstance(item, dict)}
+            elif self.is_batch_rejection(data):
+                self._unbatchable[provider] = time.time() + self.UNBATCHABLE_SECS
+        except:
+            traceback.print_exc()
+
+        # fall back per call if the batch is rejected or the result is missed
+        fallbacks = list()
+        for i, (tx_obj, future, timeout, errors) in enumerate(calls):
+            if future.done():
+                continue
+            item = results.get(i) if results is not None else None
+            if item is not None:
+                # the reverted calls have an `error` without `result`, the same as a single call
+                e = get_rpc_error(item)
+                if e is not None and errors is not None:
+                    errors.append(e)
+                future.set_result(item.get('result'))
+                continue
+            fallbacks.append((tx_obj, future, timeout, errors))
+        self.stats['fallback_calls'] += len(fallbacks)
+        await asyncio.gather(*[self._call_single(*fallback, provider) for fallback in fallbacks])
+
+    @classmethod
+    def is_batch_rejection(cls, data) -> bool:
+        """
+        check whether the reply of a batch means the provider does not support batches
+        :param data: the reply
+        :return:
+        """
+        if not isinstance(data, dict) or not isinstance(data.get('error'), dict):
+            return False
+        code = data['error'].get('code')
+        message = str(data['error'].get('message', '')).lower()
+        return code in cls.BATCH_REJECTION_CODES or any([keyword in message for keyword in cls.BATCH_REJECTION_KEYWORDS])
+
+    @staticmethod
+    async def _call_single(tx_obj: dict, future: asyncio.Future, timeout: int, errors: list, provider: str):
+        # the errors are tracked for the context of the caller
+        with track_rpc_errors() as _errors:
+            result = await web3_json_rpc(tx_obj, provider, timeout)
+        if errors is not None:
+            errors.extend(_errors)
+        if not future.done():
+            future.set_result(result)
+
+
+rpc_batcher = JsonRPCBatcher(
+    max_batch_size=getattr(settings, 'WEB3_RPC_BATCH_SIZE', 50),
+    window=getattr(settings, 'WEB3_RPC_BATCH_WINDOW', 0.01),
+)
+
+
+async def web3_json_rpc_batched(tx_obj: dict, provider: str, timeout: int):
+    """
+    Request the JSON-RPC of the web3 providers in batches, and return the raw data of the `result`.
+
+    :param tx_obj:
+    :param provider:
+    :param timeout:
+    :return:
+    """
+    return await rpc_batcher.call(tx_obj, provider, timeout)
 
 
 def parse_bytes_data(data: bytes, output_types: list) -> Union[tuple, None]:
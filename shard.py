@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+def split_shards(start_blk: int, end_blk: int, num_shards: int) -> list:
+    """
+    split the block range [start_blk, end_blk] into continuous shards of nearly the same size
+    """
+    size = end_blk - start_blk + 1
+    num_shards = max(min(num_shards, size), 1)
+    shards = list()
+    for i in range(num_shards):
+        shard_start = start_blk + size * i // num_shards
+        shard_end = start_blk + size * (i + 1) // num_shards - 1
+        shards.append((shard_start, shard_end))
+    return shards
+
+
+def is_shard_finished(checkpoint: str, end_blk: int) -> bool:
+    if not os.path.exists(checkpoint):
+        return False
+    with open(checkpoint, 'r') as f:
+        return json.load(f).get('next_blk', 0) > end_blk
+
+
+def crawl_shard(spider: str, shard: tuple, out_dir: str, spider_args: list, settings: list) -> int:
+    """
+    crawl a shard in a scrapy process, which resumes from the checkpoint of the shard
+    """
+    start_blk, end_blk = shard
+    shard_dir = os.path.join(out_dir, '%d_%d' % (start_blk, end_blk))
+    checkpoint = os.path.join(shard_dir, 'checkpoint.json')
+    if is_shard_finished(checkpoint, end_blk):
+        print('shard %d-%d is finished, skipped' % (start_blk, end_blk))
+        return 0
+    if not os.path.exists(shard_dir):
+        os.makedirs(shard_dir)
+
+    cmd = [
+        'scrapy', 'crawl', spider,
+        '-a', 'start_blk=%d' % start_blk,
+        '-a', 'end_blk=%d' % end_blk,
+        '-a', 'out=%s' % shard_dir,
+        '-a', 'checkpoint=%s' % checkpoint,
+        '-s', 'LOG_FILE=%s' % os.path.join(shard_dir, 'crawl.log'),
+    ]
+    for arg in spider_args:
+        cmd.extend(['-a', arg])
+    for setting in settings:
+        cmd.extend(['-s', setting])
+    print('shard %d-%d is starting: %s' % (start_blk, end_blk, ' '.join(cmd)))
+
+    # run in the project dir for the scrapy.cfg
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    code = subprocess.run(cmd, cwd=project_dir).returncode
+
+    # scrapy exits with 0 even if some blocks failed, so the shard is finished only by the checkpoint
+    if code == 0 and not is_shard_finished(checkpoint, end_blk):
+        print('shard %d-%d has unfinished blocks in the checkpoint' % (start_blk, end_blk))
+        return 1
+    return code
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.description = 'crawl a block range in shards with parallel scrapy processes'
+    parser.add_argument(
+        '--spider',
+        help='spider name(str)',
+        dest='spider',
+        type=str,
+        default='trans.block.web3'
+    )
+    parser.add_argument(
+        '-s', '--start_blk',
+        help='start block of the range(int)',
+        dest='start_blk',
+        type=int,
+        required=True,
+    )
+    parser.add_argument(
+        '-e', '--end_blk',
+        help='end block of the range, inclusive(int)',
+        dest='end_blk',
+        type=int,
+        required=True,
+    )
+    parser.add_argument(
+        '-n', '--shards',
+        help='number of shards(int)',
+        dest='shards',
+        type=int,
+        default=16
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        help='number of scrapy processes at the same time(int)',
+        dest='workers',
+        type=int,
+        default=os.cpu_count() or 1
+    )
+    parser.add_argument(
+        '-o', '--out',
+        help='output dir, and each shard is saved into `{start_blk}_{end_blk}`(str)',
+        dest='out_dir',
+        type=str,
+        default='./data'
+    )
+    parser.add_argument(
+        '-a',
+        help='spider argument `name=value`, e.g. `-a providers=http://127.0.0.1:8545`(str)',
+        dest='spider_args',
+        action='append',
+        default=list(),
+    )
+    parser.add_argument(
+        '--set',
+        help='scrapy setting `NAME=VALUE`(str)',
+        dest='settings',
+        action='append',
+        default=list(),
+    )
+    args = parser.parse_args()
+    out_dir = os.path.abspath(args.out_dir)
+
+    shards = split_shards(args.start_blk, args.end_blk, args.shards)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        codes = list(executor.map(
+            lambda shard: crawl_shard(args.spider, shard, out_dir, args.spider_args, args.settings),
+            shards,
+        ))
+    failed = [shard for shard, code in zip(shards, codes) if code != 0]
+    for shard in failed:
+        print('shard %d-%d exited with errors, rerun to resume it' % shard)
+    sys.exit(1 if len(failed) > 0 else 0)
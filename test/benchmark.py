@@ -0,0 +1,212 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from BlockchainSpider import strategies
+from BlockchainSpider.items import SubgraphTxItem
+from BlockchainSpider.pipelines import SubgraphTxsPipeline
+from BlockchainSpider.strategies.txs.edge import aggregate_edges
+
+
+def gen_edges(node: str, degree: int, num_nodes: int, seed: int, group: int = 2) -> list:
+    """
+    generate a fixed number of random token transfers related to the given node,
+    and every `group` transfers share a transaction hash
+    """
+    rnd = random.Random('{}_{}'.format(node, seed))
+    symbols = ['native_', 'USDT_0xdac17f958d2ee523a2206206994597c13d831ec7']
+    edges = list()
+    for i in range(degree):
+        neighbour = 'n%d' % rnd.randrange(num_nodes)
+        is_out = rnd.random() < 0.5
+        edges.append({
+            'hash': '{}_{}'.format(node, i // group),
+            'from': node if is_out else neighbour,
+            'to': neighbour if is_out else node,
+            'value': rnd.randint(1, 10 ** 6),
+            'timeStamp': rnd.randint(1, 10 ** 6),
+            'symbol': rnd.choice(symbols),
+        })
+    return edges
+
+
+def bench_push(strategy: str, degree: int, num_nodes: int, steps: int, seed: int, **kwargs):
+    """
+    run the strategy on a random graph with a fixed degree,
+    and print the average push cost against the size of the residual map
+    """
+    s = getattr(strategies, strategy)(source='n0', epsilon=1e-12, **kwargs)
+    node = s.source
+    bucket, costs = max(steps // 10, 1), list()
+    print('%-8s %-10s %-10s' % ('pushes', 'residual', 'ms/push'))
+    for i in range(1, steps + 1):
+        edges = gen_edges(node, degree, num_nodes, seed)
+        start = time.perf_counter()
+        for _ in s.push(node, edges):
+            pass
+        item = s.pop()
+        costs.append(time.perf_counter() - start)
+
+        if i % bucket == 0:
+            print('%-8d %-10d %-10.3f' % (i, len(s.r), sum(costs) / len(costs) * 1000))
+            costs = list()
+        if item is None:
+            break
+        node = item['node']
+
+
+def bench_memory(strategy: str, degree: int, num_nodes: int, steps: int, seed: int, **kwargs):
+    """
+    run the strategy on a random graph, and print the memory allocated by the strategy
+    """
+    tracemalloc.start()
+    s = getattr(strategies, strategy)(source='n0', epsilon=1e-12, **kwargs)
+    node = s.source
+    for _ in range(steps):
+        for _ in s.push(node, gen_edges(node, degree, num_nodes, seed)):
+            pass
+        item = s.pop()
+        if item is None:
+            break
+        node = item['node']
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('residual nodes: %d, allocated: %.2f MB, peak: %.2f MB' % (len(s.r), size / 2 ** 20, peak / 2 ** 20))
+
+
+def bench_aggregate(degree: int, num_nodes: int, seed: int, group: int):
+    """
+    aggregate the edges of an address with the given degree,
+    and print the time cost and the memory allocated by the aggregated edges
+    """
+    edges = gen_edges('n0', degree, num_nodes, seed, group)
+    tracemalloc.start()
+    start = time.perf_counter()
+    aggregated_edges = aggregate_edges('n0', edges)
+    cost = time.perf_counter() - start
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('edges: %d, aggregated edges: %d, time: %.1f ms, allocated: %.2f MB, peak: %.2f MB' % (
+        len(edges), len(aggregated_edges), cost * 1000, size / 2 ** 20, peak / 2 ** 20
+    ))
+
+
+def bench_pipeline(num_sources: int, degree: int, seed: int, **kwargs):
+    """
+    save the random txs of interleaved sources by `SubgraphTxsPipeline`,
+    and print the time cost and the number of open files
+    """
+    fields = ['hash', 'from', 'to', 'value', 'timeStamp', 'symbol']
+    out_dir = os.path.join('.', 'data', 'bench_pipeline')
+    rnd = random.Random(seed)
+    items = list()
+    for i in range(num_sources):
+        source = 's%d' % i
+        info = dict(source=source, out_dir=out_dir, out_fields=fields)
+        for tx in gen_edges(source, degree, num_sources, seed):
+            items.append(SubgraphTxItem(source=source, tx=tx, task_info=info))
+    rnd.shuffle(items)
+
+    spider = argparse.Namespace(out_dir=out_dir)
+    pipeline = SubgraphTxsPipeline(**kwargs)
+    start = time.perf_counter()
+    max_open_files = 0
+    for item in items:
+        pipeline.process_item(item, spider)
+        max_open_files = max(max_open_files, len(pipeline.file_map))
+    pipeline.close_spider(spider)
+    cost = time.perf_counter() - start
+    print('sources: %d, rows: %d, time: %.2f s, rows/s: %.0f, max open files: %d' % (
+        num_sources, len(items), cost, len(items) / cost, max_open_files
+    ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.description = 'micro benchmarks of the strategies'
+    parser.add_argument(
+        '-m', '--method',
+        help='benchmark method(str)',
+        dest='method',
+        type=str,
+        default='push'
+    )
+    parser.add_argument(
+        '-s', '--strategy',
+        help='strategy name(str)',
+        dest='strategy',
+        type=str,
+        default='TTRRedirect'
+    )
+    parser.add_argument(
+        '-d', '--degree',
+        help='number of edges of each node(int)',
+        dest='degree',
+        type=int,
+        default=100
+    )
+    parser.add_argument(
+        '-n', '--nodes',
+        help='number of nodes in the random graph(int)',
+        dest='num_nodes',
+        type=int,
+        default=1000000
+    )
+    parser.add_argument(
+        '-g', '--group',
+        help='number of edges sharing a transaction hash(int)',
+        dest='group',
+        type=int,
+        default=2
+    )
+    parser.add_argument(
+        '-k', '--kernel',
+        help='push kernel of TTRBase and TTRWeight, `python` or `numpy`(str)',
+        dest='kernel',
+        type=str,
+        default=None
+    )
+    parser.add_argument(
+        '--sources',
+        help='number of sources saved by the pipeline(int)',
+        dest='num_sources',
+        type=int,
+        default=10000
+    )
+    parser.add_argument(
+        '--out_mode',
+        help='output mode of the pipeline, `source` or `partitioned`(str)',
+        dest='out_mode',
+        type=str,
+        default='source'
+    )
+    parser.add_argument(
+        '--steps',
+        help='number of pushes(int)',
+        dest='steps',
+        type=int,
+        default=2000
+    )
+    parser.add_argument(
+        '--seed',
+        help='random seed(int)',
+        dest='seed',
+        type=int,
+        default=0
+    )
+    args = parser.parse_args()
+    strategy_kwargs = dict(kernel=args.kernel) if args.kernel else dict()
+
+    if args.method == 'push':
+        bench_push(args.strategy, args.degree, args.num_nodes, args.steps, args.seed, **strategy_kwargs)
+    elif args.method == 'memory':
+        bench_memory(args.strategy, args.degree, args.num_nodes, args.steps, args.seed, **strategy_kwargs)
+    elif args.method == 'aggregate':
+        bench_aggregate(args.degree, args.num_nodes, args.seed, args.group)
+    elif args.method == 'pipeline':
+        bench_pipeline(args.num_sources, args.degree, args.seed, out_mode=args.out_mode)
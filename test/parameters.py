@@ -1,7 +1,67 @@
 import argparse
 import json
 import os
+import sys
 import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from BlockchainSpider import strategies
+from BlockchainSpider.pipelines import SubgraphTxsPipeline, ImportancePipeline
+from BlockchainSpider.tasks import OfflineSubgraphTask, CSVEdgeStore, HttpCacheEdgeStore
+
+# the csv outputs save the normalized values of the source edges for these strategies,
+# so they are replayed exactly only against the http cache
+PRICE_STRATEGIES = {'TTRPrice', 'TTRAlpha'}
+
+
+def load_store(path: str, store_type: str, info: dict, stores: dict):
+    """
+    load the edge store for the replay of a task, which is shared by the tasks of the same block range
+    """
+    if store_type is None:
+        store_type = 'cache' if info['strategy'] in PRICE_STRATEGIES else 'csv'
+    assert store_type in {'csv', 'cache'}
+    assert store_type == 'cache' or info['strategy'] not in PRICE_STRATEGIES, \
+        'the csv outputs can not replay %s exactly, please replay against the http cache' % info['strategy']
+
+    start_blk, end_blk = int(info.get('start_blk', 0)), int(info.get('end_blk', 99999999))
+    key = (store_type,) if store_type == 'csv' else (store_type, info['types'], start_blk, end_blk)
+    store = stores.get(key)
+    if store is None:
+        if store_type == 'csv':
+            store = CSVEdgeStore(path)
+        else:
+            store = HttpCacheEdgeStore(path, txs_types=info['types'].split(','), start_blk=start_blk, end_blk=end_blk)
+        stores[key] = store
+    return store
+
+
+def replay(store, info: dict):
+    """
+    replay a ttr task against the local edge store, and save the outputs as the spider does
+    """
+    task = OfflineSubgraphTask(
+        strategy=getattr(strategies, info['strategy'])(
+            source=info['source'],
+            alpha=info['alpha'],
+            beta=info['beta'],
+            epsilon=info['epsilon'],
+        ),
+        store=store,
+        out_dir=info['out'],
+        out_fields='id,hash,from,to,value,timeStamp,blockNumber,symbol,contractAddress'.split(','),
+        **info
+    )
+    spider = SimpleNamespace(out_dir=info['out'])
+    pipelines = [SubgraphTxsPipeline(), ImportancePipeline()]
+    for item in task.run():
+        for pipeline in pipelines:
+            pipeline.process_item(item, spider)
+    pipelines[0].close_spider(spider)
+    return task.stats
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -13,6 +73,21 @@ if __name__ == '__main__':
         type=str,
         default=None
     )
+    parser.add_argument(
+        '-s', '--store',
+        help='replay offline against the csv output folder or the http cache folder of a former crawl(str)',
+        dest='store',
+        type=str,
+        default=None
+    )
+    parser.add_argument(
+        '-t', '--store-type',
+        help='type of the edge store, `csv` or `cache`, '
+             '`cache` for TTRPrice and TTRAlpha and `csv` for others by default(str)',
+        dest='store_type',
+        type=str,
+        default=None
+    )
     args = parser.parse_args()
     assert args.out_dir is not None
     if not os.path.exists(args.out_dir):
@@ -33,27 +108,36 @@ if __name__ == '__main__':
             net_cases[net] = list()
         net_cases[net].append(case)
 
+    stores = dict()
     using_time = list()
     epsilons = [0.004, 0.003, 0.002]
     epsilons.reverse()
-    for epsilon in epsilons:
-        out_dir = os.path.join(args.out_dir, 'epsilon_%s' % str(epsilon))
-        for net, cases in net_cases.items():
-            for case in cases:
-                infos = list()
-                infos.append({
-                    'source': case['source'][0]['address'],
-                    'types': 'external,internal,erc20',
-                    'start_blk': case['blockAt'],
-                    'out': out_dir,
-                    'epsilon': epsilon,
-                    'alpha': 0.15,
-                    'beta': 0.7,
-                    "strategy": "TTRAlpha"
-                })
-
-                with open('./tmp_ttr_alpha_{}.json'.format(epsilon), 'w') as f:
-                    json.dump(infos, f)
-                cmd = "nohup scrapy crawl txs.{}.ttr -a file=./tmp_ttr_alpha_{}.json > ttr_alpha_{}.log &".format(net, epsilon, epsilon)
-                os.system(cmd)
-                time.sleep(5)
+    for net, cases in net_cases.items():
+        for i, case in enumerate(cases):
+            info = {
+                'source': case['source'][0]['address'],
+                'types': 'external,internal,erc20',
+                'start_blk': case['blockAt'],
+                'alpha': 0.15,
+                'beta': 0.7,
+                "strategy": "TTRAlpha"
+            }
+
+            if args.store is not None:
+                store = load_store(args.store, args.store_type, info, stores)
+                for epsilon in epsilons:
+                    start = time.time()
+                    out_dir = os.path.join(args.out_dir, 'epsilon_%s' % str(epsilon))
+                    stats = replay(store, {**info, 'out': out_dir, 'epsilon': epsilon})
+                    print('replay %s with epsilon %s: %s, %.2fs' % (info['source'], epsilon, stats, time.time() - start))
+                continue
+
+            # one crawl for all epsilons, which saves the outputs into `epsilon_{epsilon}` of the output dir
+            infos = [{**info, 'out': args.out_dir, 'epsilons': epsilons}]
+            with open('./tmp_ttr_alpha_{}_{}.json'.format(net, i), 'w') as f:
+                json.dump(infos, f)
+            cmd = "nohup scrapy crawl txs.{}.ttr -a file=./tmp_ttr_alpha_{}_{}.json > ttr_alpha_{}_{}.log &".format(
+                net, net, i, net, i
+            )
+            os.system(cmd)
+            time.sleep(5)